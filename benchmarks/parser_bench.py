@@ -0,0 +1,168 @@
+# benchmarks/parser_bench.py
+"""
+Benchmark offline de los extractores sobre páginas H2H guardadas (sin red).
+
+    python -m benchmarks.parser_bench                   # compara con benchmarks/baseline.json
+    python -m benchmarks.parser_bench --update-baseline # regraba la referencia
+    python -m benchmarks.parser_bench --corpus otra/carpeta --repeat 20
+
+Para cada página del corpus, backend de BeautifulSoup y extractor mide la mediana de tiempo
+(sobre un soup nuevo en cada repetición, porque los parsers guardan resultados en el soup) y el
+pico de memoria con tracemalloc. Sale con código 1 si algo empeora más de la tolerancia.
+"""
+import argparse
+import importlib
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from modules.parse_cache import make_page_soup  # noqa: E402
+
+# --- CONFIGURACIÓN ---
+DEFAULT_CORPUS = [ROOT / "otras_carpetas" / "BODYDELAWEB.txt"]
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"          # páginas extra: *.html / *.txt
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_BACKENDS = ("lxml", "html.parser")
+DEFAULT_REPEAT = 10
+DEFAULT_TIME_TOLERANCE = 0.5      # +50 % sobre la referencia (el tiempo varía entre máquinas)
+DEFAULT_MEMORY_TOLERANCE = 0.25
+MIN_TIME_DELTA = 0.002            # diferencias por debajo de 2 ms no cuentan como regresión
+
+
+def _load_extractors() -> Dict[str, Callable]:
+    """Extractores a medir: reciben (soup, html, info) y devuelven lo mismo que en la app."""
+    datos = importlib.import_module("modules.datos")
+    estudio = importlib.import_module("modules.estudio")
+    sys.path.insert(0, str(ROOT / "funciones"))
+    funciones = importlib.import_module("funcionextraerdatos")
+    return {
+        "get_team_league_info_from_script_of": lambda soup, html, info: datos.get_team_league_info_from_script_of(soup),
+        "extract_standings_data_from_h2h_page_of": lambda soup, html, info: (
+            datos.extract_standings_data_from_h2h_page_of(soup, info["home_name"]),
+            datos.extract_standings_data_from_h2h_page_of(soup, info["away_name"])),
+        "extract_h2h_data_of": lambda soup, html, info: datos.extract_h2h_data_of(
+            soup, info["home_name"], info["away_name"], info["league_id"]),
+        "extract_over_under_stats_from_div_of": lambda soup, html, info: (
+            estudio.extract_over_under_stats_from_div_of(soup, "home"),
+            estudio.extract_over_under_stats_from_div_of(soup, "away")),
+        "extract_bet365_initial_odds_of": lambda soup, html, info: datos.extract_bet365_initial_odds_of(soup),
+        # Trabaja sobre el HTML (construye su propio soup), así que no depende del backend
+        "extraer_handicaps_h2h": lambda soup, html, info: funciones.extraer_handicaps_h2h(html),
+    }
+
+
+def corpus_files(corpus_dir: Path | None = None) -> List[Path]:
+    files = [p for p in DEFAULT_CORPUS if p.exists()]
+    folder = corpus_dir or CORPUS_DIR
+    if folder.exists():
+        files += sorted(p for p in folder.iterdir() if p.suffix in (".html", ".txt"))
+    return files
+
+
+def _page_info(html: str, page_ref: str) -> Dict[str, str]:
+    datos = importlib.import_module("modules.datos")
+    _, _, league_id, home_name, away_name, _ = datos.get_team_league_info_from_script_of(make_page_soup(html, page_ref))
+    return {"league_id": league_id, "home_name": home_name, "away_name": away_name}
+
+
+def _measure(build: Callable[[], object], run: Callable[[object], object], repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        target = build()
+        start = time.perf_counter()
+        run(target)
+        times.append(time.perf_counter() - start)
+    # Pico de memoria en una pasada aparte: tracemalloc ralentiza y falsearía los tiempos
+    target = build()
+    tracemalloc.start()
+    run(target)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_seconds": round(statistics.median(times), 6), "min_seconds": round(min(times), 6),
+            "peak_kb": round(peak / 1024, 1)}
+
+
+def run_benchmarks(files: List[Path], backends=DEFAULT_BACKENDS, repeat: int = DEFAULT_REPEAT) -> Dict[str, Dict]:
+    """Resultados {"pagina|backend|extractor": métricas}. 'soup_build' mide la construcción del soup."""
+    extractors = _load_extractors()
+    results: Dict[str, Dict] = {}
+    for path in files:
+        html = path.read_text(encoding="utf-8", errors="ignore")
+        info = _page_info(html, path.stem)
+        for backend in backends:
+            key_prefix = f"{path.name}|{backend}"
+            results[f"{key_prefix}|soup_build"] = _measure(lambda: None, lambda _: make_page_soup(html, path.stem, backend), repeat)
+            for name, extractor in extractors.items():
+                results[f"{key_prefix}|{name}"] = _measure(
+                    lambda: make_page_soup(html, path.stem, backend),
+                    lambda soup, extractor=extractor: extractor(soup, html, info), repeat)
+    return results
+
+
+def compare_with_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], time_tolerance: float,
+                          memory_tolerance: float) -> List[str]:
+    regressions = []
+    for key, current in results.items():
+        reference = baseline.get(key)
+        if not reference:
+            continue
+        ref_time, cur_time = reference["median_seconds"], current["median_seconds"]
+        if cur_time > ref_time * (1 + time_tolerance) and cur_time - ref_time > MIN_TIME_DELTA:
+            regressions.append(f"{key}: tiempo {cur_time * 1000:.2f} ms (referencia {ref_time * 1000:.2f} ms)")
+        ref_peak, cur_peak = reference["peak_kb"], current["peak_kb"]
+        if cur_peak > ref_peak * (1 + memory_tolerance) and cur_peak - ref_peak > 64:
+            regressions.append(f"{key}: memoria {cur_peak:.0f} KB (referencia {ref_peak:.0f} KB)")
+    return regressions
+
+
+def _print_table(results: Dict[str, Dict], baseline: Dict[str, Dict]):
+    print(f"{'página | backend | extractor':<80} {'mediana ms':>11} {'ref ms':>9} {'pico KB':>9}")
+    for key, m in results.items():
+        ref = baseline.get(key)
+        ref_ms = f"{ref['median_seconds'] * 1000:.2f}" if ref else "-"
+        print(f"{key.replace('|', ' | '):<80} {m['median_seconds'] * 1000:>11.2f} {ref_ms:>9} {m['peak_kb']:>9.0f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark offline de los extractores de páginas H2H")
+    parser.add_argument("--corpus", type=Path, default=None, help="Carpeta con páginas guardadas extra")
+    parser.add_argument("--backends", nargs="+", default=list(DEFAULT_BACKENDS))
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--time-tolerance", type=float, default=DEFAULT_TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    files = corpus_files(args.corpus)
+    if not files:
+        print("No hay páginas en el corpus.")
+        return 1
+    results = run_benchmarks(files, args.backends, max(1, args.repeat))
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+    _print_table(results, baseline)
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Referencia guardada en {args.baseline}")
+        return 0
+    regressions = compare_with_baseline(results, baseline, args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print("\nRegresiones:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\nSin regresiones frente a la referencia." if baseline else "\nSin referencia: usa --update-baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
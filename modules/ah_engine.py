@@ -0,0 +1,199 @@
+# modules/ah_engine.py
+"""
+Parseo y formateo de líneas de hándicap asiático (AH) y de goles, en un solo sitio.
+
+    parse_ah_line("-0/0.5")          -> -0.25
+    format_ah_line("0.5/1")          -> "0.75"      (análisis: conserva los cuartos)
+    format_ah_line_half("0.5/1")     -> "0.5"       (bulk: los cuartos se redondean a .5)
+    parse_ah_lines(df["ah_raw"])     -> np.ndarray con NaN donde no hay línea
+
+Las líneas habituales (enteras, medias y cuartos entre -MAX_LINE y MAX_LINE, con sus variantes de
+escritura "0/0.5", "-0/0.5", "-0.5/-1"...) salen de una tabla precalculada; cualquier otra cosa
+pasa por el parser completo, que es el que define la semántica de la tabla.
+"""
+import math
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURACIÓN ---
+MAX_LINE = 10.0
+PLACEHOLDERS = ("-", "?")
+_EPSILON = 1e-9
+_MISSING = object()
+
+
+def _line_key(value: str) -> str:
+    return value.strip().replace(" ", "")
+
+
+def _parse_slow(ah_line_str: str):
+    # "a/b" es la media de las dos mitades; "-0/0.5" o "-0.5/1" llevan el signo delante para toda la línea
+    if not isinstance(ah_line_str, str):
+        return None
+    s = _line_key(ah_line_str)
+    if not s or s in PLACEHOLDERS:
+        return None
+    original_starts_with_minus = s.startswith("-")
+    try:
+        if "/" in s:
+            parts = s.split("/")
+            if len(parts) != 2:
+                return None
+            p1_str, p2_str = parts
+            val1, val2 = float(p1_str), float(p2_str)
+            if val1 < 0 and not p2_str.startswith("-") and val2 > 0:
+                val2 = -abs(val2)
+            elif original_starts_with_minus and val1 == 0.0 and p1_str in ("0", "-0") and \
+                    not p2_str.startswith("-") and val2 > 0:
+                val2 = -abs(val2)
+            value = (val1 + val2) / 2.0
+        else:
+            value = float(s)
+    except ValueError:
+        return None
+    return value if math.isfinite(value) else None   # "nan" / "inf" no son líneas
+
+
+def _format_quarter_value(numeric_value: float) -> str:
+    # Redondea al cuarto más cercano y escribe "1", "-0.5", "0.25"...
+    if numeric_value == 0.0:
+        return "0"
+    sign = -1 if numeric_value < 0 else 1
+    abs_num = abs(numeric_value)
+    mod_val = abs_num % 1
+    if mod_val in (0.0, 0.25, 0.5, 0.75):
+        abs_rounded = abs_num
+    elif mod_val < 0.25:
+        abs_rounded = math.floor(abs_num)
+    elif mod_val < 0.75:
+        abs_rounded = math.floor(abs_num) + 0.5
+    else:
+        abs_rounded = math.ceil(abs_num)
+    final_value_signed = sign * abs_rounded
+    if final_value_signed == 0.0:
+        return "0"
+    if abs(final_value_signed - round(final_value_signed, 0)) < _EPSILON:
+        return str(int(round(final_value_signed, 0)))
+    if abs(final_value_signed - (math.floor(final_value_signed) + 0.5)) < _EPSILON:
+        return f"{final_value_signed:.1f}"
+    return f"{final_value_signed:.2f}"
+
+
+def _format_half_value(numeric_value: float) -> str:
+    # Formato del scraper masivo: .25 y .75 pasan a .5 ("0.5/1" -> "0.5")
+    if numeric_value == 0.0:
+        return "0"
+    sign = -1 if numeric_value < 0 else 1
+    abs_num = abs(numeric_value)
+    parte_entera = math.floor(abs_num)
+    parte_decimal = round(abs_num - parte_entera, 4)
+    if abs(parte_decimal - 0.25) < _EPSILON or abs(parte_decimal - 0.75) < _EPSILON:
+        parte_decimal = 0.5
+    final_value_signed = sign * (parte_entera + parte_decimal)
+    if final_value_signed == 0.0:
+        return "0"
+    if abs(final_value_signed - round(final_value_signed, 0)) < _EPSILON:
+        return str(int(round(final_value_signed, 0)))
+    return f"{final_value_signed:.1f}"
+
+
+def _number_spellings(x: float):
+    yield f"{x:g}"
+    yield f"{x:.1f}"
+    if x != int(x) and (x * 4) % 2:
+        yield f"{x:.2f}"
+
+
+def _build_line_table() -> Dict[str, float | None]:
+    """Clave normalizada (sin espacios) -> valor, para todas las líneas de cuarto en cuarto y sus escrituras."""
+    table: Dict[str, float | None] = {p: None for p in PLACEHOLDERS}
+    steps = int(MAX_LINE * 4)
+    halves = [i / 2 for i in range(0, int(MAX_LINE * 2) + 1)]
+    for i in range(-steps, steps + 1):
+        for spelling in _number_spellings(i / 4):
+            table[spelling] = _parse_slow(spelling)
+    for low, high in zip(halves, halves[1:]):
+        for low_s in _number_spellings(low):
+            for high_s in _number_spellings(high):
+                for key in (f"{low_s}/{high_s}", f"-{low_s}/{high_s}", f"-{low_s}/-{high_s}", f"{low_s}/-{high_s}"):
+                    table[key] = _parse_slow(key)
+    return table
+
+
+LINE_TABLE: Dict[str, float | None] = _build_line_table()
+_QUARTER_TEXT = {v: _format_quarter_value(v) for v in set(LINE_TABLE.values()) if v is not None}
+_HALF_TEXT = {v: _format_half_value(v) for v in set(LINE_TABLE.values()) if v is not None}
+
+
+def parse_ah_line(ah_line_str: str) -> float | None:
+    """Valor numérico de una línea AH/goles ("0.5/1" -> 0.75, "-0/0.5" -> -0.25). None si no es una línea."""
+    if not isinstance(ah_line_str, str):
+        return None
+    value = LINE_TABLE.get(_line_key(ah_line_str), _MISSING)
+    return _parse_slow(ah_line_str) if value is _MISSING else value
+
+
+def format_ah_line(ah_line_str: str, for_sheets: bool = False) -> str:
+    """Línea en decimal al cuarto ("0/0.5" -> "0.25"). '-' / '?' se devuelven tal cual; lo demás no parseable, '-'."""
+    if not isinstance(ah_line_str, str):
+        return "-"
+    stripped = ah_line_str.strip()
+    if stripped in PLACEHOLDERS:
+        return stripped
+    value = parse_ah_line(ah_line_str)
+    if value is None:
+        return "-"
+    if value == 0.0:
+        return "0"
+    output_str = _QUARTER_TEXT.get(value) or _format_quarter_value(value)
+    if for_sheets:
+        return "'" + output_str.replace(".", ",")
+    return output_str
+
+
+def format_ah_line_half(ah_line_str: str) -> str:
+    """Formato del scraper masivo (cuartos a .5). Lo que no es una línea se devuelve sin espacios alrededor."""
+    if not isinstance(ah_line_str, str):
+        return "-"
+    value = parse_ah_line(ah_line_str)
+    if value is None:
+        return ah_line_str.strip()
+    return _HALF_TEXT.get(value) or _format_half_value(value)
+
+
+def ah_line_to_float(ah_line_str, default: float = 0.0) -> float:
+    """Como parse_ah_line pero con un valor por defecto en lugar de None."""
+    value = parse_ah_line(ah_line_str)
+    return default if value is None else value
+
+
+# --- API vectorizada (columnas de pandas / arrays) ---
+
+def _factorize(values: Iterable):
+    # Cada texto distinto se resuelve una sola vez; el resto es indexar arrays
+    series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return series, codes, uniques
+
+
+def parse_ah_lines(values: Iterable) -> np.ndarray:
+    """parse_ah_line sobre toda una columna: array float64 con NaN donde no hay línea."""
+    _, codes, uniques = _factorize(values)
+    parsed = np.array([np.nan if (v := parse_ah_line(u)) is None else v for u in uniques] + [np.nan], dtype=np.float64)
+    return parsed[codes]   # el código -1 (nulos) cae en el NaN añadido al final
+
+
+def format_ah_lines(values: Iterable, for_sheets: bool = False) -> np.ndarray:
+    """format_ah_line sobre toda una columna (array de objetos str)."""
+    _, codes, uniques = _factorize(values)
+    formatted = np.array([format_ah_line(u, for_sheets) for u in uniques] + ["-"], dtype=object)
+    return formatted[codes]
+
+
+def format_ah_lines_half(values: Iterable) -> np.ndarray:
+    """format_ah_line_half sobre toda una columna (array de objetos str)."""
+    _, codes, uniques = _factorize(values)
+    formatted = np.array([format_ah_line_half(u) for u in uniques] + ["-"], dtype=object)
+    return formatted[codes]
@@ -0,0 +1,85 @@
+# modules/ah_settlement.py
+"""
+Liquidación vectorizada de hándicap asiático y líneas de goles, con medias ganadas/perdidas en las líneas de cuarto.
+
+    s = settle_handicap(home_goals - away_goals, -0.75)           # el local da 0.75
+    s.outcome  -> array int8: WIN, HALF_WIN, PUSH, HALF_LOSS, LOSS (VOID si falta dato)
+    s.units    -> beneficio por unidad apostada (con `price` = cuota neta, estilo HK)
+    s.summary()
+
+    frame = get_match_store().history_frame(team_id=...)
+    settle_goal_line(frame.home_goals + frame.away_goals, 2.25).summary()
+
+Una línea de cuarto (0.25, 0.75, 1.25...) es media apuesta a cada línea vecina (0 y 0.5, 0.5 y 1...):
+cada mitad gana (+1), empata (0) o pierde (-1), y la suma de las dos es el código del resultado.
+"""
+from dataclasses import dataclass
+from typing import Dict
+
+import numpy as np
+
+# --- CONFIGURACIÓN ---
+WIN, HALF_WIN, PUSH, HALF_LOSS, LOSS = 2, 1, 0, -1, -2
+VOID = -9   # sin marcador o sin línea
+OUTCOME_LABELS = {WIN: "WIN", HALF_WIN: "HALF_WIN", PUSH: "PUSH", HALF_LOSS: "HALF_LOSS", LOSS: "LOSS", VOID: "VOID"}
+DEFAULT_PRICE = 1.0   # cuota neta (HK): lo que se gana por unidad si la apuesta entra entera
+
+
+@dataclass(slots=True)
+class Settlement:
+    """Resultado por fila (`outcome`) y beneficio por unidad (`units`, NaN en las filas VOID)."""
+    outcome: np.ndarray
+    units: np.ndarray
+
+    def labels(self) -> np.ndarray:
+        return np.array([OUTCOME_LABELS[int(code)] for code in self.outcome], dtype=object)
+
+    def summary(self) -> Dict[str, float]:
+        """Recuento por resultado, filas liquidadas, unidades totales y % de apuestas con beneficio."""
+        settled = self.outcome != VOID
+        counts = {OUTCOME_LABELS[code]: int(np.count_nonzero(self.outcome == code)) for code in OUTCOME_LABELS}
+        total = int(np.count_nonzero(settled))
+        counts.update({
+            "settled": total,
+            "units": round(float(np.nansum(self.units)), 4),
+            "cover_rate": round(float(np.count_nonzero(self.outcome[settled] > 0)) / total, 4) if total else 0.0,
+        })
+        return counts
+
+
+def _as_float_array(values) -> np.ndarray:
+    return np.atleast_1d(np.asarray(values, dtype=np.float64))
+
+
+def _settle(adjusted: np.ndarray, line: np.ndarray, price) -> Settlement:
+    """`adjusted` = margen + línea para el lado apostado; `line` solo decide si es de cuarto (se parte en dos)."""
+    quarter = np.isclose(np.mod(line * 4, 2), 1)
+    offset = np.where(quarter, 0.25, 0.0)
+    void = np.isnan(adjusted)
+    with np.errstate(invalid="ignore"):
+        outcome = np.sign(adjusted - offset) + np.sign(adjusted + offset)
+    outcome = np.where(void, VOID, outcome).astype(np.int8)
+    price = np.broadcast_to(_as_float_array(price), outcome.shape)
+    units = np.select(
+        [outcome == WIN, outcome == HALF_WIN, outcome == PUSH, outcome == HALF_LOSS, outcome == LOSS],
+        [price, price / 2, 0.0, -0.5, -1.0],
+        default=np.nan,
+    )
+    return Settlement(outcome, units)
+
+
+def settle_handicap(margin, line, price=DEFAULT_PRICE) -> Settlement:
+    """
+    Hándicap asiático para el lado apostado: `margin` = sus goles - los del rival, `line` = hándicap que recibe
+    (negativo si da goles: -0.75 es "da 0.5/1"). Escalares o arrays (se combinan por broadcasting).
+    """
+    margin, line = np.broadcast_arrays(_as_float_array(margin), _as_float_array(line))
+    return _settle(margin + line, line, price)
+
+
+def settle_goal_line(total_goals, line, over: bool = True, price=DEFAULT_PRICE) -> Settlement:
+    """Línea de goles: over (por defecto) o under sobre `total_goals`. 2.25 es media a 2 y media a 2.5."""
+    total_goals, line = np.broadcast_arrays(_as_float_array(total_goals), _as_float_array(line))
+    adjusted = total_goals - line if over else line - total_goals
+    return _settle(adjusted, line, price)
+
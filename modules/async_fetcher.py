@@ -0,0 +1,116 @@
+# modules/async_fetcher.py
+import asyncio
+import time
+from typing import Dict, Iterable
+from urllib.parse import urlsplit
+
+import httpx
+
+from modules.http_replay import record_response, resolve_url
+from modules.page_cache import get_page_cache
+from modules.rate_limiter import get_rate_limiter
+from modules.tracing import span
+
+# --- CONFIGURACIÓN ---
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36"
+DEFAULT_PER_HOST_LIMIT = 8
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+DEFAULT_MAX_TRIES = 3
+DEFAULT_RETRY_DELAY = 0.5
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+DEFAULT_HEADERS = {
+    "User-Agent": DEFAULT_USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+class AsyncFetcher:
+    """
+    Cliente HTTP asíncrono compartido (HTTP/2, pool de conexiones) con límite de concurrencia por host.
+    Debe crearse y cerrarse dentro del mismo event loop:
+
+        async with AsyncFetcher() as fetcher:
+            pages = await fetcher.fetch_many([...])
+    """
+
+    def __init__(self, per_host_limit: int = DEFAULT_PER_HOST_LIMIT, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 timeout: httpx.Timeout = DEFAULT_TIMEOUT, max_tries: int = DEFAULT_MAX_TRIES, headers: Dict[str, str] | None = None,
+                 use_cache: bool = True):
+        self._cache = get_page_cache() if use_cache else None
+        self._limiter = get_rate_limiter()
+        self._per_host_limit = max(1, int(per_host_limit))
+        self._max_tries = max(1, int(max_tries))
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=timeout,
+            follow_redirects=True,
+            headers=headers or DEFAULT_HEADERS,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _semaphore_for(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        sem = self._semaphores.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self._per_host_limit)
+            self._semaphores[host] = sem
+        return sem
+
+    async def fetch_text(self, url: str) -> str | None:
+        """Devuelve el HTML de la URL (de la caché en disco si está) o None si falla tras los reintentos (o si es un 4xx)."""
+        with span("http.fetch", url=url, client="httpx") as trace_span:
+            html, status, cache_status = await self._fetch_text(url)
+            trace_span.set(status=status, cache=cache_status, bytes=len(html) if html else 0)
+            return html
+
+    async def _fetch_text(self, url: str):
+        if self._cache is not None:
+            cached_html = self._cache.get(url)
+            if cached_html is not None:
+                record_response(url, 200, cached_html)
+                return cached_html, 200, "hit"
+        cache_status = "miss" if self._cache is not None else "off"
+        status = None
+        async with self._semaphore_for(url):
+            for attempt in range(1, self._max_tries + 1):
+                try:
+                    await self._limiter.wait_async(url)
+                    start = time.perf_counter()
+                    resp = await self._client.get(resolve_url(url))
+                    self._limiter.record_work(url, time.perf_counter() - start)
+                    status = resp.status_code
+                    if resp.status_code in RETRY_STATUS and attempt < self._max_tries:
+                        self._limiter.pause(url, DEFAULT_RETRY_DELAY * attempt)
+                        continue
+                    if resp.status_code >= 400:
+                        if resp.status_code == 404:
+                            record_response(url, 404, "")
+                        return None, status, cache_status
+                    if self._cache is not None:
+                        self._cache.put(url, resp.text)
+                    record_response(url, resp.status_code, resp.text)
+                    return resp.text, status, cache_status
+                except httpx.HTTPError:
+                    if attempt == self._max_tries:
+                        return None, status, cache_status
+                    self._limiter.pause(url, DEFAULT_RETRY_DELAY * attempt)
+        return None, status, cache_status
+
+    async def fetch_many(self, urls: Iterable[str]) -> Dict[str, str | None]:
+        """Descarga todas las URLs en paralelo (respetando el límite por host). Sin duplicados."""
+        unique_urls = list(dict.fromkeys(u for u in urls if u))
+        results = await asyncio.gather(*(self.fetch_text(u) for u in unique_urls))
+        return dict(zip(unique_urls, results))
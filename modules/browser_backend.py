@@ -0,0 +1,209 @@
+# modules/browser_backend.py
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+from urllib.parse import urlsplit
+
+from modules.http_replay import record_response, resolve_url
+from modules.rate_limiter import get_rate_limiter
+from modules.tracing import span
+
+# --- CONFIGURACIÓN ---
+DEFAULT_MAX_CONTEXTS = int(os.environ.get("NOWGOAL_BROWSER_CONTEXTS", "4"))   # páginas renderizándose a la vez
+DEFAULT_NAV_TIMEOUT = 20.0
+DEFAULT_WAIT_TIMEOUT = 10.0
+PLAYWRIGHT_ENABLED = os.environ.get("NOWGOAL_PLAYWRIGHT", "1") != "0"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36"
+LAUNCH_ARGS = ["--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu"]
+
+# Recursos que no hacen falta para leer tablas y cuotas
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+BLOCKED_HOST_PARTS = ("doubleclick", "googlesyndication", "googletagmanager", "google-analytics", "adservice",
+                      "adsystem", "amazon-adsystem", "facebook", "hotjar", "scorecardresearch", "taboola", "outbrain")
+
+
+def _is_blocked(request) -> bool:
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlsplit(request.url).netloc
+    return any(part in host for part in BLOCKED_HOST_PARTS)
+
+
+class PlaywrightBackend:
+    """
+    Un solo Chromium (Playwright async) con un contexto aislado por página, hasta `max_contexts` a la vez.
+    Vive en su propio event loop en un hilo, así lo pueden usar a la vez varias sesiones de Streamlit
+    (con `render_html`, bloqueante) o cualquier otro event loop (con `await render_async`):
+
+        html = get_browser_backend().render_html(url, wait_for="#table_v2", selects=[("hSelect_2", "8")])
+
+    Imágenes, fuentes, CSS y dominios de publicidad se bloquean con interceptación de peticiones.
+    """
+
+    def __init__(self, max_contexts: int = DEFAULT_MAX_CONTEXTS, headless: bool = True):
+        self.max_contexts = max(1, int(max_contexts))
+        self.headless = headless
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="playwright-backend", daemon=True)
+        self._thread.start()
+        self._semaphore: asyncio.Semaphore | None = None
+        self._launch_lock: asyncio.Lock | None = None
+        self._playwright = None
+        self._browser = None
+        self.disabled = False   # se activa si Chromium no arranca: a partir de ahí los que llaman van directos a Selenium
+        self._limiter = get_rate_limiter()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {"renders": 0, "errors": 0, "launches": 0, "blocked_requests": 0,
+                       "render_seconds": 0.0, "max_in_flight": 0}
+
+    def _add(self, key: str, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    async def _ensure_browser(self):
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(self.max_contexts)
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            from playwright.async_api import async_playwright
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=self.headless, args=LAUNCH_ARGS)
+            self._add("launches")
+            return self._browser
+
+    async def _route(self, route):
+        if _is_blocked(route.request):
+            self._add("blocked_requests")
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _render(self, url: str, wait_for: str | None, selects: Iterable[Tuple[str, str]],
+                      timeout: float) -> str | None:
+        if self.disabled:
+            return None
+        try:
+            browser = await self._ensure_browser()
+        except Exception as e:
+            # Sin Chromium de Playwright (falta `playwright install chromium`): se desactiva y el que llama usa otro camino
+            if not self.disabled:
+                print(f"Playwright: no se pudo lanzar el navegador, se desactiva: {type(e).__name__}")
+            self.disabled = True
+            self._add("errors")
+            return None
+        async with self._semaphore:
+            with self._lock:
+                self._in_flight += 1
+                self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._in_flight)
+            context = None
+            start = time.perf_counter()
+            try:
+                context = await browser.new_context(user_agent=USER_AGENT, viewport={"width": 1920, "height": 1080})
+                await context.route("**/*", self._route)
+                page = await context.new_page()
+                await self._limiter.wait_async(url)
+                nav_start = time.perf_counter()
+                response = await page.goto(resolve_url(url), wait_until="domcontentloaded", timeout=timeout * 1000)
+                self._limiter.record_work(url, time.perf_counter() - nav_start)
+                status = response.status if response is not None else 200
+                if status >= 400:
+                    # Página de error (404, 429, 5xx...): se graba con su status y no se devuelve como contenido
+                    record_response(url, status, await page.content())
+                    self._add("errors")
+                    return None
+                if wait_for:
+                    await page.wait_for_selector(wait_for, state="attached", timeout=DEFAULT_WAIT_TIMEOUT * 1000)
+                # select_option dispara el evento change y el JS de la página redibuja la tabla en el acto
+                for select_id, value in selects or ():
+                    await page.select_option(f"#{select_id}", value, timeout=DEFAULT_WAIT_TIMEOUT * 1000)
+                html = await page.content()
+                record_response(url, status, html)
+                self._add("renders")
+                return html
+            except Exception as e:
+                print(f"Playwright: error renderizando {url}: {type(e).__name__}")
+                self._add("errors")
+                return None
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+                self._add("render_seconds", time.perf_counter() - start)
+                with self._lock:
+                    self._in_flight -= 1
+
+    def _submit(self, url: str, wait_for: str | None, selects, timeout: float):
+        return asyncio.run_coroutine_threadsafe(self._render(url, wait_for, selects, timeout), self._loop)
+
+    def render_html(self, url: str, wait_for: str | None = None, selects: Iterable[Tuple[str, str]] = (),
+                    timeout: float = DEFAULT_NAV_TIMEOUT) -> str | None:
+        """HTML renderizado de `url` (o None si falla). Bloquea solo al hilo que llama."""
+        if self.disabled:
+            return None
+        with span("browser.render", url=url) as trace_span:
+            html = self._submit(url, wait_for, list(selects), timeout).result()
+            trace_span.set(bytes=len(html) if html else 0)
+            return html
+
+    async def render_async(self, url: str, wait_for: str | None = None, selects: Iterable[Tuple[str, str]] = (),
+                           timeout: float = DEFAULT_NAV_TIMEOUT) -> str | None:
+        """Igual que render_html pero se puede esperar desde otro event loop."""
+        if self.disabled:
+            return None
+        with span("browser.render", url=url) as trace_span:
+            html = await asyncio.wrap_future(self._submit(url, wait_for, list(selects), timeout))
+            trace_span.set(bytes=len(html) if html else 0)
+            return html
+
+    def render_many(self, urls: Iterable[str], wait_for: str | None = None,
+                    timeout: float = DEFAULT_NAV_TIMEOUT) -> Dict[str, str | None]:
+        """Renderiza varias URLs en paralelo (hasta max_contexts a la vez). Sin duplicados."""
+        unique_urls: List[str] = list(dict.fromkeys(u for u in urls if u))
+        futures = [self._submit(u, wait_for, [], timeout) for u in unique_urls]
+        return {u: f.result() for u, f in zip(unique_urls, futures)}
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            data = dict(self._stats)
+            data["in_flight"] = self._in_flight
+        data["render_seconds"] = round(data["render_seconds"], 3)
+        return data
+
+    async def _shutdown(self):
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+    def close(self):
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=10)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_backend: PlaywrightBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def get_browser_backend() -> PlaywrightBackend | None:
+    """
+    Backend compartido por el proceso (se crea al primer uso). None si está desactivado (NOWGOAL_PLAYWRIGHT=0)
+    o si Chromium no pudo arrancar, así los que llaman pasan directamente a Selenium.
+    """
+    global _backend
+    if not PLAYWRIGHT_ENABLED:
+        return None
+    with _backend_lock:
+        if _backend is None:
+            _backend = PlaywrightBackend()
+        return None if _backend.disabled else _backend
@@ -1,8 +1,11 @@
 import math
+import multiprocessing
+import multiprocessing.util
 import os
-import time
+import re
 import random
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
 from typing import List, Dict, Tuple
 
 import gspread
@@ -13,64 +16,17 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-# --- Helper functions for AH parsing ---
-
-def parse_ah_to_number(ah_line_str: str):
-    if not isinstance(ah_line_str, str):
-        return None
-    s = ah_line_str.strip().replace(" ", "")
-    if not s or s in ["-", "?"]:
-        return None
-    original_minus = ah_line_str.strip().startswith("-")
-    try:
-        if "/" in s:
-            parts = s.split("/")
-            if len(parts) != 2:
-                return None
-            p1_str, p2_str = parts[0], parts[1]
-            try:
-                val1 = float(p1_str)
-            except ValueError:
-                return None
-            try:
-                val2 = float(p2_str)
-            except ValueError:
-                return None
-            if val1 < 0 and not p2_str.startswith("-") and val2 > 0:
-                val2 = -abs(val2)
-            elif original_minus and val1 == 0.0 and (p1_str == "0" or p1_str == "-0") and not p2_str.startswith("-") and val2 > 0:
-                val2 = -abs(val2)
-            return (val1 + val2) / 2.0
-        else:
-            return float(s)
-    except ValueError:
-        return None
-
-def format_ah_as_decimal_string(ah_line_str: str):
-    if not isinstance(ah_line_str, str) or not ah_line_str.strip() or ah_line_str.strip() in ["-", "?"]:
-        return ah_line_str.strip() if isinstance(ah_line_str, str) else "-"
-    numeric_value = parse_ah_to_number(ah_line_str)
-    if numeric_value is None:
-        return ah_line_str.strip() if isinstance(ah_line_str, str) else "-"
-    if numeric_value == 0.0:
-        return "0"
-    sign = -1 if numeric_value < 0 else 1
-    abs_num = abs(numeric_value)
-    parte_entera = math.floor(abs_num)
-    parte_decimal_original = round(abs_num - parte_entera, 4)
-    nueva_parte_decimal = parte_decimal_original
-    epsilon = 1e-9
-    if abs(parte_decimal_original - 0.25) < epsilon:
-        nueva_parte_decimal = 0.5
-    elif abs(parte_decimal_original - 0.75) < epsilon:
-        nueva_parte_decimal = 0.5
-    resultado_num_redondeado = parte_entera + nueva_parte_decimal
-    final_value_signed = sign * resultado_num_redondeado
-    if final_value_signed == 0.0:
-        return "0"
-    if abs(final_value_signed - round(final_value_signed, 0)) < epsilon:
-        return str(int(round(final_value_signed, 0)))
-    return f"{final_value_signed:.1f}"
+from modules.ah_engine import format_ah_line_half as format_ah_as_decimal_string, parse_ah_line as parse_ah_to_number
+from modules.concurrency import AdaptiveConcurrency, OUTCOME_ERROR, OUTCOME_THROTTLED
+from modules.driver_pool import DriverPool
+from modules.history_parser import parse_history_tables
+from modules.http_fetcher import build_requests_session, fetch_html
+from modules.match_store import get_match_store
+from modules.page_cache import get_page_cache
+from modules.scrape_pipeline import Pipeline, PipelineStage
+from modules.scrape_checkpoint import ScrapeCheckpoint, checkpoint_path_for
+from modules.sheet_writer import SheetStreamWriter
+from modules.rate_limiter import driver_get, get_rate_limiter, share_rate_limit
 
 # --- Selenium helpers ---
 
@@ -90,28 +46,31 @@ def get_chrome_options() -> Options:
 # --- Match extraction ---
 
 SELENIUM_TIMEOUT = 120
-WORKER_START_DELAY = 0.5
+BULK_BASE_URL = "https://live16.nowgoal25.com"
 
+MODE_HTTP = "http"
+MODE_SELENIUM = "selenium"
+
+
+def match_h2h_url(mid: int) -> str:
+    return f"{BULK_BASE_URL}/match/h2h-{mid}"
 
-def extract_match_worker(driver_instance: webdriver.Chrome, mid: int) -> Tuple[int, str, List[str], float | None]:
-    url = f"https://live16.nowgoal25.com/match/h2h-{mid}"
-    time.sleep(WORKER_START_DELAY)
-    try:
-        driver_instance.get(url)
-        WebDriverWait(driver_instance, SELENIUM_TIMEOUT).until(
-            EC.any_of(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "#table_v3")),
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div.crumbs")),
-                EC.presence_of_element_located((By.CSS_SELECTOR, "body[errorpage]")),
-            )
-        )
-        html = driver_instance.page_source
-        if "match not found" in html.lower() or "errorpage" in html.lower():
-            return mid, "not_found", [], None
-        soup = BeautifulSoup(html, "lxml")
-    except Exception:
-        return mid, "load_error", [], None
 
+def _is_not_found_page(html: str) -> bool:
+    html_lower = html.lower()
+    return "match not found" in html_lower or "errorpage" in html_lower
+
+
+_REQUIRED_DATA_RES = (re.compile(r'id="tr_o_1_8"[^>]*name="earlyOdds"'), re.compile(r'id="mScore"'))
+
+
+def _html_has_required_data(html: str) -> bool:
+    # La fila de cuotas iniciales y el marcador vienen en el HTML estático; si faltan hay que renderizar.
+    # Se busca sobre el texto, sin construir el árbol
+    return all(pattern.search(html) for pattern in _REQUIRED_DATA_RES)
+
+
+def parse_match_soup(soup: BeautifulSoup, mid: int) -> Tuple[List[str], float | None]:
     league_name = "League N/A"
     league_tag = soup.select_one("div.crumbs a[href*='/leagueinfo/']")
     if league_tag:
@@ -133,66 +92,226 @@ def extract_match_worker(driver_instance: webdriver.Chrome, mid: int) -> Tuple[i
         if len(cells) > 3:
             ah_act = format_ah_as_decimal_string(cells[3].text.strip())
 
+    return _build_result_row(ah_act, final_score, league_name, mid)
+
+
+def _build_result_row(ah_act: str, final_score: str, league_name: str, mid: int) -> Tuple[List[str], float | None]:
     result_row = ["-", ah_act, "-", "-", "-", "-", "-", "-", "-", "-", "-", "-", "-", final_score, "?", league_name, str(mid)]
     ah_num = parse_ah_to_number(ah_act)
-    return mid, "ok", result_row, ah_num
+    return result_row, ah_num
+
+
+# --- Histórico local de partidos ---
+
+_MATCH_INFO_FIELDS = {
+    "league_id": r"sclassId:\s*parseInt\('(\d+)'\)",
+    "home_id": r"hId:\s*parseInt\('(\d+)'\)",
+    "away_id": r"gId:\s*parseInt\('(\d+)'\)",
+    "home_name": r"hName:\s*'([^']*)'",
+    "away_name": r"gName:\s*'([^']*)'",
+    "league_name": r"lName:\s*'([^']*)'",
+    "state": r"state:\s*parseInt\('(-?\d+)'\)",
+    "match_time": r"matchTime:\s*'([^']*)'",
+}
+_MATCH_INFO_RE = {k: re.compile(v) for k, v in _MATCH_INFO_FIELDS.items()}
+FINISHED_STATE = -1
 
 
-def worker_task(mid_param: int):
-    driver = None
+def _parse_match_time(value: str | None) -> str | None:
+    # matchTime viene como '5/26/2025 2:45:00 AM'
+    if not value:
+        return None
     try:
-        opts = get_chrome_options()
-        driver = webdriver.Chrome(options=opts)
-        mid, status, row, ah_num = extract_match_worker(driver, mid_param)
-        return mid, status, row, ah_num
+        return datetime.strptime(value, "%m/%d/%Y %I:%M:%S %p").strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def build_match_record(html: str, soup: BeautifulSoup, mid: int, row: List[str], ah_num: float | None) -> Dict:
+    """Registro completo del partido para el histórico local (más de lo que va a la hoja)."""
+    info = {}
+    for key, pattern in _MATCH_INFO_RE.items():
+        m = pattern.search(html)
+        info[key] = m.group(1).replace("\\'", "'") if m else None
+
+    ah_line_raw = goal_line_raw = None
+    odds_row = soup.select_one('#tr_o_1_8[name="earlyOdds"]')
+    if odds_row:
+        cells = odds_row.find_all('td')
+        if len(cells) > 9:
+            ah_line_raw = cells[3].text.strip() or None
+            goal_line_raw = cells[9].text.strip() or None
+
+    final_score = row[13]
+    home_goals = away_goals = None
+    if final_score != "?*?":
+        home_goals, away_goals = (int(g) for g in final_score.split("*"))
+
+    return {
+        "match_id": mid, "league_id": info["league_id"],
+        "league_name": row[15] if row[15] != "League N/A" else info["league_name"],
+        "home_id": info["home_id"], "home_name": info["home_name"],
+        "away_id": info["away_id"], "away_name": info["away_name"],
+        "match_date": _parse_match_time(info["match_time"]),
+        "state": int(info["state"]) if info["state"] else None,
+        "home_goals": home_goals, "away_goals": away_goals, "final_score": final_score,
+        "ah_line_raw": ah_line_raw, "ah_line": ah_num,
+        "goal_line_raw": goal_line_raw, "goal_line": parse_ah_to_number(goal_line_raw) if goal_line_raw else None,
+    }
+
+
+def _store_match(html: str, soup: BeautifulSoup, mid: int, row: List[str], ah_num: float | None):
+    store = get_match_store()
+    if store is None:
+        return
+    try:
+        store.save_match(build_match_record(html, soup, mid, row, ah_num), parse_history_tables(html))
     except Exception as e:
-        return mid_param, "load_error", [], None
-    finally:
-        if driver:
-            try:
-                driver.quit()
-            except Exception:
-                pass
+        print(f"No se pudo guardar el partido {mid} en el histórico local: {e}")
 
-# --- Google Sheets upload ---
 
-BATCH_SIZE = 100
-API_PAUSE = 0.5
-RETRY_DELAY_GSPREAD = 15
+def _result_from_store(mid: int) -> Tuple[int, str, List[str], float | None] | None:
+    """Partidos terminados ya guardados: se reconstruye la fila sin descargar nada."""
+    store = get_match_store()
+    record = store.get_match(mid) if store is not None else None
+    if not record or record["state"] != FINISHED_STATE or record["final_score"] in (None, "?*?"):
+        return None
+    ah_act = format_ah_as_decimal_string(record["ah_line_raw"]) if record["ah_line_raw"] else "?"
+    row, ah_num = _build_result_row(ah_act, record["final_score"], record["league_name"] or "League N/A", mid)
+    return mid, "ok", row, ah_num
+
+
+def _parsed_result(html: str, soup: BeautifulSoup, mid: int) -> Tuple[int, str, List[str], float | None]:
+    row, ah_num = parse_match_soup(soup, mid)
+    _store_match(html, soup, mid, row, ah_num)
+    return mid, "ok", row, ah_num
+
+
+def render_match_html(driver_instance: webdriver.Chrome, mid: int) -> str:
+    """Carga la página en el navegador y devuelve el HTML renderizado (lo guarda también en la caché en disco)."""
+    url = match_h2h_url(mid)
+    driver_get(driver_instance, url)
+    WebDriverWait(driver_instance, SELENIUM_TIMEOUT).until(
+        EC.any_of(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "#table_v3")),
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div.crumbs")),
+            EC.presence_of_element_located((By.CSS_SELECTOR, "body[errorpage]")),
+        )
+    )
+    html = driver_instance.page_source
+    cache = get_page_cache()
+    if cache is not None and not _is_not_found_page(html):
+        cache.put(url, html)
+    return html
+
+
+def _result_from_page(html: str, mid: int) -> Tuple[int, str, List[str], float | None]:
+    # HTML ya descargado y con los datos necesarios (o renderizado por el navegador)
+    if _is_not_found_page(html):
+        return mid, "not_found", [], None
+    return _parsed_result(html, BeautifulSoup(html, "lxml"), mid)
+
+
+MAX_PAGES_PER_DRIVER = 150
+
+
+def create_chrome_driver() -> webdriver.Chrome:
+    return webdriver.Chrome(options=get_chrome_options())
+
+
+def create_driver_pool(max_workers: int) -> DriverPool:
+    return DriverPool(create_chrome_driver, max_size=max_workers, max_pages_per_driver=MAX_PAGES_PER_DRIVER)
+
+
+FETCH_DONE = "done"   # resultado final sin HTML que parsear (histórico local, 404, error)
+FETCH_HTML = "html"   # HTML completo listo para la fase de parseo
+
 
+def _report_http_status(report, status_code: int | None):
+    if report is None or status_code is None:
+        return
+    if status_code == 429:
+        report(OUTCOME_THROTTLED)
+    elif status_code >= 500:
+        report(OUTCOME_ERROR)
 
-def upload_data_to_sheet(worksheet_name: str, data_rows: List[List[str]], columns_list: List[str], sheet_handle, batch_size: int = BATCH_SIZE) -> bool:
+
+def fetch_match_page(mid: int, pool: DriverPool, session=None, mode: str = MODE_SELENIUM, report=None) -> Tuple[int, str, object]:
+    """
+    Fase de descarga: devuelve (mid, FETCH_HTML, html) o (mid, FETCH_DONE, resultado).
+    En modo HTTP solo se recurre al navegador si el HTML estático llega pero no trae los datos.
+    `report(outcome)` (opcional) avisa al control de concurrencia de 429/5xx y errores de carga.
+    """
+    try:
+        # Los partidos terminados que ya están en el histórico local no se vuelven a descargar
+        stored = _result_from_store(mid)
+        if stored is not None:
+            return mid, FETCH_DONE, stored
+        if mode != MODE_HTTP:
+            # Los partidos terminados ya descargados se leen de la caché en disco sin abrir navegador
+            cache = get_page_cache()
+            cached_html = cache.get(match_h2h_url(mid)) if cache is not None else None
+            if cached_html and (_is_not_found_page(cached_html) or _html_has_required_data(cached_html)):
+                return mid, FETCH_HTML, cached_html
+        if mode == MODE_HTTP and session is not None:
+            status_code, html = fetch_html(session, match_h2h_url(mid))
+            _report_http_status(report, status_code)
+            if status_code == 404:
+                return mid, FETCH_DONE, (mid, "not_found", [], None)
+            if not html:
+                # 429/5xx o sin respuesta: abrir Chrome contra el mismo host anularía el frenado
+                return mid, FETCH_DONE, (mid, "load_error", [], None)
+            if _is_not_found_page(html) or _html_has_required_data(html):
+                return mid, FETCH_HTML, html
+        # El driver se toma prestado del pool y se devuelve al terminar; ya no se arranca Chrome por ID.
+        with pool.lease() as driver:
+            html = render_match_html(driver, mid)
+        return mid, FETCH_HTML, html
+    except Exception:
+        if report is not None:
+            report(OUTCOME_ERROR)
+        return mid, FETCH_DONE, (mid, "load_error", [], None)
+
+
+def parse_fetched_page(fetched: Tuple[int, str, object]) -> Tuple[int, str, List[str], float | None]:
+    """Fase de parseo: convierte la salida de fetch_match_page en (mid, status, fila, ah_num)."""
+    mid, kind, payload = fetched
+    if kind == FETCH_DONE:
+        return payload
+    try:
+        return _result_from_page(payload, mid)
+    except Exception:
+        return mid, "load_error", [], None
+
+
+def worker_task(mid_param: int, pool: DriverPool, session=None, mode: str = MODE_SELENIUM):
+    return parse_fetched_page(fetch_match_page(mid_param, pool, session, mode))
+
+# --- Google Sheets upload ---
+
+def upload_data_to_sheet(worksheet_name: str, data_rows: List[List[str]], columns_list: List[str], sheet_handle) -> bool:
+    """Sube un bloque de filas de una vez (append, sin leer la hoja). El flujo masivo usa SheetStreamWriter directamente."""
     print(f"\n--- Iniciando subida para '{worksheet_name}' ({len(data_rows)} filas) ---")
     if not data_rows:
         print(f"  ✅ No hay datos nuevos para subir a '{worksheet_name}'.")
         return True
-    try:
-        df = data_rows
-        ws = None
-        try:
-            ws = sheet_handle.worksheet(worksheet_name)
-        except gspread.exceptions.WorksheetNotFound:
-            ws = sheet_handle.add_worksheet(title=worksheet_name, rows=max(len(df) + 100, 200), cols=len(columns_list) + 5)
-            ws.update('A1', [columns_list], value_input_option='USER_ENTERED')
-        if not ws:
-            return False
-        start_row = len(ws.get_all_values()) + 1
-        num_batches = math.ceil(len(df) / batch_size)
-        for i in range(num_batches):
-            batch = df[i * batch_size : (i + 1) * batch_size]
-            range_start = start_row + i * batch_size
-            end_col_letter = gspread.utils.rowcol_to_a1(1, len(columns_list)).replace('1','')
-            full_range = f"A{range_start}:{end_col_letter}{range_start + len(batch) - 1}"
-            ws.update(full_range, batch, value_input_option='USER_ENTERED')
-            time.sleep(API_PAUSE)
-        return True
-    except Exception as e:
-        print(f"Error subiendo a {worksheet_name}: {e}")
-        return False
+    writer = SheetStreamWriter(sheet_handle, worksheet_name, columns_list)
+    writer.add_many(data_rows)
+    return writer.close() and writer.stats()["failed_rows"] == 0
 
 # --- Main processing function ---
 
-def process_ranges(credentials_path: str, sheet_name: str, sheet_neg: str, sheet_pos: str, ranges: List[Dict[str, int]], max_workers: int = 3):
+MAX_BROWSER_FALLBACK_DRIVERS = 3
+
+
+def process_ranges(credentials_path: str, sheet_name: str, sheet_neg: str, sheet_pos: str, ranges: List[Dict[str, int]], max_workers: int = 3, mode: str = MODE_SELENIUM,
+                   resume: bool = True, processes: int = 0, progress_callback=None):
+    """
+    Procesa los rangos y sube las filas. `max_workers` es la concurrencia total de descargas; con `processes` > 0
+    el trabajo se reparte entre procesos (cada uno con su sesión HTTP, su pool de navegadores y sus hilos),
+    de modo que el parseo aprovecha todos los núcleos. En modo hilos la concurrencia real la decide un
+    control AIMD (hasta `max_workers`); `progress_callback(dict)` recibe cada segundo el estado en vivo.
+    """
     gc = gspread.service_account(filename=credentials_path)
     sh = gc.open(sheet_name)
     columns = [
@@ -201,25 +320,200 @@ def process_ranges(credentials_path: str, sheet_name: str, sheet_neg: str, sheet
         "L_vs_UV_A","V_vs_UL_H","Stats_L","Stats_V",
         "Fin","G_i", "League", "match_id"
     ]
+    # Diario por spreadsheet + hojas destino: al reanudar solo se procesan los IDs que faltan
+    checkpoint = ScrapeCheckpoint(checkpoint_path_for(sheet_name, sheet_neg, sheet_pos))
+    if not resume:
+        checkpoint.reset()
+    if processes and processes > 0:
+        threads_per_process = max(1, math.ceil(max_workers / processes))
+        executor = ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process_worker, initargs=(mode, threads_per_process, processes),
+        )
+        try:
+            _, pool_stats = _process_ranges_with_pool(sh, sheet_neg, sheet_pos, ranges, columns, None, max_workers,
+                                                      mode=mode, checkpoint=checkpoint, process_executor=executor,
+                                                      processes=processes, progress_callback=progress_callback)
+        finally:
+            executor.shutdown(wait=True)
+            checkpoint.close()
+    else:
+        # En modo HTTP el pool solo sirve de respaldo, así que se limita a unos pocos navegadores.
+        pool_size = min(max_workers, MAX_BROWSER_FALLBACK_DRIVERS) if mode == MODE_HTTP else max_workers
+        pool = create_driver_pool(pool_size)
+        session = build_requests_session(pool_maxsize=max_workers) if mode == MODE_HTTP else None
+        try:
+            _process_ranges_with_pool(sh, sheet_neg, sheet_pos, ranges, columns, pool, max_workers, session, mode, checkpoint,
+                                      progress_callback=progress_callback)
+        finally:
+            pool.close()
+            checkpoint.close()
+            if session is not None:
+                session.close()
+        pool_stats = pool.stats()
+    print(f"Pool de drivers: {pool_stats}")
+    print(f"Checkpoint: {checkpoint.stats()}")
+    page_cache = get_page_cache()
+    if page_cache is not None:
+        print(f"Caché de páginas: {page_cache.stats()}")
+    match_store = get_match_store()
+    if match_store is not None:
+        print(f"Histórico local: {match_store.stats()}")
+    print(f"Límite por host (espera vs trabajo): {get_rate_limiter().stats()}")
+    return pool_stats
+
+
+# --- Modo multiproceso ---
+
+PROCESS_CHUNK_SIZE = 20
+_process_state: Dict = {}
+
+
+def _init_process_worker(mode: str, threads: int, processes: int = 1):
+    # Cada proceso tiene su propia sesión HTTP, su pool de navegadores y sus hilos de descarga;
+    # el límite por host se reparte entre los procesos para no multiplicarlo
+    share_rate_limit(processes)
+    pool_size = min(threads, MAX_BROWSER_FALLBACK_DRIVERS) if mode == MODE_HTTP else threads
+    _process_state.update(
+        mode=mode,
+        pool=create_driver_pool(pool_size),
+        session=build_requests_session(pool_maxsize=threads) if mode == MODE_HTTP else None,
+        executor=ThreadPoolExecutor(max_workers=threads),
+    )
+    multiprocessing.util.Finalize(None, _close_process_worker, exitpriority=10)
+
+
+def _close_process_worker():
+    _process_state["executor"].shutdown(wait=True)
+    _process_state["pool"].close()
+    if _process_state["session"] is not None:
+        _process_state["session"].close()
+
+
+def _scrape_chunk(mids: List[int]) -> Tuple[int, List[tuple], Dict]:
+    """Se ejecuta en el proceso hijo. Devuelve tuplas compactas (sin la fila completa) y las estadísticas de su pool."""
+    state = _process_state
+    results = state["executor"].map(lambda mid: worker_task(mid, state["pool"], state["session"], state["mode"]), mids)
+    compact = [
+        (mid, status, row[1], row[13], row[15], ah_num) if status == "ok" else (mid, status)
+        for mid, status, row, ah_num in results
+    ]
+    return os.getpid(), compact, state["pool"].stats()
+
+
+def _expand_compact(item: tuple) -> Tuple[int, str, List[str], float | None]:
+    if len(item) == 2:
+        return item[0], item[1], [], None
+    mid, status, ah_act, final_score, league_name, _ = item
+    row, ah_num = _build_result_row(ah_act, final_score, league_name, mid)
+    return mid, status, row, ah_num
+
+
+def _sum_pool_stats(stats_list: List[Dict]) -> Dict:
+    total: Dict = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            total[key] = total.get(key, 0) + value
+    total["hit_rate"] = round(total["hits"] / total["leases"], 4) if total.get("leases") else 0.0
+    return total
+
+
+PARSE_WORKERS = 2
+INITIAL_WORKERS = 4
+
+
+def _process_ranges_with_pool(sh, sheet_neg: str, sheet_pos: str, ranges: List[Dict[str, int]], columns: List[str], pool: DriverPool | None, max_workers: int, session=None, mode: str = MODE_SELENIUM,
+                              checkpoint: ScrapeCheckpoint | None = None, process_executor: ProcessPoolExecutor | None = None, processes: int = 0,
+                              progress_callback=None):
+    """
+    Pipeline descarga -> parseo -> clasificación -> subida con colas acotadas: mientras unos workers descargan,
+    otros parsean y las filas ya clasificadas se van subiendo. Todos los rangos pasan por el mismo pipeline.
+    Con `process_executor` descarga y parseo ocurren en los procesos hijos, por bloques de IDs.
+    Devuelve (estadísticas por fase, estadísticas sumadas de los pools de los hijos o None).
+    """
+    # Las filas se suben por lotes según llegan; el checkpoint marca lo ya subido
+    on_flushed = checkpoint.mark_uploaded if checkpoint is not None else None
+    writer_neg = SheetStreamWriter(sh, sheet_neg, columns, on_flushed=on_flushed)
+    writer_pos = SheetStreamWriter(sh, sheet_pos, columns, on_flushed=on_flushed)
+
+    def writer_for(ah_num):
+        return writer_neg if ah_num is None or ah_num <= 0 else writer_pos
+
+    pending_ids: List[int] = []
     for r_idx, r in enumerate(ranges):
         start_id = r.get('start_id')
         end_id = r.get('end_id')
         label = r.get('label', f'Rango {r_idx+1}')
         ids = list(range(start_id, end_id - 1, -1)) if start_id >= end_id else list(range(start_id, end_id + 1))
-        rows_neg_zero: List[List[str]] = []
-        rows_pos: List[List[str]] = []
-        futures = {}
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            for mid in ids:
-                future = executor.submit(worker_task, mid)
-                futures[future] = mid
-            for f in as_completed(futures):
-                mid, status, row, ah_num = f.result()
-                if status == 'ok':
-                    if ah_num is None or ah_num <= 0:
-                        rows_neg_zero.append(row)
-                    else:
-                        rows_pos.append(row)
-        upload_data_to_sheet(sheet_neg, rows_neg_zero, columns, sh)
-        upload_data_to_sheet(sheet_pos, rows_pos, columns, sh)
+        if checkpoint is not None:
+            # Filas extraídas en una ejecución anterior que no llegaron a subirse
+            for mid, row, ah_num in checkpoint.unuploaded_rows(ids):
+                writer_for(ah_num).add(row, mid)
+            range_pending = checkpoint.pending_ids(ids)
+            print(f"{label}: {len(ids) - len(range_pending)} IDs ya procesados, {len(range_pending)} pendientes")
+        else:
+            range_pending = ids
+        pending_ids.extend(range_pending)
+
+    def classify(result):
+        mid, status, row, ah_num = result
+        if checkpoint is not None:
+            checkpoint.record(mid, status, row, ah_num)
+        return (writer_for(ah_num), row, mid) if status == 'ok' else None
+
+    def upload(item):
+        writer, row, mid = item
+        writer.add(row, mid)
+
+    child_pool_stats: Dict[int, Dict] = {}
+
+    def scrape_chunk(chunk):
+        pid, compact, stats = process_executor.submit(_scrape_chunk, chunk).result()
+        child_pool_stats[pid] = stats
+        return [_expand_compact(item) for item in compact]
+
+    controller = None
+    if process_executor is not None:
+        pending_ids = list(dict.fromkeys(pending_ids))
+        items = [pending_ids[i:i + PROCESS_CHUNK_SIZE] for i in range(0, len(pending_ids), PROCESS_CHUNK_SIZE)]
+        # Dos bloques en vuelo por proceso para que ninguno quede parado mientras se recogen resultados
+        scrape_stages = [PipelineStage("scrape", scrape_chunk, workers=max(1, processes) * 2, fan_out=True)]
+    else:
+        items = dict.fromkeys(pending_ids)
+        # Hay max_workers hilos de descarga, pero solo `controller.limit` trabajan a la vez
+        controller = AdaptiveConcurrency(initial=max(1, min(max_workers, INITIAL_WORKERS)), max_limit=max_workers)
 
+        def fetch(mid):
+            with controller.slot() as report:
+                return fetch_match_page(mid, pool, session, mode, report)
+
+        scrape_stages = [
+            PipelineStage("fetch", fetch, workers=max_workers, queue_size=max_workers * 2),
+            PipelineStage("parse", parse_fetched_page, workers=PARSE_WORKERS, queue_size=max_workers * 2),
+        ]
+    pipeline = Pipeline(scrape_stages + [
+        PipelineStage("classify", classify, workers=1),
+        PipelineStage("upload", upload, workers=1),
+    ])
+    total_items = len(items)
+
+    def report_progress():
+        first, last = pipeline.stages[0].stats(1.0), pipeline.stages[-2].stats(1.0)
+        progress = {"total": len(pending_ids), "done": last["processed"], "scraped_ok": last["emitted"]}
+        if controller is not None:
+            progress.update(controller.stats())
+        else:
+            progress.update({"limit": max_workers, "chunks_done": first["processed"], "chunks_total": total_items})
+        progress_callback(progress)
+
+    try:
+        stage_stats = pipeline.run(items, on_progress=report_progress if progress_callback else None)
+    finally:
+        writer_neg.close()
+        writer_pos.close()
+        print(f"Subida '{sheet_neg}': {writer_neg.stats()}")
+        print(f"Subida '{sheet_pos}': {writer_pos.stats()}")
+    print(f"Pipeline ({pipeline.elapsed:.1f}s): {stage_stats}")
+    if controller is not None:
+        print(f"Concurrencia adaptativa: {controller.stats()}")
+    return stage_stats, _sum_pool_stats(list(child_pool_stats.values())) if child_pool_stats else None
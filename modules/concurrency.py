@@ -0,0 +1,124 @@
+# modules/concurrency.py
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+# --- CONFIGURACIÓN ---
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_WINDOW = 20                 # resultados por ventana de evaluación
+DEFAULT_TARGET_LATENCY = 8.0        # segundos por página (mediana de la ventana) considerados sanos
+DEFAULT_MAX_ERROR_RATE = 0.1
+DECREASE_FACTOR = 0.5
+RATE_WINDOW_SECONDS = 30.0
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"             # load_error, timeout, 5xx
+OUTCOME_THROTTLED = "throttled"     # 429: se reduce en el acto
+
+
+class AdaptiveConcurrency:
+    """
+    Límite de concurrencia AIMD. Los workers piden hueco con `slot()` y, al terminar, informan del resultado:
+
+        with controller.slot() as report:
+            ...
+            report(OUTCOME_OK)
+
+    Cada `window` resultados: si la tasa de errores y la latencia mediana están dentro de lo razonable
+    el límite sube en 1 (aumento aditivo); si no, se multiplica por DECREASE_FACTOR. Un 429 lo reduce
+    en el acto (como mucho una vez por ventana). Los hilos que exceden el límite esperan sin consumir peticiones.
+    """
+
+    def __init__(self, initial: int, max_limit: int, min_limit: int = DEFAULT_MIN_LIMIT, window: int = DEFAULT_WINDOW,
+                 target_latency: float = DEFAULT_TARGET_LATENCY, max_error_rate: float = DEFAULT_MAX_ERROR_RATE):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = min(self.max_limit, max(self.min_limit, int(initial)))
+        self.window = max(1, int(window))
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._window_latencies = []
+        self._window_errors = 0
+        self._decreased_in_window = False
+        self._finished_at = deque()
+        self._started_at = time.monotonic()
+        self._totals = {"completed": 0, "errors": 0, "throttled": 0, "increases": 0, "decreases": 0, "wait_seconds": 0.0}
+
+    def acquire(self):
+        start = time.perf_counter()
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+            self._totals["wait_seconds"] += time.perf_counter() - start
+
+    def release(self, latency: float, outcome: str = OUTCOME_OK):
+        now = time.monotonic()
+        with self._cond:
+            self._in_flight -= 1
+            self._totals["completed"] += 1
+            self._finished_at.append(now)
+            while self._finished_at and now - self._finished_at[0] > RATE_WINDOW_SECONDS:
+                self._finished_at.popleft()
+            self._window_latencies.append(latency)
+            if outcome != OUTCOME_OK:
+                self._window_errors += 1
+                self._totals["errors"] += 1
+            if outcome == OUTCOME_THROTTLED:
+                self._totals["throttled"] += 1
+                if not self._decreased_in_window:
+                    self._decrease()
+            if len(self._window_latencies) >= self.window:
+                self._evaluate_window()
+            self._cond.notify_all()
+
+    def _decrease(self):
+        new_limit = max(self.min_limit, int(self.limit * DECREASE_FACTOR))
+        if new_limit < self.limit:
+            self.limit = new_limit
+            self._totals["decreases"] += 1
+        self._decreased_in_window = True
+
+    def _evaluate_window(self):
+        error_rate = self._window_errors / len(self._window_latencies)
+        median_latency = statistics.median(self._window_latencies)
+        healthy = error_rate <= self.max_error_rate and median_latency <= self.target_latency
+        if not healthy:
+            if not self._decreased_in_window:
+                self._decrease()
+        elif self.limit < self.max_limit:
+            self.limit += 1
+            self._totals["increases"] += 1
+        self._window_latencies = []
+        self._window_errors = 0
+        self._decreased_in_window = False
+
+    @contextmanager
+    def slot(self):
+        """Hueco de concurrencia; el bloque llama a `report(outcome)` (por defecto se cuenta como OK)."""
+        self.acquire()
+        outcome = [OUTCOME_OK]
+        start = time.perf_counter()
+        try:
+            yield lambda value: outcome.__setitem__(0, value)
+        except Exception:
+            outcome[0] = OUTCOME_ERROR
+            raise
+        finally:
+            self.release(time.perf_counter() - start, outcome[0])
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            data = dict(self._totals)
+            rate_span = min(RATE_WINDOW_SECONDS, max(1.0, time.monotonic() - self._started_at))
+            data.update({
+                "limit": self.limit, "in_flight": self._in_flight,
+                "requests_per_second": round(len(self._finished_at) / rate_span, 2),
+                "wait_seconds": round(data["wait_seconds"], 3),
+            })
+        return data
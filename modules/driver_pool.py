@@ -0,0 +1,182 @@
+# modules/driver_pool.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from modules.tracing import span
+
+# --- CONFIGURACIÓN POR DEFECTO ---
+DEFAULT_POOL_SIZE = 3
+DEFAULT_MAX_PAGES_PER_DRIVER = 150
+DEFAULT_ACQUIRE_TIMEOUT = 300
+
+
+def is_driver_alive(driver) -> bool:
+    """Comprueba que el navegador sigue respondiendo (ventanas y servicio de chromedriver)."""
+    if driver is None:
+        return False
+    try:
+        _ = driver.window_handles
+        if hasattr(driver, 'service') and driver.service and not driver.service.is_connectable():
+            return False
+        return True
+    except WebDriverException:
+        return False
+    except Exception:
+        return False
+
+
+def _quit_quietly(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class _PooledDriver:
+    __slots__ = ("driver", "pages_served", "created_at")
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages_served = 0
+        self.created_at = time.time()
+
+
+class DriverPool:
+    """
+    Pool acotado de drivers de Selenium reutilizables entre workers.
+    Cada worker toma un driver con `lease()`, lo usa para una o varias páginas y lo devuelve.
+    Los drivers muertos se reemplazan al prestarse y se reciclan tras `max_pages_per_driver` páginas.
+    """
+
+    def __init__(self, factory: Callable[[], webdriver.Chrome], max_size: int = DEFAULT_POOL_SIZE,
+                 max_pages_per_driver: int = DEFAULT_MAX_PAGES_PER_DRIVER,
+                 health_check: Callable[[object], bool] = is_driver_alive):
+        self._factory = factory
+        self._max_size = max(1, int(max_size))
+        self._max_pages = max(1, int(max_pages_per_driver))
+        self._health_check = health_check
+        # Libres (LIFO: se reutiliza el más reciente) y contador de vivos, protegidos por la misma condición:
+        # quien espera se despierta tanto si vuelve un driver como si se libera un hueco al descartar/reciclar
+        self._idle: List[_PooledDriver] = []
+        self._lock = threading.Condition()
+        self._created = 0
+        self._closed = False
+        self._metrics = {"leases": 0, "hits": 0, "misses": 0, "restarts": 0, "recycled": 0,
+                         "create_errors": 0, "wait_seconds": 0.0}
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    def _inc(self, key: str, amount=1):
+        with self._lock:
+            self._metrics[key] += amount
+
+    def _new_driver(self) -> _PooledDriver:
+        try:
+            return _PooledDriver(self._factory())
+        except Exception:
+            with self._lock:
+                self._created -= 1
+                self._metrics["create_errors"] += 1
+                self._lock.notify()
+            raise
+
+    def _take_or_reserve(self, timeout: float | None) -> _PooledDriver | None:
+        """Un driver libre, o None si se ha reservado hueco para crear uno. Espera hasta que haya una de las dos."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("DriverPool cerrado")
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self._max_size:
+                    self._created += 1
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No hay drivers libres en el pool")
+                self._lock.wait(remaining)
+
+    def _drop(self, pooled: _PooledDriver):
+        _quit_quietly(pooled.driver)
+        with self._lock:
+            self._created -= 1
+            self._lock.notify()
+
+    def acquire(self, timeout: float | None = DEFAULT_ACQUIRE_TIMEOUT) -> _PooledDriver:
+        """Presta un driver: reutiliza uno libre, crea uno si hay hueco o espera a que se libere."""
+        start = time.monotonic()
+        pooled = self._take_or_reserve(timeout)
+        if pooled is None:
+            self._inc("misses")
+            pooled = self._new_driver()
+        self._inc("wait_seconds", time.monotonic() - start)
+        self._inc("leases")
+
+        if pooled.pages_served > 0:
+            if self._health_check(pooled.driver):
+                self._inc("hits")
+            else:
+                # Driver caído: se sustituye por uno nuevo en el mismo hueco.
+                _quit_quietly(pooled.driver)
+                self._inc("restarts")
+                pooled = self._new_driver()
+        return pooled
+
+    def release(self, pooled: _PooledDriver, discard: bool = False):
+        pooled.pages_served += 1
+        if self._closed:
+            self._drop(pooled)
+            return
+        if discard:
+            self._inc("restarts")
+            self._drop(pooled)
+            return
+        if pooled.pages_served >= self._max_pages:
+            self._inc("recycled")
+            self._drop(pooled)
+            return
+        with self._lock:
+            self._idle.append(pooled)
+            self._lock.notify()
+
+    @contextmanager
+    def lease(self, timeout: float | None = DEFAULT_ACQUIRE_TIMEOUT):
+        with span("selenium.lease_wait"):
+            pooled = self.acquire(timeout=timeout)
+        discard = False
+        try:
+            yield pooled.driver
+        except TimeoutException:
+            # Una página lenta no estropea el navegador: vuelve al pool
+            raise
+        except WebDriverException:
+            # Solo se descarta si el navegador ha dejado de responder de verdad
+            discard = not self._health_check(pooled.driver)
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            m = dict(self._metrics)
+            m["alive"] = self._created
+            m["idle"] = len(self._idle)
+        reused = m["hits"]
+        m["hit_rate"] = round(reused / m["leases"], 4) if m["leases"] else 0.0
+        return m
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+        for pooled in idle:
+            self._drop(pooled)
@@ -7,82 +7,53 @@ import math
 from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+
+from modules.ah_engine import format_ah_line as format_ah_as_decimal_string_of, parse_ah_line as parse_ah_to_number_of
+from modules.ah_settlement import HALF_LOSS, HALF_WIN, LOSS, PUSH, WIN, settle_goal_line, settle_handicap
+from modules.driver_pool import DriverPool
+from modules.http_fetcher import fetch_html
+from modules.history_index import VENUE_AWAY, VENUE_HOME, index_for_soup
+from modules.history_parser import history_for_soup
+from modules.odds_extractor import empty_odds_info, odds_for_soup
+from modules.parse_cache import make_page_soup
+from modules.rate_limiter import driver_get
+from modules.page_readiness import select_and_wait
+from modules.tracing import bind, current_span, span, start_trace, traced
 import pandas as pd
 from concurrent.futures import ThreadPoolExecutor
 # Importaciones de Selenium
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait, Select
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException, ElementClickInterceptedException, NoSuchElementException
+from selenium.common.exceptions import ElementClickInterceptedException, NoSuchElementException
 
 # --- CONFIGURACIÓN GLOBAL ---
 BASE_URL_OF = "https://live18.nowgoal25.com"
 SELENIUM_TIMEOUT_SECONDS_OF = 10
 SELENIUM_POLL_FREQUENCY_OF = 0.2
 PLACEHOLDER_NODATA = "*(No disponible)*"
-
-# --- FUNCIONES HELPER PARA PARSEO Y FORMATEO ---
-def parse_ah_to_number_of(ah_line_str: str):
-    if not isinstance(ah_line_str, str): return None
-    s = ah_line_str.strip().replace(' ', '')
-    if not s or s in ['-', '?']: return None
-    original_starts_with_minus = ah_line_str.strip().startswith('-')
-    try:
-        if '/' in s:
-            parts = s.split('/')
-            if len(parts) != 2: return None
-            p1_str, p2_str = parts[0], parts[1]
-            val1 = float(p1_str)
-            val2 = float(p2_str)
-            if val1 < 0 and not p2_str.startswith('-') and val2 > 0:
-                 val2 = -abs(val2)
-            elif original_starts_with_minus and val1 == 0.0 and \
-                 (p1_str == "0" or p1_str == "-0") and \
-                 not p2_str.startswith('-') and val2 > 0:
-                val2 = -abs(val2)
-            return (val1 + val2) / 2.0
-        else:
-            return float(s)
-    except (ValueError, IndexError):
-        return None
-
-def format_ah_as_decimal_string_of(ah_line_str: str, for_sheets=False):
-    if not isinstance(ah_line_str, str) or not ah_line_str.strip() or ah_line_str.strip() in ['-', '?']:
-        return ah_line_str.strip() if isinstance(ah_line_str, str) and ah_line_str.strip() in ['-','?'] else '-'
-    numeric_value = parse_ah_to_number_of(ah_line_str)
-    if numeric_value is None:
-        return ah_line_str.strip() if ah_line_str.strip() in ['-','?'] else '-'
-    if numeric_value == 0.0: return "0"
-    sign = -1 if numeric_value < 0 else 1
-    abs_num = abs(numeric_value)
-    mod_val = abs_num % 1
-    if mod_val == 0.0: abs_rounded = abs_num
-    elif mod_val == 0.25: abs_rounded = math.floor(abs_num) + 0.25
-    elif mod_val == 0.5: abs_rounded = abs_num
-    elif mod_val == 0.75: abs_rounded = math.floor(abs_num) + 0.75
-    else:
-        if mod_val < 0.25: abs_rounded = math.floor(abs_num)
-        elif mod_val < 0.75: abs_rounded = math.floor(abs_num) + 0.5
-        else: abs_rounded = math.ceil(abs_num)
-    final_value_signed = sign * abs_rounded
-    if final_value_signed == 0.0: output_str = "0"
-    elif abs(final_value_signed - round(final_value_signed, 0)) < 1e-9 : output_str = str(int(round(final_value_signed, 0)))
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.5)) < 1e-9: output_str = f"{final_value_signed:.1f}"
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.25)) < 1e-9 or \
-         abs(final_value_signed - (math.floor(final_value_signed) + 0.75)) < 1e-9: output_str = f"{final_value_signed:.2f}".replace(".25", ".25").replace(".75", ".75")
-    else: output_str = f"{final_value_signed:.2f}"
-    if for_sheets:
-        return "'" + output_str.replace('.', ',') if output_str not in ['-','?'] else output_str
-    return output_str
+DRIVER_POOL_SIZE_OF = 3        # navegadores compartidos entre todas las sesiones
+DRIVER_LEASE_TIMEOUT_OF = 120  # segundos máximos esperando un navegador libre
 
 # --- SISTEMA EXCEPCIONAL DE ANÁLISIS DE MERCADO ---
 
+# Etiqueta y si cubre (True / False / None) para cada resultado de modules/ah_settlement
+_HANDICAP_COVER_LABELS = {
+    WIN: ("CUBIERTO", True), HALF_WIN: ("CUBIERTO A MEDIAS", True), PUSH: ("PUSH", None),
+    HALF_LOSS: ("PERDIDO A MEDIAS", False), LOSS: ("NO CUBIERTO", False),
+}
+_GOAL_LINE_COVER_LABELS = {
+    WIN: ("SUPERADA (Over)", True), HALF_WIN: ("SUPERADA A MEDIAS (Over)", True), PUSH: ("PUSH (Igual)", None),
+    HALF_LOSS: ("<span style='color: red; font-weight: bold;'>NO SUPERADA A MEDIAS (UNDER) </span>", False),
+    LOSS: ("<span style='color: red; font-weight: bold;'>NO SUPERADA (UNDER) </span>", False),
+}
+
 def check_handicap_cover(resultado_raw: str, ah_line_num: float, favorite_team_name: str, home_team_in_h2h: str, away_team_in_h2h: str, main_home_team_name: str):
     """
     Simula si un resultado histórico habría cubierto la línea de hándicap actual.
-    Maneja correctamente el Hándicap Asiático 0.
+    Maneja correctamente el Hándicap Asiático 0 y las medias ganadas/perdidas de las líneas de cuarto.
     """
     try:
         goles_h, goles_a = map(int, resultado_raw.split('-'))
@@ -91,14 +62,11 @@ def check_handicap_cover(resultado_raw: str, ah_line_num: float, favorite_team_n
         if ah_line_num == 0.0:
             # Simulamos la apuesta sobre el equipo local del partido principal
             if main_home_team_name.lower() == home_team_in_h2h.lower(): # Si nuestro local jugaba de local
-                if goles_h > goles_a: return ("CUBIERTO", True)
-                elif goles_a > goles_h: return ("NO CUBIERTO", False)
-                else: return ("PUSH", None)
+                margin = goles_h - goles_a
             else: # Si nuestro local jugaba de visitante
-                if goles_a > goles_h: return ("CUBIERTO", True)
-                elif goles_h > goles_a: return ("NO CUBIERTO", False)
-                else: return ("PUSH", None)
-        
+                margin = goles_a - goles_h
+            return _HANDICAP_COVER_LABELS[int(settle_handicap(margin, 0.0).outcome[0])]
+
         # --- LÓGICA ANTERIOR PARA HÁNDICAPS CON FAVORITO ---
         if favorite_team_name.lower() == home_team_in_h2h.lower():
             favorite_margin = goles_h - goles_a
@@ -106,28 +74,18 @@ def check_handicap_cover(resultado_raw: str, ah_line_num: float, favorite_team_n
             favorite_margin = goles_a - goles_h
         else:
             return ("indeterminado", None)
-        
-        if favorite_margin - abs(ah_line_num) > 0.05:
-            return ("CUBIERTO", True)
-        elif favorite_margin - abs(ah_line_num) < -0.05:
-            return ("NO CUBIERTO", False)
-        else:
-            return ("PUSH", None)
+        outcome = int(settle_handicap(favorite_margin, -abs(ah_line_num)).outcome[0])
+        return _HANDICAP_COVER_LABELS.get(outcome, ("indeterminado", None))
 
     except (ValueError, TypeError, AttributeError):
         return ("indeterminado", None)
 
 def check_goal_line_cover(resultado_raw: str, goal_line_num: float):
-    """Simula si un resultado histórico habría superado la línea de goles."""
+    """Simula si un resultado histórico habría superado la línea de goles (2.25, 2.75... se liquidan a medias)."""
     try:
         goles_h, goles_a = map(int, resultado_raw.split('-'))
-        total_goles = goles_h + goles_a
-        if total_goles > goal_line_num:
-            return ("SUPERADA (Over)", True)
-        elif total_goles < goal_line_num:
-            return (f"<span style='color: red; font-weight: bold;'>NO SUPERADA (UNDER) </span>", False)
-        else:
-            return ("PUSH (Igual)", None)
+        outcome = int(settle_goal_line(goles_h + goles_a, goal_line_num).outcome[0])
+        return _GOAL_LINE_COVER_LABELS.get(outcome, ("indeterminado", None))
     except (ValueError, TypeError):
         return ("indeterminado", None)
 
@@ -214,10 +172,10 @@ def _analizar_precedente_goles(precedente_data, goles_actual_num):
         return "<li><span class='score-value'>Goles:</span> No hay datos suficientes en este precedente.</li>"
     try:
         total_goles = sum(map(int, res_raw.split('-')))
-        resultado_cover, _ = check_goal_line_cover(res_raw, goles_actual_num)
-        if 'SUPERADA' in resultado_cover:
+        resultado_cover, cubierto = check_goal_line_cover(res_raw, goles_actual_num)
+        if cubierto:
             cover_html = f"<span style='color: green; font-weight: bold;'>{resultado_cover}</span>"
-        elif 'NO SUPERADA' in resultado_cover:
+        elif cubierto is False:
             cover_html = f"<span style='color: red; font-weight: bold;'>{resultado_cover}</span>"
         else: # PUSH or indeterminado
             cover_html = f"<span style='color: #6c757d; font-weight: bold;'>{resultado_cover}</span>"
@@ -226,6 +184,7 @@ def _analizar_precedente_goles(precedente_data, goles_actual_num):
     except (ValueError, TypeError):
         return "<li><span class='score-value'>Goles:</span> No se pudo procesar el resultado del precedente.</li>"
 
+@traced("market_analysis")
 def generar_analisis_completo_mercado(main_odds, h2h_data, home_name, away_name):
     """
     Función principal que orquesta y genera el análisis completo y profesional del mercado.
@@ -310,34 +269,8 @@ def generar_analisis_completo_mercado(main_odds, h2h_data, home_name, away_name)
 
 # --- FIN DEL SISTEMA DE ANÁLISIS ---
 
-def get_match_details_from_row_of(row_element, score_class_selector='score', source_table_type='h2h'):
-    try:
-        cells = row_element.find_all('td')
-        home_idx, score_idx, away_idx, ah_idx = 2, 3, 4, 11
-        if len(cells) <= ah_idx: return None
-        date_span = cells[1].find('span', attrs={'name': 'timeData'})
-        date_txt = date_span.get_text(strip=True) if date_span else ''
-        def get_cell_txt(idx):
-            a = cells[idx].find('a')
-            return a.get_text(strip=True) if a else cells[idx].get_text(strip=True)
-        home, away = get_cell_txt(home_idx), get_cell_txt(away_idx)
-        if not home or not away: return None
-        score_cell = cells[score_idx]
-        score_span = score_cell.find('span', class_=lambda c: isinstance(c, str) and score_class_selector in c)
-        score_raw_text = (score_span.get_text(strip=True) if score_span else score_cell.get_text(strip=True)) or ''
-        m = re.search(r'(\d+)\s*-\s*(\d+)', score_raw_text)
-        score_raw, score_fmt = (f"{m.group(1)}-{m.group(2)}", f"{m.group(1)}:{m.group(2)}") if m else ('?-?', '?:?')
-        ah_cell = cells[ah_idx]
-        ah_line_raw = (ah_cell.get('data-o') or ah_cell.text).strip()
-        ah_line_fmt = format_ah_as_decimal_string_of(ah_line_raw) if ah_line_raw not in ['', '-'] else '-'
-        return {
-            'date': date_txt, 'home': home, 'away': away, 'score': score_fmt,
-            'score_raw': score_raw, 'ahLine': ah_line_fmt, 'ahLine_raw': ah_line_raw or '-',
-            'matchIndex': row_element.get('index'), 'vs': row_element.get('vs'),
-            'league_id_hist': row_element.get('name')
-        }
-    except Exception:
-        return None
+def _row_ah_line(row) -> str:
+    return format_ah_as_decimal_string_of(row.ah_line_raw) if row.ah_line_raw not in ['', '-'] else '-'
 
 # --- SESIÓN Y FETCHING ---
 @st.cache_resource
@@ -353,12 +286,12 @@ def get_requests_session_of():
 @st.cache_data(ttl=7200)
 def get_match_progression_stats_data(match_id: str) -> pd.DataFrame | None:
     if not match_id or not match_id.isdigit(): return None
+    current_span().set(cache="miss")
     url = f"https://live18.nowgoal25.com/match/live-{match_id}"
     try:
-        session = get_requests_session_of()
-        response = session.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
+        _, html = fetch_html(get_requests_session_of(), url, timeout=10, max_tries=1)
+        if not html: return None
+        soup = BeautifulSoup(html, 'lxml')
         stat_titles = {"Shots": "-", "Shots on Goal": "-", "Attacks": "-", "Dangerous Attacks": "-"}
         team_tech_div = soup.find('div', id='teamTechDiv_detail')
         if team_tech_div and (stat_list := team_tech_div.find('ul', class_='stat')):
@@ -374,8 +307,13 @@ def get_match_progression_stats_data(match_id: str) -> pd.DataFrame | None:
     except requests.RequestException:
         return None
 
+def _progression_stats_traced(match_id: str) -> pd.DataFrame | None:
+    # El span se queda en cache="hit" si st.cache_data no llega a ejecutar la función
+    with span("progression.fetch", match_id=match_id, cache="hit"):
+        return get_match_progression_stats_data(match_id)
+
 def display_match_progression_stats_view(match_id: str, home_team_name: str, away_team_name: str):
-    stats_df = get_match_progression_stats_data(match_id)
+    stats_df = _progression_stats_traced(match_id)
     if stats_df is None or stats_df.empty:
         st.caption(f"No se encontraron datos de progresión para el partido ID: **{match_id}**.")
         return
@@ -407,30 +345,27 @@ def display_previous_match_progression_stats(title: str, match_id_str: str | Non
     display_match_progression_stats_view(match_id_str, home_name, away_name)
 
 # --- FUNCIONES DE EXTRACCIÓN DE DATOS ---
+@traced()
 def get_rival_a_for_original_h2h_of(soup, league_id=None):
-    if not soup or not (table := soup.find("table", id="table_v1")): return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr1_\d+")):
-        if league_id and row.get("name") != str(league_id):
+    if not soup: return None, None, None
+    for row in history_for_soup(soup).rows(1):
+        if league_id and row.league_id != str(league_id):
             continue
-        if row.get("vs") == "1" and (key_id := row.get("index")):
-            onclicks = row.find_all("a", onclick=True)
-            if len(onclicks) > 1 and (rival_tag := onclicks[1]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
-                return key_id, rival_id_match.group(1), rival_tag.text.strip()
+        if row.vs == "1" and row.match_id and row.away_id:
+            return row.match_id, row.away_id, row.away
     return None, None, None
 
+@traced()
 def get_rival_b_for_original_h2h_of(soup, league_id=None):
-    if not soup or not (table := soup.find("table", id="table_v2")): return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
-        if league_id and row.get("name") != str(league_id):
+    if not soup: return None, None, None
+    for row in history_for_soup(soup).rows(2):
+        if league_id and row.league_id != str(league_id):
             continue
-        if row.get("vs") == "1" and (key_id := row.get("index")):
-            onclicks = row.find_all("a", onclick=True)
-            if len(onclicks) > 0 and (rival_tag := onclicks[0]) and (rival_id_match := re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))):
-                return key_id, rival_id_match.group(1), rival_tag.text.strip()
+        if row.vs == "1" and row.match_id and row.home_id:
+            return row.match_id, row.home_id, row.home
     return None, None, None
 
-@st.cache_resource
-def get_selenium_driver_of():
+def create_selenium_driver_of():
     options = ChromeOptions()
     options.add_argument("--headless")
     options.add_argument("--no-sandbox")
@@ -439,51 +374,46 @@ def get_selenium_driver_of():
     options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36")
     options.add_argument('--blink-settings=imagesEnabled=false')
     options.add_argument("--window-size=1920,1080")
+    return webdriver.Chrome(options=options)
+
+@st.cache_resource
+def get_driver_pool_of():
+    # Compartido por todas las sesiones: cada análisis toma un driver en exclusiva con lease()
+    return DriverPool(create_selenium_driver_of, max_size=DRIVER_POOL_SIZE_OF)
+
+def get_h2h_details_with_pool_of(pool, key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
     try:
-        return webdriver.Chrome(options=options)
-    except WebDriverException as e:
-        st.error(f"Error inicializando Selenium driver (OF): {e}")
-        return None
+        with pool.lease(timeout=DRIVER_LEASE_TIMEOUT_OF) as driver:
+            return get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+    except TimeoutError:
+        return {"status": "error", "resultado": "N/A (Todos los navegadores ocupados)"}
+    except Exception as e:
+        return {"status": "error", "resultado": f"N/A (Navegador no disponible: {type(e).__name__})"}
 
+@traced("h2h_col3")
 def get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
     if not all([driver, key_match_id, rival_a_id, rival_b_id]):
         return {"status": "error", "resultado": "N/A (Datos incompletos para H2H)"}
     url = f"{BASE_URL_OF}/match/h2h-{key_match_id}"
     try:
-        driver.get(url)
+        driver_get(driver, url)
         WebDriverWait(driver, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "table_v2")))
-        try:
-            select = Select(WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, "hSelect_2"))))
-            select.select_by_value("8")
-            time.sleep(0.5)
-        except TimeoutException: pass
-        soup = BeautifulSoup(driver.page_source, "lxml")
+        select_and_wait(driver, "hSelect_2", "8", "table_v2")
+        soup = make_page_soup(driver.page_source, key_match_id)
     except Exception as e:
         return {"status": "error", "resultado": f"N/A (Error Selenium en H2H Col3: {type(e).__name__})"}
-    if not (table := soup.find("table", id="table_v2")):
+    if not (rows := history_for_soup(soup).rows(2)):
         return {"status": "error", "resultado": "N/A (Tabla H2H Col3 no encontrada)"}
-    for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
-        links = row.find_all("a", onclick=True)
-        if len(links) < 2: continue
-        h_id_m = re.search(r"team\((\d+)\)", links[0].get("onclick", "")); a_id_m = re.search(r"team\((\d+)\)", links[1].get("onclick", ""))
-        if not (h_id_m and a_id_m): continue
-        h_id, a_id = h_id_m.group(1), a_id_m.group(1)
-        if {h_id, a_id} == {str(rival_a_id), str(rival_b_id)}:
-            if not (score_span := row.find("span", class_="fscore_2")) or "-" not in score_span.text: continue
-            score = score_span.text.strip().split("(")[0].strip()
-            g_h, g_a = score.split("-", 1)
-            tds = row.find_all("td")
-            handicap_raw = "N/A"
-            if len(tds) > 11:
-                cell = tds[11]
-                handicap_raw = (cell.get("data-o") or cell.text).strip() or "N/A"
+    for row in rows:
+        if {row.home_id, row.away_id} == {str(rival_a_id), str(rival_b_id)} and row.home_goals is not None:
             return {
-                "status": "found", "goles_home": g_h.strip(), "goles_away": g_a.strip(),
-                "handicap": handicap_raw, "match_id": row.get('index'),
-                "h2h_home_team_name": links[0].text.strip(), "h2h_away_team_name": links[1].text.strip()
+                "status": "found", "goles_home": str(row.home_goals), "goles_away": str(row.away_goals),
+                "handicap": row.ah_line_raw if row.ah_line_raw != '-' else "N/A", "match_id": row.match_id,
+                "h2h_home_team_name": row.home, "h2h_away_team_name": row.away
             }
     return {"status": "not_found", "resultado": f"H2H directo no encontrado para {rival_a_name} vs {rival_b_name}."}
 
+@traced()
 def get_team_league_info_from_script_of(soup):
     script_tag = soup.find("script", string=re.compile(r"var _matchInfo ="))
     if not (script_tag and script_tag.string): return (None,) * 3 + ("N/A",) * 3
@@ -499,50 +429,24 @@ def get_team_league_info_from_script_of(soup):
     league_name = find_val(r"lName:\s*'([^']*)'") or "N/A"
     return home_id, away_id, league_id, home_name, away_name, league_name
 
-def _parse_date_ddmmyyyy(d: str) -> tuple:
-    m = re.search(r'(\d{2})-(\d{2})-(\d{4})', d or '')
-    return (int(m.group(3)), int(m.group(2)), int(m.group(1))) if m else (1900, 1, 1)
-
+@traced()
 def extract_last_match_in_league_of(soup, table_id, team_name, league_id, is_home_game):
-    if not soup or not (table := soup.find("table", id=table_id)): return None
-    candidate_matches = []
-    score_selector = 'fscore_1' if is_home_game else 'fscore_2'
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist')):
-            continue
-        if league_id and details.get("league_id_hist") != str(league_id):
-            continue
-        is_team_home = team_name.lower() in details.get('home', '').lower()
-        is_team_away = team_name.lower() in details.get('away', '').lower()
-        if (is_home_game and is_team_home) or (not is_home_game and is_team_away):
-            candidate_matches.append(details)
-    if not candidate_matches: return None
-    candidate_matches.sort(key=lambda x: _parse_date_ddmmyyyy(x.get('date', '')), reverse=True)
-    last_match = candidate_matches[0]
+    if not soup or not team_name: return None
+    last_match = index_for_soup(soup).last_match(team_name, VENUE_HOME if is_home_game else VENUE_AWAY, league_id, table=table_id)
+    if not last_match: return None
     return {
-        "date": last_match.get('date', 'N/A'), "home_team": last_match.get('home'),
-        "away_team": last_match.get('away'), "score": last_match.get('score_raw', 'N/A').replace('-', ':'),
-        "handicap_line_raw": last_match.get('ahLine_raw', 'N/A'), "match_id": last_match.get('matchIndex')
+        "date": last_match.date or 'N/A', "home_team": last_match.home,
+        "away_team": last_match.away, "score": last_match.score(),
+        "handicap_line_raw": last_match.ah_line_raw, "match_id": last_match.match_id
     }
 
+@traced()
 def extract_bet365_initial_odds_of(soup):
-    odds_info = {
-        "ah_home_cuota": "N/A", "ah_linea_raw": "N/A", "ah_away_cuota": "N/A",
-        "goals_over_cuota": "N/A", "goals_linea_raw": "N/A", "goals_under_cuota": "N/A"
-    }
-    if not soup: return odds_info
-    bet365_row = soup.select_one("tr#tr_o_1_8[name='earlyOdds'], tr#tr_o_1_31[name='earlyOdds']")
-    if not bet365_row: return odds_info
-    tds = bet365_row.find_all("td")
-    if len(tds) >= 11:
-        odds_info["ah_home_cuota"] = tds[2].get("data-o", tds[2].text).strip()
-        odds_info["ah_linea_raw"] = tds[3].get("data-o", tds[3].text).strip()
-        odds_info["ah_away_cuota"] = tds[4].get("data-o", tds[4].text).strip()
-        odds_info["goals_over_cuota"] = tds[8].get("data-o", tds[8].text).strip()
-        odds_info["goals_linea_raw"] = tds[9].get("data-o", tds[9].text).strip()
-        odds_info["goals_under_cuota"] = tds[10].get("data-o", tds[10].text).strip()
-    return odds_info
+    # Bet365 (o Sbobet si no está) de la comparativa de cuotas, parseada una vez por página
+    if not soup: return empty_odds_info()
+    return odds_for_soup(soup).opening_odds_info()
 
+@traced()
 def extract_standings_data_from_h2h_page_of(soup, team_name):
     """
     Extrae los datos de la tabla de clasificación (Standings) desde la página H2H.
@@ -633,6 +537,7 @@ def extract_standings_data_from_h2h_page_of(soup, team_name):
                 })
     return data
 
+@traced()
 def extract_over_under_stats_from_div_of(soup, team_type: str):
     """
     Extrae las estadísticas de Over/Under directamente desde el div de resumen.
@@ -695,35 +600,30 @@ def extract_final_score_of(soup):
     except Exception: pass
     return '?:?', '?-?'
 
+@traced()
 def extract_h2h_data_of(soup, home_name, away_name, league_id=None):
     results = {'ah1': '-', 'res1': '?:?', 'res1_raw': '?-?', 'match1_id': None, 'ah6': '-', 'res6': '?:?', 'res6_raw': '?-?', 'match6_id': None, 'h2h_gen_home': "Local (H2H Gen)", 'h2h_gen_away': "Visitante (H2H Gen)"}
-    if not soup or not home_name or not away_name or not (h2h_table := soup.find("table", id="table_v3")):
+    if not soup or not home_name or not away_name:
         return results
-    all_matches = []
-    for r in h2h_table.find_all("tr", id=re.compile(r"tr3_\d+")):
-        if (d := get_match_details_from_row_of(r, score_class_selector='fscore_3', source_table_type='h2h')):
-            if not league_id or (d.get('league_id_hist') and d.get('league_id_hist') == str(league_id)):
-                all_matches.append(d)
-    if not all_matches: return results
-    all_matches.sort(key=lambda x: _parse_date_ddmmyyyy(x.get('date', '')), reverse=True)
-    most_recent = all_matches[0]
-    results.update({'ah6': most_recent.get('ahLine', '-'), 'res6': most_recent.get('score', '?:?'), 'res6_raw': most_recent.get('score_raw', '?-?'), 'match6_id': most_recent.get('matchIndex'), 'h2h_gen_home': most_recent.get('home'), 'h2h_gen_away': most_recent.get('away')})
-    for d in all_matches:
-        if d['home'].lower() == home_name.lower() and d['away'].lower() == away_name.lower():
-            results.update({'ah1': d.get('ahLine', '-'), 'res1': d.get('score', '?:?'), 'res1_raw': d.get('score_raw', '?-?'), 'match1_id': d.get('matchIndex')})
-            break
+    index = index_for_soup(soup)
+    latest = index.latest(table=3, league_id=league_id, limit=1)
+    if not latest: return results
+    most_recent = latest[0]
+    results.update({'ah6': _row_ah_line(most_recent), 'res6': most_recent.score(), 'res6_raw': most_recent.score_raw, 'match6_id': most_recent.match_id, 'h2h_gen_home': most_recent.home, 'h2h_gen_away': most_recent.away})
+    specific = index.matches_between(home_name, away_name, VENUE_HOME, league_id, table=3, limit=1)
+    if specific:
+        row = specific[0]
+        results.update({'ah1': _row_ah_line(row), 'res1': row.score(), 'res1_raw': row.score_raw, 'match1_id': row.match_id})
     return results
 
+@traced()
 def extract_comparative_match_of(soup, table_id, main_team, opponent, league_id, is_home_table):
-    if not opponent or opponent == "N/A" or not main_team or not (table := soup.find("table", id=table_id)): return None
-    score_selector = 'fscore_1' if is_home_table else 'fscore_2'
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id[-1]}_\d+")):
-        if not (details := get_match_details_from_row_of(row, score_class_selector=score_selector, source_table_type='hist')): continue
-        if league_id and details.get('league_id_hist') and details.get('league_id_hist') != str(league_id): continue
-        h, a = details.get('home','').lower(), details.get('away','').lower()
-        main, opp = main_team.lower(), opponent.lower()
-        if (main == h and opp == a) or (main == a and opp == h):
-            return {"score": details.get('score', '?:?'), "ah_line": details.get('ahLine', '-'), "localia": 'H' if main == h else 'A', "home_team": details.get('home'), "away_team": details.get('away'), "match_id": details.get('matchIndex')}
+    if not soup or not opponent or opponent == "N/A" or not main_team: return None
+    found = index_for_soup(soup).matches_between(main_team, opponent, league_id=league_id, table=table_id, limit=1,
+                                                 keep_unknown_league=True)
+    if found:
+        row = found[0]
+        return {"score": row.score(), "ah_line": _row_ah_line(row), "localia": 'H' if row.home_key == main_team.lower() else 'A', "home_team": row.home, "away_team": row.away, "match_id": row.match_id}
     return None
 
 # --- STREAMLIT APP UI (Función principal) ---
@@ -755,9 +655,6 @@ def display_other_feature_ui2():
     analizar_button = st.sidebar.button("🚀 Analizar Partido (OF)", type="primary", use_container_width=True)
     results_container = st.container()
 
-    if 'driver_other_feature' not in st.session_state:
-        st.session_state.driver_other_feature = None
-
     if analizar_button:
         results_container.empty()
         main_match_id = "".join(filter(str.isdigit, main_match_id_str_input))
@@ -765,179 +662,183 @@ def display_other_feature_ui2():
             results_container.warning("⚠️ Por favor, ingresa un ID de partido válido."); st.stop()
 
         start_time = time.time()
-        with results_container, st.spinner("🔄 Optimizando carga y extrayendo datos..."):
-            driver = st.session_state.get('driver_other_feature') or get_selenium_driver_of()
-            st.session_state.driver_other_feature = driver
-            if not driver:
-                st.error("❌ No se pudo inicializar el WebDriver. El análisis no puede continuar."); st.stop()
-            main_page_url = f"{BASE_URL_OF}/match/h2h-{main_match_id}"
-            try:
-                driver.get(main_page_url)
-                WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "table_v1")))
-                for select_id in ["hSelect_1", "hSelect_2", "hSelect_3"]:
-                    try:
-                        Select(WebDriverWait(driver, 2).until(EC.presence_of_element_located((By.ID, select_id)))).select_by_value("8")
-                        time.sleep(0.1)
-                    except TimeoutException: continue
-                soup_completo = BeautifulSoup(driver.page_source, "lxml")
-            except Exception as e:
-                st.error(f"❌ Error crítico durante la carga de la página: {e}"); st.stop()
-            if not soup_completo:
-                st.error("❌ No se pudo obtener el contenido de la página."); st.stop()
-
-        with st.spinner("🧠 Procesando datos y realizando análisis en paralelo..."):
-            home_id, away_id, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(soup_completo)
-            home_standings = extract_standings_data_from_h2h_page_of(soup_completo, home_name)
-            away_standings = extract_standings_data_from_h2h_page_of(soup_completo, away_name)
-            home_ou_stats = extract_over_under_stats_from_div_of(soup_completo, 'home')
-            away_ou_stats = extract_over_under_stats_from_div_of(soup_completo, 'away')
-            key_match_id_rival_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup_completo, league_id)
-            _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup_completo, league_id)
-            last_home_match = extract_last_match_in_league_of(soup_completo, "table_v1", home_name, league_id, True)
-            last_away_match = extract_last_match_in_league_of(soup_completo, "table_v2", away_name, league_id, False)
-            h2h_data = extract_h2h_data_of(soup_completo, home_name, away_name, None)
-            comp_L_vs_UV_A = extract_comparative_match_of(soup_completo, "table_v1", home_name, (last_away_match or {}).get('home_team'), league_id, True)
-            comp_V_vs_UL_H = extract_comparative_match_of(soup_completo, "table_v2", away_name, (last_home_match or {}).get('away_team'), league_id, False)
-            main_match_odds_data = extract_bet365_initial_odds_of(soup_completo)
-
-            with ThreadPoolExecutor(max_workers=8) as executor:
-                future_h2h_col3 = executor.submit(get_h2h_details_for_original_logic_of, driver, key_match_id_rival_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
-                details_h2h_col3 = future_h2h_col3.result()
-
-            # ---
-            # RENDERIZACIÓN DE LA UI ---
-            st.markdown(f"<h1 class='main-title'>Análisis de Partido Avanzado (OF)</h1>", unsafe_allow_html=True)
-            st.markdown(f"<p class='sub-title'><span class='home-color'>{home_name}</span> vs <span class='away-color'>{away_name}</span></p>", unsafe_allow_html=True)
-
-            with st.expander("📊 Clasificación en Liga y Estadísticas O/U", expanded=True):
-                scol1, scol2 = st.columns(2)
-                def display_standings(col, data, team_color_class):
-                    with col:
-                        st.markdown(f"<h4 class='card-title' style='text-align: center;'><span class='{team_color_class}'>{data['name']}</span></h4>", unsafe_allow_html=True)
-                        if data and data['ranking'] != 'N/A':
-                            st.markdown(f"<p style='text-align: center;'><strong>Posición:</strong> <span class='data-highlight'>{data['ranking']}</span></p>", unsafe_allow_html=True)
-                            st.markdown("<h6>Estadísticas Totales</h6>", unsafe_allow_html=True)
-                            st.markdown(f"**PJ:** {data['total_pj']} | **V-E-D:** {data['total_v']}-{data['total_e']}-{data['total_d']} | **GF:GC:** {data['total_gf']}:{data['total_gc']}")
-                            st.markdown(f"<h6>{data.get('specific_type', 'Específicas')}</h6>", unsafe_allow_html=True)
-                            st.markdown(f"**PJ:** {data['specific_pj']} | **V-E-D:** {data['specific_v']}-{data['specific_e']}-{data['specific_d']} | **GF:GC:** {data['specific_gf']}:{data['specific_gc']}")
-                        else:
-                            st.info("Datos de clasificación no disponibles.")
+        with start_trace("analisis_estudio", match_id=main_match_id) as trace:
+            with results_container, st.spinner("🔄 Optimizando carga y extrayendo datos..."):
+                driver_pool = get_driver_pool_of()
+                main_page_url = f"{BASE_URL_OF}/match/h2h-{main_match_id}"
+                try:
+                    with driver_pool.lease(timeout=DRIVER_LEASE_TIMEOUT_OF) as driver:
+                        driver_get(driver, main_page_url)
+                        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "table_v1")))
+                        for table_num in (1, 2, 3):
+                            select_and_wait(driver, f"hSelect_{table_num}", "8", f"table_v{table_num}")
+                        soup_completo = make_page_soup(driver.page_source, main_match_id)
+                except TimeoutError:
+                    st.error("❌ Todos los navegadores están ocupados con otros análisis. Inténtalo de nuevo en unos segundos."); st.stop()
+                except Exception as e:
+                    st.error(f"❌ Error crítico durante la carga de la página: {e}"); st.stop()
+                if not soup_completo:
+                    st.error("❌ No se pudo obtener el contenido de la página."); st.stop()
+
+            with st.spinner("🧠 Procesando datos y realizando análisis en paralelo..."):
+                home_id, away_id, league_id, home_name, away_name, _ = get_team_league_info_from_script_of(soup_completo)
+                home_standings = extract_standings_data_from_h2h_page_of(soup_completo, home_name)
+                away_standings = extract_standings_data_from_h2h_page_of(soup_completo, away_name)
+                home_ou_stats = extract_over_under_stats_from_div_of(soup_completo, 'home')
+                away_ou_stats = extract_over_under_stats_from_div_of(soup_completo, 'away')
+                key_match_id_rival_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup_completo, league_id)
+                _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup_completo, league_id)
+                last_home_match = extract_last_match_in_league_of(soup_completo, "table_v1", home_name, league_id, True)
+                last_away_match = extract_last_match_in_league_of(soup_completo, "table_v2", away_name, league_id, False)
+                h2h_data = extract_h2h_data_of(soup_completo, home_name, away_name, None)
+                comp_L_vs_UV_A = extract_comparative_match_of(soup_completo, "table_v1", home_name, (last_away_match or {}).get('home_team'), league_id, True)
+                comp_V_vs_UL_H = extract_comparative_match_of(soup_completo, "table_v2", away_name, (last_home_match or {}).get('away_team'), league_id, False)
+                main_match_odds_data = extract_bet365_initial_odds_of(soup_completo)
+
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    future_h2h_col3 = executor.submit(bind(get_h2h_details_with_pool_of), driver_pool, key_match_id_rival_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+                    details_h2h_col3 = future_h2h_col3.result()
+
+                with span("render"):
+                    # ---
+                    # RENDERIZACIÓN DE LA UI ---
+                    st.markdown(f"<h1 class='main-title'>Análisis de Partido Avanzado (OF)</h1>", unsafe_allow_html=True)
+                    st.markdown(f"<p class='sub-title'><span class='home-color'>{home_name}</span> vs <span class='away-color'>{away_name}</span></p>", unsafe_allow_html=True)
+
+                    with st.expander("📊 Clasificación en Liga y Estadísticas O/U", expanded=True):
+                        scol1, scol2 = st.columns(2)
+                        def display_standings(col, data, team_color_class):
+                            with col:
+                                st.markdown(f"<h4 class='card-title' style='text-align: center;'><span class='{team_color_class}'>{data['name']}</span></h4>", unsafe_allow_html=True)
+                                if data and data['ranking'] != 'N/A':
+                                    st.markdown(f"<p style='text-align: center;'><strong>Posición:</strong> <span class='data-highlight'>{data['ranking']}</span></p>", unsafe_allow_html=True)
+                                    st.markdown("<h6>Estadísticas Totales</h6>", unsafe_allow_html=True)
+                                    st.markdown(f"**PJ:** {data['total_pj']} | **V-E-D:** {data['total_v']}-{data['total_e']}-{data['total_d']} | **GF:GC:** {data['total_gf']}:{data['total_gc']}")
+                                    st.markdown(f"<h6>{data.get('specific_type', 'Específicas')}</h6>", unsafe_allow_html=True)
+                                    st.markdown(f"**PJ:** {data['specific_pj']} | **V-E-D:** {data['specific_v']}-{data['specific_e']}-{data['specific_d']} | **GF:GC:** {data['specific_gf']}:{data['specific_gc']}")
+                                else:
+                                    st.info("Datos de clasificación no disponibles.")
                 
-                display_standings(scol1, home_standings, "home-color")
-                display_standings(scol2, away_standings, "away-color")
-
-                st.markdown("<hr style='margin: 10px 0;'>", unsafe_allow_html=True)
-
-                def display_over_under_stats(col, stats):
-                    with col:
-                        st.markdown(f"<h6 style='text-align: center; margin-top: 15px;'>Over/Under Odds % (Últ. {stats['total']} partidos)</h6>", unsafe_allow_html=True)
-                        if stats['total'] > 0:
-                            over_pct = stats['over_pct']
-                            under_pct = stats['under_pct']
-                            push_pct = stats['push_pct']
-                            html = f"""
-                            <div style='text-align: center;'>
-                                <span style='color: green; font-weight: bold;'>Over: {over_pct:.1f}%</span> |
-                                <span style='color: red; font-weight: bold;'>Under: {under_pct:.1f}%</span> |
-                                <span style='color: grey; font-weight: bold;'>Push: {push_pct:.1f}%</span>
-                            </div>
-                            """
-                            st.markdown(html, unsafe_allow_html=True)
-                        else:
-                            st.markdown("<p style='text-align: center;'>No hay datos de partidos para calcular.</p>", unsafe_allow_html=True)
-
-                display_over_under_stats(scol1, home_ou_stats)
-                display_over_under_stats(scol2, away_ou_stats)
-
-            st.markdown("<h2 class='section-header'>🎯 Análisis Detallado del Partido</h2>", unsafe_allow_html=True)
+                        display_standings(scol1, home_standings, "home-color")
+                        display_standings(scol2, away_standings, "away-color")
+
+                        st.markdown("<hr style='margin: 10px 0;'>", unsafe_allow_html=True)
+
+                        def display_over_under_stats(col, stats):
+                            with col:
+                                st.markdown(f"<h6 style='text-align: center; margin-top: 15px;'>Over/Under Odds % (Últ. {stats['total']} partidos)</h6>", unsafe_allow_html=True)
+                                if stats['total'] > 0:
+                                    over_pct = stats['over_pct']
+                                    under_pct = stats['under_pct']
+                                    push_pct = stats['push_pct']
+                                    html = f"""
+                                    <div style='text-align: center;'>
+                                        <span style='color: green; font-weight: bold;'>Over: {over_pct:.1f}%</span> |
+                                        <span style='color: red; font-weight: bold;'>Under: {under_pct:.1f}%</span> |
+                                        <span style='color: grey; font-weight: bold;'>Push: {push_pct:.1f}%</span>
+                                    </div>
+                                    """
+                                    st.markdown(html, unsafe_allow_html=True)
+                                else:
+                                    st.markdown("<p style='text-align: center;'>No hay datos de partidos para calcular.</p>", unsafe_allow_html=True)
+
+                        display_over_under_stats(scol1, home_ou_stats)
+                        display_over_under_stats(scol2, away_ou_stats)
+
+                    st.markdown("<h2 class='section-header'>🎯 Análisis Detallado del Partido</h2>", unsafe_allow_html=True)
             
-            with st.expander("⚖️ Cuotas Iniciales (Bet365) y Marcador Final", expanded=True):
-                o_col1, o_col2 = st.columns(2)
-                o_col1.metric("AH (Línea Inicial)", format_ah_as_decimal_string_of(main_match_odds_data.get('ah_linea_raw', '?')) or PLACEHOLDER_NODATA)
-                o_col2.metric("Goles (Línea Inicial)", format_ah_as_decimal_string_of(main_match_odds_data.get('goals_linea_raw', '?')) or PLACEHOLDER_NODATA)
-
-            # Placeholder para el análisis de mercado completo
-            market_analysis_placeholder = st.empty()
-
-            st.markdown("<h3 class='section-header' style='font-size:1.5em; margin-top:30px;'>⚡ Rendimiento Reciente y H2H Indirecto</h3>", unsafe_allow_html=True)
-            rp_col1, rp_col2, rp_col3 = st.columns(3)
-            with rp_col1:
-                st.markdown(f"<h4 class='card-title'>Último <span class='home-color'>{home_name}</span> (Casa)</h4>", unsafe_allow_html=True)
-                if last_home_match:
-                    res = last_home_match
-                    st.markdown(f"<div style='margin: 8px 0;'><span class='home-color'>{res['home_team']}</span> <span class='score-value'>{res['score']}</span> <span class='away-color'>{res['away_team']}</span></div>", unsafe_allow_html=True)
-                    st.markdown(f"**AH:** <span class='ah-value'>{format_ah_as_decimal_string_of(res.get('handicap_line_raw','-'))}</span>", unsafe_allow_html=True)
-                    display_previous_match_progression_stats(f"Últ. {res.get('home_team','L')} vs {res.get('away_team','V')}", res.get('match_id'), res.get('home_team'), res.get('away_team'))
-                else: st.info(f"No se encontró último partido en casa para {home_name}.")
-            with rp_col2:
-                st.markdown(f"<h4 class='card-title'>Último <span class='away-color'>{away_name}</span> (Fuera)</h4>", unsafe_allow_html=True)
-                if last_away_match:
-                    res = last_away_match
-                    st.markdown(f"<div style='margin: 8px 0;'><span class='home-color'>{res['home_team']}</span> <span class='score-value'>{res['score']}</span> <span class='away-color'>{res['away_team']}</span></div>", unsafe_allow_html=True)
-                    st.markdown(f"**AH:** <span class='ah-value'>{format_ah_as_decimal_string_of(res.get('handicap_line_raw','-'))}</span>", unsafe_allow_html=True)
-                    display_previous_match_progression_stats(f"Últ. {res.get('away_team','V')} vs {res.get('home_team','L')}", res.get('match_id'), res.get('home_team'), res.get('away_team'))
-                else: st.info(f"No se encontró último partido fuera para {away_name}.")
-            with rp_col3:
-                st.markdown(f"<h4 class='card-title'>🆚 H2H Rivales (Col3)</h4>", unsafe_allow_html=True)
-                if details_h2h_col3.get("status") == "found":
-                    res = details_h2h_col3
-                    h_name, a_name = res.get('h2h_home_team_name'), res.get('h2h_away_team_name')
-                    st.markdown(f"<span class='home-color'>{h_name}</span> <span class='score-value'>{res.get('goles_home', '?')}:{res.get('goles_away', '?')}</span> <span class='away-color'>{a_name}</span>", unsafe_allow_html=True)
-                    st.markdown(f"**AH:** <span class='ah-value'>{format_ah_as_decimal_string_of(res.get('handicap','-'))}</span>", unsafe_allow_html=True)
-                    display_previous_match_progression_stats(f"H2H Col3: {h_name} vs {a_name}", res.get('match_id'), h_name, a_name)
-                else: st.info(details_h2h_col3.get('resultado', "No disponible."))
-
-            st.divider() 
-            with st.expander("🔁 Comparativas Indirectas Detalladas", expanded=True):
-                def display_comp(col, title_html, data, main_team_name):
-                    with col:
-                        st.markdown(f"<h5 class='card-subtitle'>{title_html}</h5>", unsafe_allow_html=True)
-                        if data:
-                            st.markdown(f"⚽ **Res:** <span class='data-highlight'>{data['score']}</span> ({data.get('home_team')} vs {data.get('away_team')})", unsafe_allow_html=True)
-                            st.markdown(f"⚖️ **AH:** <span class='ah-value'>{format_ah_as_decimal_string_of(data.get('ah_line', '-'))}</span>", unsafe_allow_html=True)
-                            st.markdown(f"🏟️ **Localía de '{main_team_name}':** <span class='data-highlight'>{data.get('localia', '-')}</span>", unsafe_allow_html=True)
-                            display_previous_match_progression_stats(f"Comp: {data.get('home_team')} vs {data.get('away_team')}", data.get('match_id'), data.get('home_team'), data.get('away_team'))
-                        else: st.info("Comparativa no disponible.")
-                comp_col1, comp_col2 = st.columns(2)
-                title1 = f"<span class='home-color'>{home_name}</span> vs. <span class='away-color'>Últ. Rival de {away_name}</span>"
-                title2 = f"<span class='away-color'>{away_name}</span> vs. <span class='home-color'>Últ. Rival de {home_name}</span>"
-                display_comp(comp_col1, title1, comp_L_vs_UV_A, home_name)
-                display_comp(comp_col2, title2, comp_V_vs_UL_H, away_name)
-
-            st.divider()
-            with st.expander("🔰 Enfrentamientos directos entre lso equipos", expanded=True):
-                    h2h_col1, h2h_col2 = st.columns(2)
-                    with h2h_col1:
-                        st.markdown(f"<h4 class='card-title'>Ultimo partido entre ellos en este estadio (<span class='home-color'>{home_name}</span> Casa)</h4>", unsafe_allow_html=True)
-                        if h2h_data['res1'] != '?:?':
-                            st.markdown(f"<div style='margin: 8px 0;'><span class='home-color'>{home_name}</span> <span class='score-value'>{h2h_data['res1']}</span> <span class='away-color'>{away_name}</span></div>", unsafe_allow_html=True)
-                            st.markdown(f"**Handicap Inicial:** <span class='ah-value'>{h2h_data['ah1']}</span>", unsafe_allow_html=True)
-                            if h2h_data['match1_id']:
-                                display_previous_match_progression_stats(f"H2H: {home_name} (C) vs {away_name}", h2h_data['match1_id'], home_name, away_name)
-                        else:
-                            st.info(f"No se encontró H2H con {home_name} en casa.")
-                    with h2h_col2:
-                        st.markdown(f"<h4 class='card-title'>Ultimo partido entre ellos es decir en el estadio de <span class='away-color'>{away_name}</span> </h4>", unsafe_allow_html=True)
-                        if h2h_data['res6'] != '?:?':
-                            h_gen_name = h2h_data['h2h_gen_home']
-                            a_gen_name = h2h_data['h2h_gen_away']
-                            st.markdown(f"<div style='margin: 8px 0;'><span class='home-color'>{h_gen_name}</span> <span class='score-value'>{h2h_data['res6']}</span> <span class='away-color'>{a_gen_name}</span></div>", unsafe_allow_html=True)
-                            st.markdown(f"**Handicap Inicial** <span class='ah-value'>{h2h_data['ah6']}</span>", unsafe_allow_html=True)
-                            if h2h_data['match6_id']:
-                                display_previous_match_progression_stats(f"H2H Gen: {h_gen_name} vs {a_gen_name}", h2h_data['match6_id'], h_gen_name, a_gen_name)
-                        else:
-                            st.info("No se encontró H2H general.")
-
-            st.divider() 
+                    with st.expander("⚖️ Cuotas Iniciales (Bet365) y Marcador Final", expanded=True):
+                        o_col1, o_col2 = st.columns(2)
+                        o_col1.metric("AH (Línea Inicial)", format_ah_as_decimal_string_of(main_match_odds_data.get('ah_linea_raw', '?')) or PLACEHOLDER_NODATA)
+                        o_col2.metric("Goles (Línea Inicial)", format_ah_as_decimal_string_of(main_match_odds_data.get('goals_linea_raw', '?')) or PLACEHOLDER_NODATA)
+
+                    # Placeholder para el análisis de mercado completo
+                    market_analysis_placeholder = st.empty()
+
+                    st.markdown("<h3 class='section-header' style='font-size:1.5em; margin-top:30px;'>⚡ Rendimiento Reciente y H2H Indirecto</h3>", unsafe_allow_html=True)
+                    rp_col1, rp_col2, rp_col3 = st.columns(3)
+                    with rp_col1:
+                        st.markdown(f"<h4 class='card-title'>Último <span class='home-color'>{home_name}</span> (Casa)</h4>", unsafe_allow_html=True)
+                        if last_home_match:
+                            res = last_home_match
+                            st.markdown(f"<div style='margin: 8px 0;'><span class='home-color'>{res['home_team']}</span> <span class='score-value'>{res['score']}</span> <span class='away-color'>{res['away_team']}</span></div>", unsafe_allow_html=True)
+                            st.markdown(f"**AH:** <span class='ah-value'>{format_ah_as_decimal_string_of(res.get('handicap_line_raw','-'))}</span>", unsafe_allow_html=True)
+                            display_previous_match_progression_stats(f"Últ. {res.get('home_team','L')} vs {res.get('away_team','V')}", res.get('match_id'), res.get('home_team'), res.get('away_team'))
+                        else: st.info(f"No se encontró último partido en casa para {home_name}.")
+                    with rp_col2:
+                        st.markdown(f"<h4 class='card-title'>Último <span class='away-color'>{away_name}</span> (Fuera)</h4>", unsafe_allow_html=True)
+                        if last_away_match:
+                            res = last_away_match
+                            st.markdown(f"<div style='margin: 8px 0;'><span class='home-color'>{res['home_team']}</span> <span class='score-value'>{res['score']}</span> <span class='away-color'>{res['away_team']}</span></div>", unsafe_allow_html=True)
+                            st.markdown(f"**AH:** <span class='ah-value'>{format_ah_as_decimal_string_of(res.get('handicap_line_raw','-'))}</span>", unsafe_allow_html=True)
+                            display_previous_match_progression_stats(f"Últ. {res.get('away_team','V')} vs {res.get('home_team','L')}", res.get('match_id'), res.get('home_team'), res.get('away_team'))
+                        else: st.info(f"No se encontró último partido fuera para {away_name}.")
+                    with rp_col3:
+                        st.markdown(f"<h4 class='card-title'>🆚 H2H Rivales (Col3)</h4>", unsafe_allow_html=True)
+                        if details_h2h_col3.get("status") == "found":
+                            res = details_h2h_col3
+                            h_name, a_name = res.get('h2h_home_team_name'), res.get('h2h_away_team_name')
+                            st.markdown(f"<span class='home-color'>{h_name}</span> <span class='score-value'>{res.get('goles_home', '?')}:{res.get('goles_away', '?')}</span> <span class='away-color'>{a_name}</span>", unsafe_allow_html=True)
+                            st.markdown(f"**AH:** <span class='ah-value'>{format_ah_as_decimal_string_of(res.get('handicap','-'))}</span>", unsafe_allow_html=True)
+                            display_previous_match_progression_stats(f"H2H Col3: {h_name} vs {a_name}", res.get('match_id'), h_name, a_name)
+                        else: st.info(details_h2h_col3.get('resultado', "No disponible."))
+
+                    st.divider() 
+                    with st.expander("🔁 Comparativas Indirectas Detalladas", expanded=True):
+                        def display_comp(col, title_html, data, main_team_name):
+                            with col:
+                                st.markdown(f"<h5 class='card-subtitle'>{title_html}</h5>", unsafe_allow_html=True)
+                                if data:
+                                    st.markdown(f"⚽ **Res:** <span class='data-highlight'>{data['score']}</span> ({data.get('home_team')} vs {data.get('away_team')})", unsafe_allow_html=True)
+                                    st.markdown(f"⚖️ **AH:** <span class='ah-value'>{format_ah_as_decimal_string_of(data.get('ah_line', '-'))}</span>", unsafe_allow_html=True)
+                                    st.markdown(f"🏟️ **Localía de '{main_team_name}':** <span class='data-highlight'>{data.get('localia', '-')}</span>", unsafe_allow_html=True)
+                                    display_previous_match_progression_stats(f"Comp: {data.get('home_team')} vs {data.get('away_team')}", data.get('match_id'), data.get('home_team'), data.get('away_team'))
+                                else: st.info("Comparativa no disponible.")
+                        comp_col1, comp_col2 = st.columns(2)
+                        title1 = f"<span class='home-color'>{home_name}</span> vs. <span class='away-color'>Últ. Rival de {away_name}</span>"
+                        title2 = f"<span class='away-color'>{away_name}</span> vs. <span class='home-color'>Últ. Rival de {home_name}</span>"
+                        display_comp(comp_col1, title1, comp_L_vs_UV_A, home_name)
+                        display_comp(comp_col2, title2, comp_V_vs_UL_H, away_name)
+
+                    st.divider()
+                    with st.expander("🔰 Enfrentamientos directos entre lso equipos", expanded=True):
+                            h2h_col1, h2h_col2 = st.columns(2)
+                            with h2h_col1:
+                                st.markdown(f"<h4 class='card-title'>Ultimo partido entre ellos en este estadio (<span class='home-color'>{home_name}</span> Casa)</h4>", unsafe_allow_html=True)
+                                if h2h_data['res1'] != '?:?':
+                                    st.markdown(f"<div style='margin: 8px 0;'><span class='home-color'>{home_name}</span> <span class='score-value'>{h2h_data['res1']}</span> <span class='away-color'>{away_name}</span></div>", unsafe_allow_html=True)
+                                    st.markdown(f"**Handicap Inicial:** <span class='ah-value'>{h2h_data['ah1']}</span>", unsafe_allow_html=True)
+                                    if h2h_data['match1_id']:
+                                        display_previous_match_progression_stats(f"H2H: {home_name} (C) vs {away_name}", h2h_data['match1_id'], home_name, away_name)
+                                else:
+                                    st.info(f"No se encontró H2H con {home_name} en casa.")
+                            with h2h_col2:
+                                st.markdown(f"<h4 class='card-title'>Ultimo partido entre ellos es decir en el estadio de <span class='away-color'>{away_name}</span> </h4>", unsafe_allow_html=True)
+                                if h2h_data['res6'] != '?:?':
+                                    h_gen_name = h2h_data['h2h_gen_home']
+                                    a_gen_name = h2h_data['h2h_gen_away']
+                                    st.markdown(f"<div style='margin: 8px 0;'><span class='home-color'>{h_gen_name}</span> <span class='score-value'>{h2h_data['res6']}</span> <span class='away-color'>{a_gen_name}</span></div>", unsafe_allow_html=True)
+                                    st.markdown(f"**Handicap Inicial** <span class='ah-value'>{h2h_data['ah6']}</span>", unsafe_allow_html=True)
+                                    if h2h_data['match6_id']:
+                                        display_previous_match_progression_stats(f"H2H Gen: {h_gen_name} vs {a_gen_name}", h2h_data['match6_id'], h_gen_name, a_gen_name)
+                                else:
+                                    st.info("No se encontró H2H general.")
+
+                    st.divider() 
             
-            # ---
-            # CÁLCULO Y RENDERIZADO DEL ANÁLISIS DE MERCADO COMPLETO ---
-            with st.spinner("🔍 Generando análisis de mercado..."):
-                analisis_texto = generar_analisis_completo_mercado(main_match_odds_data, h2h_data, home_name, away_name)
-                if analisis_texto:
-                    market_analysis_placeholder.markdown(analisis_texto, unsafe_allow_html=True)
-
-            st.sidebar.success(f"🎉 Análisis completado en {time.time() - start_time:.2f} segundos.")
+                # ---
+                # CÁLCULO Y RENDERIZADO DEL ANÁLISIS DE MERCADO COMPLETO ---
+                with st.spinner("🔍 Generando análisis de mercado..."):
+                    analisis_texto = generar_analisis_completo_mercado(main_match_odds_data, h2h_data, home_name, away_name)
+                    if analisis_texto:
+                        market_analysis_placeholder.markdown(analisis_texto, unsafe_allow_html=True)
+
+                st.sidebar.success(f"🎉 Análisis completado en {time.time() - start_time:.2f} segundos.")
+                pool_stats = driver_pool.stats()
+                st.sidebar.caption(f"Navegadores: {pool_stats['alive']} activos, {pool_stats['idle']} libres, "
+                                   f"espera acumulada {pool_stats['wait_seconds']:.1f}s en {pool_stats['leases']} préstamos.")
+                if stage_summary := trace.summary():
+                    st.sidebar.caption(f"Etapas más lentas: {stage_summary}")
     else:
         results_container.info("✨ ¡Bienvenido! Ingresa un ID de partido y haz clic en 'Analizar Partido (OF)'.")
 
@@ -4,12 +4,23 @@ import streamlit as st # Mantener por ahora para las funciones de cache, se eval
 import time
 import requests
 import re
-import math
 import pandas as pd
 from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from modules.ah_engine import format_ah_line as format_ah_as_decimal_string_of
+from modules.async_fetcher import AsyncFetcher
+from modules.browser_backend import get_browser_backend
+from modules.http_fetcher import fetch_html
+from modules.odds_extractor import odds_for_soup, parse_match_odds
+from modules.parse_cache import cached_extractor, get_parse_cache, make_page_soup
+from modules.history_index import VENUE_AWAY, VENUE_HOME, index_for_soup
+from modules.history_parser import history_for_soup
+from modules.rate_limiter import driver_get
+from modules.page_readiness import wait_for_rows_stable
+from modules.tracing import span, start_trace, traced
+
 # Importaciones de Selenium (solo si son estrictamente necesarias tras optimización)
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options as ChromeOptions
@@ -25,96 +36,6 @@ SELENIUM_POLL_FREQUENCY_OF = 0.2
 PLACEHOLDER_NODATA = "*(No disponible)*"
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36"
 
-# --- FUNCIONES HELPER PARA PARSEO Y FORMATEO (Replicadas de datos.py) ---
-def parse_ah_to_number_of(ah_line_str: str):
-    if not isinstance(ah_line_str, str): return None
-    s = ah_line_str.strip().replace(' ', '')
-    if not s or s in ['-', '?']: return None
-    original_starts_with_minus = ah_line_str.strip().startswith('-')
-    try:
-        if '/' in s:
-            parts = s.split('/')
-            if len(parts) != 2: return None
-            p1_str, p2_str = parts[0], parts[1]
-            try: val1 = float(p1_str)
-            except ValueError: return None
-            try: val2 = float(p2_str)
-            except ValueError: return None
-            if val1 < 0 and not p2_str.startswith('-') and val2 > 0:
-                 val2 = -abs(val2)
-            elif original_starts_with_minus and val1 == 0.0 and \
-                 (p1_str == "0" or p1_str == "-0") and \
-                 not p2_str.startswith('-') and val2 > 0:
-                val2 = -abs(val2)
-            return (val1 + val2) / 2.0
-        else:
-            return float(s)
-    except ValueError:
-        return None
-
-def format_ah_as_decimal_string_of(ah_line_str: str, for_sheets=False):
-    if not isinstance(ah_line_str, str) or not ah_line_str.strip() or ah_line_str.strip() in ['-', '?']:
-        return ah_line_str.strip() if isinstance(ah_line_str, str) and ah_line_str.strip() in ['-','?'] else '-'
-
-    numeric_value = parse_ah_to_number_of(ah_line_str)
-    if numeric_value is None:
-        return ah_line_str.strip() if ah_line_str.strip() in ['-','?'] else '-'
-
-    if numeric_value == 0.0: return "0"
-
-    sign = -1 if numeric_value < 0 else 1
-    abs_num = abs(numeric_value)
-    mod_val = abs_num % 1
-
-    if mod_val == 0.0: abs_rounded = abs_num
-    elif mod_val == 0.25: abs_rounded = math.floor(abs_num) + 0.25
-    elif mod_val == 0.5: abs_rounded = abs_num
-    elif mod_val == 0.75: abs_rounded = math.floor(abs_num) + 0.75
-    else:
-        if mod_val < 0.25: abs_rounded = math.floor(abs_num)
-        elif mod_val < 0.75: abs_rounded = math.floor(abs_num) + 0.5
-        else: abs_rounded = math.ceil(abs_num)
-
-    final_value_signed = sign * abs_rounded
-
-    if final_value_signed == 0.0: output_str = "0"
-    elif abs(final_value_signed - round(final_value_signed, 0)) < 1e-9 : output_str = str(int(round(final_value_signed, 0)))
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.5)) < 1e-9: output_str = f"{final_value_signed:.1f}"
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.25)) < 1e-9 or \
-         abs(final_value_signed - (math.floor(final_value_signed) + 0.75)) < 1e-9: output_str = f"{final_value_signed:.2f}".replace(".25", ".25").replace(".75", ".75")
-    else: output_str = f"{final_value_signed:.2f}"
-
-    if for_sheets: # Esta parte podría eliminarse si no se usa para Google Sheets directamente
-        return "'" + output_str.replace('.', ',') if output_str not in ['-','?'] else output_str
-    return output_str
-
-def get_match_details_from_row_of(row_element, score_class_selector='score', source_table_type='h2h'):
-    # Replicada de datos.py, ajustada para devolver match_id consistentemente
-    try:
-        cells = row_element.find_all('td')
-        if len(cells) < 12: return None
-        league_id_hist_attr = row_element.get('name')
-        home_idx, score_idx, away_idx, ah_idx = 2, 3, 4, 11
-        home_tag = cells[home_idx].find('a'); home = home_tag.text.strip() if home_tag else cells[home_idx].text.strip()
-        away_tag = cells[away_idx].find('a'); away = away_tag.text.strip() if away_tag else cells[away_idx].text.strip()
-        score_cell_content = cells[score_idx].text.strip()
-        score_span = cells[score_idx].find('span', class_=lambda x: x and score_class_selector in x)
-        score_raw_text = score_span.text.strip() if score_span else score_cell_content
-        score_m = re.match(r'(\d+-\d+)', score_raw_text); score_raw = score_m.group(1) if score_m else '?-?'
-        score_fmt = score_raw.replace('-', ':') if score_raw != '?-?' else '?:?'
-        ah_line_raw_text = cells[ah_idx].text.strip()
-        ah_line_fmt = format_ah_as_decimal_string_of(ah_line_raw_text)
-        match_id = row_element.get('index') # Este es el ID del partido histórico
-        if not home or not away: return None
-        return {'home': home, 'away': away, 'score': score_fmt, 'score_raw': score_raw,
-                'ahLine': ah_line_fmt, 'ahLine_raw': ah_line_raw_text,
-                'match_id': match_id, # Usar 'match_id' consistentemente
-                'vs': row_element.get('vs'),
-                'league_id_hist': league_id_hist_attr}
-    except Exception:
-        # Considerar logging del error si es necesario
-        return None
-
 # --- SESIÓN Y FETCHING (Replicado y optimizado) ---
 @st.cache_resource # Mantener cache_resource para la sesión
 def get_requests_session_of():
@@ -125,27 +46,15 @@ def get_requests_session_of():
     session.headers.update({"User-Agent": USER_AGENT})
     return session
 
-@st.cache_data(ttl=1800) # Reducir TTL si los datos cambian más frecuentemente, o ajustar según necesidad
-async def fetch_soup_async(path, session):
-    url = f"{BASE_URL_OF}{path}"
-    try:
-        # Usar un cliente HTTP asíncrono como httpx si se quieren paralelizar estas llamadas
-        # Por ahora, se mantiene síncrono dentro de una función async para futura integración
-        # Para un verdadero beneficio async, la llamada session.get() debería ser async.
-        # Esto requeriría cambiar get_requests_session_of para devolver un cliente async.
-        # Por simplicidad inicial, se deja síncrono pero la función es async.
-        loop = asyncio.get_event_loop()
-        resp = await loop.run_in_executor(None, session.get, url, {"timeout": 8}) # Timeout reducido
-        resp.raise_for_status()
-        return BeautifulSoup(resp.text, "lxml") # Usar lxml para parseo más rápido
-    except requests.RequestException as e:
-        # Considerar logging
-        # print(f"Error fetching {url}: {e}")
-        return None
+async def fetch_soup_async(path, fetcher: AsyncFetcher):
+    # Descarga real en el event loop con el cliente async compartido (HTTP/2, límite por host).
+    html = await fetcher.fetch_text(f"{BASE_URL_OF}{path}")
+    if not html: return None
+    return make_page_soup(html, path) # lxml + versión de página para la caché de extractores
 
 # --- FUNCIONES DE EXTRACCIÓN DE DATOS (Reimplementadas y optimizadas) ---
 
-@st.cache_data(ttl=3600)
+@cached_extractor
 def get_team_league_info_from_script_of(soup: BeautifulSoup):
     # Replicada de datos.py
     home_id, away_id, league_id, home_name, away_name, league_name = (None,)*3 + ("N/A",)*3
@@ -167,7 +76,7 @@ def get_team_league_info_from_script_of(soup: BeautifulSoup):
         if l_name_m: league_name = l_name_m.group(1).replace("\\'", "'")
     return home_id, away_id, league_id, home_name, away_name, league_name
 
-@st.cache_data(ttl=3600)
+@cached_extractor
 def extract_standings_data_from_h2h_page_of(h2h_soup: BeautifulSoup, target_team_name_exact: str):
     # Replicada de datos.py, asegurar selectores eficientes
     data = {
@@ -240,77 +149,48 @@ def extract_standings_data_from_h2h_page_of(h2h_soup: BeautifulSoup, target_team
                 data.update({"specific_pj": pj, "specific_v": v, "specific_e": e, "specific_d": d, "specific_gf": gf, "specific_gc": gc})
     return data
 
+def find_rival_a_in_soup(soup_h2h_page: BeautifulSoup):
+    # Rival A: último rival del local (table_v1) con enlace a su página H2H
+    if not soup_h2h_page: return None, None, None
+    for row in history_for_soup(soup_h2h_page).rows(1):
+        if row.vs == "1" and row.match_id and row.away_id and row.away:
+            return row.match_id, row.away_id, row.away
+    return None, None, None
+
+def find_rival_b_in_soup(soup_h2h_page: BeautifulSoup):
+    # Rival B: último rival del visitante (table_v2); es el equipo local de esa fila
+    if not soup_h2h_page: return None, None, None
+    for row in history_for_soup(soup_h2h_page).rows(2):
+        if row.vs == "1" and row.match_id and row.home_id and row.home:
+            return row.match_id, row.home_id, row.home
+    return None, None, None
+
 @st.cache_data(ttl=3600)
 def get_rival_a_for_original_h2h_of(main_match_id: int, session_requests): # Pasar session
-    # path = f"/match/h2h-{main_match_id}" # No es async todavía
-    # soup_h2h_page = await fetch_soup_async(path, session_requests) # Necesitaría ser llamada con await
-    # Por ahora, usamos la versión síncrona de fetch_soup_requests_of
-    soup_h2h_page = fetch_soup_requests_sync(f"/match/h2h-{main_match_id}", session_requests)
-
-    if not soup_h2h_page: return None, None, None, None
-    table = soup_h2h_page.select_one("table#table_v1")
-    if not table: return None, None, None, None
-    for row in table.select("tr[id^=tr1_]"): # Selector CSS
-        if row.get("vs") == "1":
-            key_match_id_for_h2h_url = row.get("index")
-            if not key_match_id_for_h2h_url: continue
-            # onclicks = row.find_all("a", onclick=True) # Mantenido por complejidad del selector
-            onclicks = row.select("a[onclick]")
-            if len(onclicks) > 1 and onclicks[1].get("onclick"):
-                rival_tag = onclicks[1]; rival_a_id_match = re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))
-                rival_a_name = rival_tag.text.strip()
-                if rival_a_id_match and rival_a_name:
-                    # Devolver también el soup de esta página para evitar refech
-                    # rival_page_path = f"/match/h2h-{key_match_id_for_h2h_url}"
-                    # rival_soup = await fetch_soup_async(rival_page_path, session_requests)
-                    # rival_soup = fetch_soup_requests_sync(rival_page_path, session_requests)
-                    # Devolvemos solo los IDs, la página del rival se cargará en get_h2h_details si es necesario
-                    return key_match_id_for_h2h_url, rival_a_id_match.group(1), rival_a_name
-    return None, None, None
+    return find_rival_a_in_soup(fetch_soup_requests_sync(f"/match/h2h-{main_match_id}", session_requests))
 
 @st.cache_data(ttl=3600)
 def get_rival_b_for_original_h2h_of(main_match_id: int, session_requests):
-    # soup_h2h_page = await fetch_soup_async(f"/match/h2h-{main_match_id}", session_requests)
-    soup_h2h_page = fetch_soup_requests_sync(f"/match/h2h-{main_match_id}", session_requests)
-    if not soup_h2h_page: return None, None, None, None
-    table = soup_h2h_page.select_one("table#table_v2")
-    if not table: return None, None, None, None
-    for row in table.select("tr[id^=tr2_]"):
-        if row.get("vs") == "1":
-            match_id_of_rival_b_game = row.get("index")
-            if not match_id_of_rival_b_game: continue
-            # onclicks = row.find_all("a", onclick=True)
-            onclicks = row.select("a[onclick]")
-            if len(onclicks) > 0 and onclicks[0].get("onclick"): # El rival B es el primer link (local)
-                rival_tag = onclicks[0]; rival_b_id_match = re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))
-                rival_b_name = rival_tag.text.strip()
-                if rival_b_id_match and rival_b_name:
-                    # rival_page_path = f"/match/h2h-{match_id_of_rival_b_game}"
-                    # rival_soup = await fetch_soup_async(rival_page_path, session_requests)
-                    # rival_soup = fetch_soup_requests_sync(rival_page_path, session_requests)
-                    return match_id_of_rival_b_game, rival_b_id_match.group(1), rival_b_name
-    return None, None, None
+    return find_rival_b_in_soup(fetch_soup_requests_sync(f"/match/h2h-{main_match_id}", session_requests))
 
 
-@st.cache_data(ttl=7200)
-def get_match_progression_stats_data(match_id: str, session_requests) -> pd.DataFrame | None:
-    # Replicada de datos.py, usando la sesión pasada
-    base_url_live = f"{BASE_URL_OF}/match/live-" # Asegurar que BASE_URL_OF es el correcto
-    full_url = f"{base_url_live}{match_id}"
-    headers = { # Headers simplificados, User-Agent ya está en la sesión
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-        "Accept-Encoding": "gzip, deflate, br", "Accept-Language": "en-US,en;q=0.9", "DNT": "1",
-        "Connection": "keep-alive", "Upgrade-Insecure-Requests": "1",
-    }
+PROGRESSION_REQUEST_HEADERS = { # Headers simplificados, User-Agent ya está en la sesión
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
+    "Accept-Encoding": "gzip, deflate, br", "Accept-Language": "en-US,en;q=0.9", "DNT": "1",
+    "Connection": "keep-alive", "Upgrade-Insecure-Requests": "1",
+}
+
+def progression_stats_url(match_id) -> str:
+    return f"{BASE_URL_OF}/match/live-{match_id}"
+
+def parse_match_progression_stats_html(html_content: str | None) -> pd.DataFrame | None:
+    # Parseo de div#teamTechDiv_detail, separado de la descarga para poder usarlo con cualquier cliente
+    if not html_content: return None
     stat_titles_of_interest = {
         "Shots": {"Home": "-", "Away": "-"}, "Shots on Goal": {"Home": "-", "Away": "-"},
         "Attacks": {"Home": "-", "Away": "-"}, "Dangerous Attacks": {"Home": "-", "Away": "-"},
     }
     try:
-        # response = await asyncio.get_event_loop().run_in_executor(None, session_requests.get, full_url, {"headers": headers, "timeout":10})
-        response = session_requests.get(full_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        html_content = response.text
         soup = BeautifulSoup(html_content, 'lxml') # lxml
         team_tech_div = soup.select_one('div#teamTechDiv_detail') # Selector CSS
         if team_tech_div:
@@ -331,8 +211,21 @@ def get_match_progression_stats_data(match_id: str, session_requests) -> pd.Data
     df = pd.DataFrame(table_rows)
     return df.set_index("Estadistica_EN") if not df.empty else df
 
+async def fetch_progression_stats_many(fetcher: AsyncFetcher, match_ids) -> dict:
+    # Descarga en paralelo todas las páginas /match/live-{id} y devuelve {match_id: DataFrame | None}
+    ids = list(dict.fromkeys(str(m) for m in match_ids if m and str(m).isdigit()))
+    with span("progression.fetch", matches=len(ids)):
+        pages = await fetcher.fetch_many(progression_stats_url(m) for m in ids)
+        return {m: parse_match_progression_stats_html(pages.get(progression_stats_url(m))) for m in ids}
 
-@st.cache_data(ttl=3600)
+@st.cache_data(ttl=7200)
+def get_match_progression_stats_data(match_id: str, session_requests) -> pd.DataFrame | None:
+    # Versión síncrona con la sesión de requests pasada
+    _, html = fetch_html(session_requests, progression_stats_url(match_id), timeout=10, max_tries=1, headers=PROGRESSION_REQUEST_HEADERS)
+    return parse_match_progression_stats_html(html)
+
+
+@cached_extractor
 def extract_final_score_of(soup: BeautifulSoup):
     # Replicada de datos.py
     if not soup: return '?:?', "?-?"
@@ -344,92 +237,63 @@ def extract_final_score_of(soup: BeautifulSoup):
     except Exception: pass
     return '?:?', "?-?"
 
-@st.cache_data(ttl=3600)
+@cached_extractor
 def extract_h2h_data_of(soup: BeautifulSoup, main_home_team_name: str, main_away_team_name: str, current_league_id: str | None):
-    # Replicada de datos.py
+    # Consulta sobre las filas ya parseadas de table_v3
     ah1, res1, res1_raw, match1_id = '-', '?:?', '?-?', None
     ah6, res6, res6_raw, match6_id = '-', '?:?', '?-?', None
     h2h_gen_home_name, h2h_gen_away_name = "Local (H2H Gen)", "Visitante (H2H Gen)"
 
     if not soup: return ah1, res1, res1_raw, match1_id, ah6, res6, res6_raw, match6_id, h2h_gen_home_name, h2h_gen_away_name
 
-    h2h_table = soup.select_one("table#table_v3") # Selector CSS
-    if not h2h_table: return ah1, res1, res1_raw, match1_id, ah6, res6, res6_raw, match6_id, h2h_gen_home_name, h2h_gen_away_name
-
-    filtered_h2h_list = []
-    # main_home_team_name y main_away_team_name pueden ser None o "N/A"
-    valid_main_team_names = main_home_team_name and main_home_team_name != "N/A" and \
-                            main_away_team_name and main_away_team_name != "N/A"
-
-    for row_h2h in h2h_table.select("tr[id^=tr3_]"): # Selector CSS
-        details = get_match_details_from_row_of(row_h2h, score_class_selector='fscore_3', source_table_type='h2h')
-        if not details: continue
-        # Filtrar por liga si current_league_id está presente
-        if current_league_id and details.get('league_id_hist') and details.get('league_id_hist') != str(current_league_id):
-            continue
-        filtered_h2h_list.append(details)
-
-    if not filtered_h2h_list: return ah1, res1, res1_raw, match1_id, ah6, res6, res6_raw, match6_id, h2h_gen_home_name, h2h_gen_away_name
+    # Índice de la página: filtro por liga y búsqueda del cruce sin recorrer filas
+    index = index_for_soup(soup)
+    latest_h2h = index.latest(table=3, league_id=current_league_id, limit=1, keep_unknown_league=True)
+    if not latest_h2h: return ah1, res1, res1_raw, match1_id, ah6, res6, res6_raw, match6_id, h2h_gen_home_name, h2h_gen_away_name
 
-    # H2H General (primer partido de la lista filtrada)
-    h2h_general_match = filtered_h2h_list[0]
-    ah6 = h2h_general_match.get('ahLine', '-')
-    res6 = h2h_general_match.get('score', '?:?'); res6_raw = h2h_general_match.get('score_raw', '?-?')
-    match6_id = h2h_general_match.get('match_id') # Usar 'match_id'
-    h2h_gen_home_name = h2h_general_match.get('home', "Local (H2H Gen)")
-    h2h_gen_away_name = h2h_general_match.get('away', "Visitante (H2H Gen)")
+    # H2H General (partido más reciente)
+    h2h_general_match = latest_h2h[0]
+    ah6 = format_ah_as_decimal_string_of(h2h_general_match.ah_line_raw)
+    res6 = h2h_general_match.score(); res6_raw = h2h_general_match.score_raw
+    match6_id = h2h_general_match.match_id
+    h2h_gen_home_name, h2h_gen_away_name = h2h_general_match.home, h2h_general_match.away
 
     # H2H Específico (Local en Casa)
-    if valid_main_team_names:
-        h2h_local_specific_match = None
-        for d_h2h in filtered_h2h_list:
-            if d_h2h.get('home','').lower() == main_home_team_name.lower() and \
-               d_h2h.get('away','').lower() == main_away_team_name.lower():
-                h2h_local_specific_match = d_h2h; break
-
-        if h2h_local_specific_match:
-            ah1 = h2h_local_specific_match.get('ahLine', '-')
-            res1 = h2h_local_specific_match.get('score', '?:?'); res1_raw = h2h_local_specific_match.get('score_raw', '?-?')
-            match1_id = h2h_local_specific_match.get('match_id') # Usar 'match_id'
+    # main_home_team_name y main_away_team_name pueden ser None o "N/A"
+    if main_home_team_name and main_home_team_name != "N/A" and main_away_team_name and main_away_team_name != "N/A":
+        specific = index.matches_between(main_home_team_name, main_away_team_name, VENUE_HOME, current_league_id, table=3, limit=1,
+                                         keep_unknown_league=True)
+        if specific:
+            h2h_local_specific_match = specific[0]
+            ah1 = format_ah_as_decimal_string_of(h2h_local_specific_match.ah_line_raw)
+            res1 = h2h_local_specific_match.score(); res1_raw = h2h_local_specific_match.score_raw
+            match1_id = h2h_local_specific_match.match_id
 
     return ah1, res1, res1_raw, match1_id, ah6, res6, res6_raw, match6_id, h2h_gen_home_name, h2h_gen_away_name
 
-@st.cache_data(ttl=3600)
+@cached_extractor
 def extract_comparative_match_of(soup_for_team_history: BeautifulSoup, table_id_of_team_to_search: str,
                                  team_name_to_find_match_for: str, opponent_name_to_search: str,
                                  current_league_id: str | None, is_home_table: bool):
-    # Replicada de datos.py
+    # Consulta sobre las filas ya parseadas de la tabla de historial del equipo
     if not soup_for_team_history or not opponent_name_to_search or opponent_name_to_search == "N/A" or \
        not team_name_to_find_match_for or team_name_to_find_match_for == "N/A":
         return None
 
-    table = soup_for_team_history.select_one(f"table#{table_id_of_team_to_search}") # Selector CSS
-    if not table: return None
-
-    score_class_selector = 'fscore_1' if is_home_table else 'fscore_2'
-    table_row_prefix = table_id_of_team_to_search[-1] # e.g., '1' from 'table_v1'
-
-    for row in table.select(f"tr[id^=tr{table_row_prefix}_]"): # Selector CSS
-        details = get_match_details_from_row_of(row, score_class_selector=score_class_selector, source_table_type='hist')
-        if not details: continue
-        if current_league_id and details.get('league_id_hist') and details.get('league_id_hist') != str(current_league_id):
-            continue
-
-        home_hist = details.get('home','').lower(); away_hist = details.get('away','').lower()
-        team_main_lower = team_name_to_find_match_for.lower(); opponent_lower = opponent_name_to_search.lower()
-
-        if (team_main_lower == home_hist and opponent_lower == away_hist) or \
-           (team_main_lower == away_hist and opponent_lower == home_hist):
-            return {
-                "score": details.get('score', '?:?'),
-                "ah_line": details.get('ahLine', '-'),
-                "localia": 'H' if team_main_lower == home_hist else 'A',
-                "home_team": details.get('home'),
-                "away_team": details.get('away'),
-                "match_id": details.get('match_id') # Usar 'match_id'
-            }
-    return None
-
+    found = index_for_soup(soup_for_team_history).matches_between(
+        team_name_to_find_match_for, opponent_name_to_search, league_id=current_league_id,
+        table=table_id_of_team_to_search, limit=1, keep_unknown_league=True)
+    if not found:
+        return None
+    row = found[0]
+    return {
+        "score": row.score(),
+        "ah_line": format_ah_as_decimal_string_of(row.ah_line_raw),
+        "localia": 'H' if row.home_key == team_name_to_find_match_for.lower() else 'A',
+        "home_team": row.home,
+        "away_team": row.away,
+        "match_id": row.match_id
+    }
 
 # --- FUNCIONES DEPENDIENTES DE SELENIUM (Intentar minimizar su uso) ---
 _selenium_driver_instance = None
@@ -498,34 +362,61 @@ def click_element_robust_of(driver, by, value, timeout=5): # Timeout reducido
     except Exception: # Considerar logging
         return False
 
-@st.cache_data(ttl=3600)
+class _SinCachear(Exception):
+    """La función cacheada lanza esto con el resultado fallido: st.cache_data no guarda excepciones."""
+
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+
+
+def _odds_missing(odds_info: dict) -> bool:
+    return all(value == "N/A" for value in odds_info.values())
+
+
 def get_main_match_odds_selenium_of(driver, match_h2h_url_path: str):
+    # Un timeout de Selenium no debe quedarse en caché una hora: solo se cachean cuotas encontradas
+    try:
+        return _main_match_odds_cached(driver, match_h2h_url_path)
+    except _SinCachear as e:
+        return e.result
+
+
+@st.cache_data(ttl=3600) # _driver no se hashea: la clave es la ruta/IDs del partido
+def _main_match_odds_cached(_driver, match_h2h_url_path: str):
+    odds_info = _fetch_main_match_odds(_driver, match_h2h_url_path)
+    if _odds_missing(odds_info):
+        raise _SinCachear(odds_info)
+    return odds_info
+
+
+def _fetch_main_match_odds(_driver, match_h2h_url_path: str):
     # Modificada para aceptar el path y hacer el get aquí si es necesario
     # Esto asume que el driver ya está en la página correcta o la carga aquí.
     # Para optimizar, es mejor que el driver ya esté en la página.
     odds_info = {"ah_home_cuota": "N/A", "ah_linea_raw": "N/A", "ah_away_cuota": "N/A", "goals_over_cuota": "N/A", "goals_linea_raw": "N/A", "goals_under_cuota": "N/A"}
-    if not driver: return odds_info
+    if not _driver: return odds_info
 
-    current_url = driver.current_url
+    current_url = _driver.current_url
     expected_page_segment = match_h2h_url_path.split('/')[-1] # e.g., h2h-match_id
 
     # Solo navegar si no estamos ya en la página correcta (o una muy similar)
     if expected_page_segment not in current_url:
         try:
-            driver.get(f"{BASE_URL_OF}{match_h2h_url_path}")
-            WebDriverWait(driver, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "liveCompareDiv")))
+            driver_get(_driver, f"{BASE_URL_OF}{match_h2h_url_path}")
+            WebDriverWait(_driver, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "liveCompareDiv")))
         except Exception:
             # print(f"Error navegando o esperando liveCompareDiv en {match_h2h_url_path}")
             return odds_info # No se pudo cargar la página o encontrar el div
 
     try:
         # No es necesario esperar liveCompareDiv si ya se esperó antes o si la página ya está cargada.
-        # live_compare_div = WebDriverWait(driver, SELENIUM_TIMEOUT_SECONDS_OF, poll_frequency=SELENIUM_POLL_FREQUENCY_OF).until(EC.presence_of_element_located((By.ID, "liveCompareDiv")))
+        # live_compare_div = WebDriverWait(_driver, SELENIUM_TIMEOUT_SECONDS_OF, poll_frequency=SELENIUM_POLL_FREQUENCY_OF).until(EC.presence_of_element_located((By.ID, "liveCompareDiv")))
 
         # Usar selectores CSS que son generalmente más rápidos
-        bet365_row = driver.find_element(By.CSS_SELECTOR, "tr#tr_o_1_8[name='earlyOdds'], tr#tr_o_1_31[name='earlyOdds']") # Coma para OR en CSS
+        bet365_row = _driver.find_element(By.CSS_SELECTOR, "tr#tr_o_1_8[name='earlyOdds'], tr#tr_o_1_31[name='earlyOdds']") # Coma para OR en CSS
         # No es necesario scrollear si el elemento es encontrado
-        # driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", bet365_row); time.sleep(0.1)
+        # _driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", bet365_row); time.sleep(0.1)
 
         tds = bet365_row.find_elements(By.TAG_NAME, "td")
         if len(tds) >= 11:
@@ -543,99 +434,60 @@ def get_main_match_odds_selenium_of(driver, match_h2h_url_path: str):
         pass
     return odds_info
 
-@st.cache_data(ttl=3600)
-def extract_last_match_in_league_of(driver, table_css_id_str: str, main_team_name_in_table: str,
-                                    league_id_filter_value: str | None, home_or_away_filter_css_selector: str,
-                                    is_home_game_filter: bool, match_h2h_url_path: str):
-    # Modificada para optimizar y asegurar que el driver está en la página correcta.
-    if not driver or not main_team_name_in_table or main_team_name_in_table == "N/A": return None
-
-    current_url = driver.current_url
-    expected_page_segment = match_h2h_url_path.split('/')[-1]
-    if expected_page_segment not in current_url:
-        try:
-            driver.get(f"{BASE_URL_OF}{match_h2h_url_path}")
-            WebDriverWait(driver, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, table_css_id_str)))
-        except Exception:
-            # print(f"Error navegando o esperando tabla {table_css_id_str} en {match_h2h_url_path}")
-            return None
-
-    try:
-        # Los clics son la parte lenta y dependiente de JS
-        if league_id_filter_value:
-            league_checkbox_selector = f"input#checkboxleague{table_css_id_str[-1]}[value='{league_id_filter_value}']"
-            click_element_robust_of(driver, By.CSS_SELECTOR, league_checkbox_selector); time.sleep(0.3) # Sleep reducido
-
-        click_element_robust_of(driver, By.CSS_SELECTOR, home_or_away_filter_css_selector); time.sleep(0.5) # Sleep reducido, puede necesitar ajuste
-
-        page_source_updated = driver.page_source # Obtener HTML después de acciones JS
-        soup_updated = BeautifulSoup(page_source_updated, "lxml")
-        table = soup_updated.select_one(f"table#{table_css_id_str}")
-        if not table: return None
-
-        count_visible_rows = 0
-        table_row_prefix = table_css_id_str[-1]
-
-        for row in table.select(f"tr[id^=tr{table_row_prefix}_]"): # Iterar sobre soup, no driver
-            if row.get("style") and "display:none" in row.get("style","").lower(): continue
-            count_visible_rows +=1
-            if count_visible_rows > 7: break # Limitar búsqueda para velocidad
-
-            # El filtro de liga ya se aplicó por JS, pero podemos re-verificar en el soup si es necesario (aunque añade tiempo)
-            # if league_id_filter_value and row.get("name") != str(league_id_filter_value): continue
-
-            # get_match_details_from_row_of usa find_all, que es más lento. Reimplementar aquí con selectores directos.
-            tds = row.select("td")
-            if len(tds) < 14: continue
-
-            home_team_row_el = tds[2].select_one("a"); away_team_row_el = tds[4].select_one("a")
-            if not home_team_row_el or not away_team_row_el: continue
-
-            home_team_row_name = home_team_row_el.text.strip(); away_team_row_name = away_team_row_el.text.strip()
-            team_is_home_in_row = main_team_name_in_table.lower() == home_team_row_name.lower()
-            team_is_away_in_row = main_team_name_in_table.lower() == away_team_row_name.lower()
-
-            if (is_home_game_filter and team_is_home_in_row) or \
-               (not is_home_game_filter and team_is_away_in_row):
-                date_span = tds[1].select_one("span[name=timeData]"); date = date_span.text.strip() if date_span else "N/A"
-                score_span = tds[3].select_one("span[class*=fscore_]"); score = score_span.text.strip() if score_span else "N/A"
-                handicap_cell = tds[11]; handicap_raw = handicap_cell.get("data-o", handicap_cell.text.strip())
-                if not handicap_raw or handicap_raw.strip() == "-": handicap_raw = "N/A"
-                else: handicap_raw = handicap_raw.strip()
-
-                match_id_last_game = row.get('index')
-                return {"date": date, "home_team": home_team_row_name,
-                        "away_team": away_team_row_name,"score": score,
-                        "handicap_line_raw": handicap_raw,
-                        "match_id": match_id_last_game}
-        return None
-    except Exception: # Considerar logging
-        # print(f"Excepción en extract_last_match_in_league_of: {e}")
-        return None
+@traced()
+def extract_last_match_in_league_of(soup, table_css_id_str: str, main_team_name_in_table: str,
+                                    league_id_filter_value: str | None, is_home_game_filter: bool):
+    # Antes se marcaban los checkbox de liga/localía con Selenium y se releía page_source;
+    # la página ya trae la tabla completa, así que el filtro se hace sobre el índice del historial.
+    if not soup or not main_team_name_in_table or main_team_name_in_table == "N/A": return None
+    venue = VENUE_HOME if is_home_game_filter else VENUE_AWAY
+    row = index_for_soup(soup).last_match(main_team_name_in_table, venue, league_id_filter_value or None, table=table_css_id_str)
+    if row is None: return None
+    return {"date": row.date or "N/A", "home_team": row.home,
+            "away_team": row.away, "score": row.score_raw if row.home_goals is not None else "N/A",
+            "handicap_line_raw": row.ah_line_raw if row.ah_line_raw != "-" else "N/A",
+            "match_id": row.match_id}
 
-@st.cache_data(ttl=3600)
 def get_h2h_details_for_original_logic_of(driver, key_match_id_for_h2h_url: str, rival_a_id: str, rival_b_id: str,
                                           rival_a_name="Rival A", rival_b_name="Rival B"):
+    # Los errores (driver caído, timeout esperando table_v2...) se devuelven sin cachear
+    try:
+        return _h2h_details_cached(driver, key_match_id_for_h2h_url, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+    except _SinCachear as e:
+        return e.result
+
+
+@st.cache_data(ttl=3600) # _driver no se hashea: la clave es la ruta/IDs del partido
+def _h2h_details_cached(_driver, key_match_id_for_h2h_url: str, rival_a_id: str, rival_b_id: str,
+                        rival_a_name="Rival A", rival_b_name="Rival B"):
+    result = _fetch_h2h_details(_driver, key_match_id_for_h2h_url, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+    if result.get("status") == "error":
+        raise _SinCachear(result)
+    return result
+
+
+def _fetch_h2h_details(_driver, key_match_id_for_h2h_url: str, rival_a_id: str, rival_b_id: str,
+                       rival_a_name="Rival A", rival_b_name="Rival B"):
     # Esta función inherentemente necesita cargar una nueva página con Selenium si se usa el driver.
     # O, si se pasa soup, parsear ese soup.
     # Para optimización, si key_match_id_for_h2h_url es el mismo que el partido principal,
     # se podría reusar el soup principal. Pero la lógica original busca en table_v2 de la página del rival.
-    if not driver: return {"status": "error", "resultado": "N/A (Driver no disponible H2H OF)", "match_id": None}
+    if not _driver: return {"status": "error", "resultado": "N/A (Driver no disponible H2H OF)", "match_id": None}
     if not key_match_id_for_h2h_url or not rival_a_id or not rival_b_id:
         return {"status": "error", "resultado": f"N/A (IDs incompletos para H2H {rival_a_name} vs {rival_b_name})", "match_id": None}
 
     url_to_visit = f"{BASE_URL_OF}/match/h2h-{key_match_id_for_h2h_url}"
     try:
         # Solo navegar si no estamos ya en la página del H2H del rival A (key_match_id_for_h2h_url)
-        current_url = driver.current_url
+        current_url = _driver.current_url
         expected_page_segment = f"h2h-{key_match_id_for_h2h_url}"
         if expected_page_segment not in current_url:
-            driver.get(url_to_visit)
-            WebDriverWait(driver, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "table_v2")))
+            driver_get(_driver, url_to_visit)
+            WebDriverWait(_driver, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "table_v2")))
 
-        # Dar un pequeño tiempo para JS si es necesario, aunque la espera anterior debería bastar
-        time.sleep(0.3) # Reducido
-        soup_selenium = BeautifulSoup(driver.page_source, "lxml")
+        # Esperar a que el JS termine de pintar las filas de table_v2
+        wait_for_rows_stable(_driver, "table_v2")
+        soup_selenium = make_page_soup(_driver.page_source, key_match_id_for_h2h_url)
     except TimeoutException:
         return {"status": "error", "resultado": f"N/A (Timeout esperando table_v2 en {url_to_visit})", "match_id": None}
     except Exception as e:
@@ -644,50 +496,89 @@ def get_h2h_details_for_original_logic_of(driver, key_match_id_for_h2h_url: str,
     if not soup_selenium:
         return {"status": "error", "resultado": f"N/A (Fallo soup Selenium H2H en {url_to_visit})", "match_id": None}
 
-    table_to_search_h2h = soup_selenium.select_one("table#table_v2")
-    if not table_to_search_h2h:
+    return find_h2h_between_rivals_in_soup(soup_selenium, key_match_id_for_h2h_url, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
+
+
+def find_h2h_between_rivals_in_soup(soup_rival_page: BeautifulSoup, key_match_id_for_h2h_url: str, rival_a_id: str, rival_b_id: str,
+                                    rival_a_name="Rival A", rival_b_name="Rival B"):
+    # Busca en table_v2 de la página H2H del rival A el enfrentamiento directo Rival A vs Rival B.
+    # La tabla viene en el HTML estático, así que sirve tanto el soup de Selenium como el de HTTP.
+    url_to_visit = f"{BASE_URL_OF}/match/h2h-{key_match_id_for_h2h_url}"
+    if not soup_rival_page:
+        return {"status": "error", "resultado": f"N/A (Fallo al cargar H2H en {url_to_visit})", "match_id": None}
+
+    rows = history_for_soup(soup_rival_page).rows(2)
+    if not rows:
         return {"status": "error", "resultado": f"N/A (Tabla v2 para H2H no encontrada en {url_to_visit})", "match_id": None}
 
-    for row in table_to_search_h2h.select("tr[id^=tr2_]"):
-        links = row.select("a[onclick]")
-        if len(links) < 2: continue
-        h2h_row_home_id_m = re.search(r"team\((\d+)\)", links[0].get("onclick", ""));
-        h2h_row_away_id_m = re.search(r"team\((\d+)\)", links[1].get("onclick", ""))
-        if not h2h_row_home_id_m or not h2h_row_away_id_m: continue
-        h2h_row_home_id = h2h_row_home_id_m.group(1); h2h_row_away_id = h2h_row_away_id_m.group(1)
-
-        if {h2h_row_home_id, h2h_row_away_id} == {str(rival_a_id), str(rival_b_id)}:
-            score_span = row.select_one("span.fscore_2") # fscore_2 para table_v2
-            if not score_span or not score_span.text or "-" not in score_span.text: continue
-            score_val = score_span.text.strip().split("(")[0].strip(); g_h, g_a = score_val.split("-", 1)
-
-            tds = row.select("td"); handicap_raw = "N/A"; HANDICAP_TD_IDX = 11
-            if len(tds) > HANDICAP_TD_IDX:
-                cell = tds[HANDICAP_TD_IDX]; d_o = cell.get("data-o")
-                handicap_raw = d_o.strip() if d_o and d_o.strip() not in ["", "-"] else (cell.text.strip() if cell.text.strip() not in ["", "-"] else "N/A")
-
-            match_id_h2h_rivals = row.get('index')
-            rol_a_in_this_h2h = "H" if h2h_row_home_id == str(rival_a_id) else "A"
-
-            return {"status": "found", "goles_home": g_h.strip(), "goles_away": g_a.strip(),
-                    "handicap": handicap_raw, "rol_rival_a": rol_a_in_this_h2h,
-                    "h2h_home_team_name": links[0].text.strip(),
-                    "h2h_away_team_name": links[1].text.strip(),
-                    "match_id": match_id_h2h_rivals}
+    rivals = {str(rival_a_id), str(rival_b_id)}
+    for row in rows:
+        if {row.home_id, row.away_id} != rivals or row.home_goals is None:
+            continue
+        return {"status": "found", "goles_home": str(row.home_goals), "goles_away": str(row.away_goals),
+                "handicap": row.ah_line_raw if row.ah_line_raw != "-" else "N/A",
+                "rol_rival_a": "H" if row.home_id == str(rival_a_id) else "A",
+                "h2h_home_team_name": row.home,
+                "h2h_away_team_name": row.away,
+                "match_id": row.match_id}
 
     return {"status": "not_found", "resultado": f"H2H directo no encontrado para {rival_a_name} vs {rival_b_name} en {key_match_id_for_h2h_url}.", "match_id": None}
 
-
 # --- FUNCIÓN PRINCIPAL DE EXTRACCIÓN ---
-async def extraer_datos_partido_rapido(partido_id: int, session_requests, driver_selenium):
+def _extraer_bloque_selenium(driver_selenium, main_h2h_path: str):
+    # Lo único que depende de JS son las cuotas. Se ejecuta en un hilo
+    # para no bloquear el event loop mientras se descargan las demás páginas.
+    try:
+        current_url = driver_selenium.current_url
+        expected_page_segment = main_h2h_path.split('/')[-1]
+        if expected_page_segment not in current_url:
+            driver_get(driver_selenium, f"{BASE_URL_OF}{main_h2h_path}")
+            WebDriverWait(driver_selenium, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "table_v1"))) # Esperar un elemento clave
+    except Exception:
+        # Continuar sin datos de Selenium si falla la navegación inicial
+        return {}
+    return get_main_match_odds_selenium_of(driver_selenium, main_h2h_path) # path para re-verificar
+
+
+async def _odds_con_navegador(driver_selenium, main_h2h_path: str):
+    # Playwright primero (contexto propio, sin esperar al driver compartido); Selenium si no está disponible
+    backend = get_browser_backend()
+    if backend is not None:
+        html = await backend.render_async(f"{BASE_URL_OF}{main_h2h_path}", wait_for="tr[name='earlyOdds']")
+        if html:
+            return parse_match_odds(html).opening_odds_info()
+    if driver_selenium is None:
+        return {}
+    return await asyncio.to_thread(_extraer_bloque_selenium, driver_selenium, main_h2h_path)
+
+
+async def _noop(value=None):
+    return value
+
+
+async def extraer_datos_partido_rapido(partido_id: int, session_requests=None, driver_selenium=None, fetcher: AsyncFetcher | None = None):
     # El driver_selenium se pasa como argumento, se gestiona externamente.
+    # Las páginas se descargan con el cliente async (session_requests se mantiene por compatibilidad).
+    # Si no se pasa un fetcher se crea uno para esta extracción y se cierra al terminar.
+    # Cada extracción es una traza (modules/tracing); en el resultado van su ID y los ms por etapa.
+    with start_trace("extraccion_rapida", match_id=str(partido_id)) as trace:
+        if fetcher is None:
+            async with AsyncFetcher() as own_fetcher:
+                data = await _extraer_datos_partido(partido_id, driver_selenium, own_fetcher)
+        else:
+            data = await _extraer_datos_partido(partido_id, driver_selenium, fetcher)
+    data["trace_id"] = trace.trace_id
+    data["stage_timings_ms"] = {name: round(ms, 1) for name, ms in trace.stage_totals().items()}
+    return data
+
+
+async def _extraer_datos_partido(partido_id: int, driver_selenium, fetcher: AsyncFetcher):
     start_total_time = time.time()
     data = {"partido_id": str(partido_id)}
 
     # 1. Obtener soup de la página H2H principal
     main_h2h_path = f"/match/h2h-{partido_id}"
-    # soup_main_h2h_page = await fetch_soup_async(main_h2h_path, session_requests)
-    soup_main_h2h_page = fetch_soup_requests_sync(main_h2h_path, session_requests) # Version sync temporal
+    soup_main_h2h_page = await fetch_soup_async(main_h2h_path, fetcher)
     if not soup_main_h2h_page:
         data["error"] = "No se pudo obtener la página H2H principal."
         return data
@@ -701,13 +592,6 @@ async def extraer_datos_partido_rapido(partido_id: int, session_requests, driver
     }
 
     # 3. Clasificaciones de equipos principales
-    # Estas pueden ser llamadas en paralelo si fetch_soup_async es verdaderamente async
-    # standings_home_task = extract_standings_data_from_h2h_page_of(soup_main_h2h_page, home_name)
-    # standings_away_task = extract_standings_data_from_h2h_page_of(soup_main_h2h_page, away_name)
-    # data["standings"] = {
-    #     "home_team": await standings_home_task, # si la función fuera async
-    #     "away_team": await standings_away_task, # si la función fuera async
-    # }
     data["standings"] = {
          "home_team": extract_standings_data_from_h2h_page_of(soup_main_h2h_page, home_name),
          "away_team": extract_standings_data_from_h2h_page_of(soup_main_h2h_page, away_name)
@@ -720,15 +604,10 @@ async def extraer_datos_partido_rapido(partido_id: int, session_requests, driver
         away_name = data["standings"]["away_team"]["name"]
         data["main_match_info"]["away_team_name"] = away_name
 
-
-    # 4. Marcador final (si existe) y Estadísticas de Progresión del partido principal
+    # 4. Marcador final (si existe)
     final_score_fmt, final_score_raw = extract_final_score_of(soup_main_h2h_page)
     data["main_match_info"]["final_score"] = final_score_fmt if final_score_fmt != "?:?" else None
     data["main_match_info"]["final_score_raw"] = final_score_raw if final_score_raw != "?-?" else None
-    if data["main_match_info"]["final_score"]: # Si hay marcador, obtener stats
-        # data["main_match_info"]["progression_stats"] = await get_match_progression_stats_data(str(partido_id), session_requests)
-        data["main_match_info"]["progression_stats"] = get_match_progression_stats_data(str(partido_id), session_requests)
-
 
     # 5. H2H Directos
     ah1, res1, _, m1_id, ah6, res6, _, m6_id, h2h_gen_h_name, h2h_gen_a_name = extract_h2h_data_of(soup_main_h2h_page, home_name, away_name, league_id)
@@ -736,108 +615,69 @@ async def extraer_datos_partido_rapido(partido_id: int, session_requests, driver
         "home_at_home": {"ah_line": ah1, "score": res1, "match_id": m1_id, "progression_stats": None},
         "general_last": {"ah_line": ah6, "score": res6, "match_id": m6_id, "home_team_name": h2h_gen_h_name, "away_team_name": h2h_gen_a_name, "progression_stats": None}
     }
-    # if m1_id: data["h2h_direct"]["home_at_home"]["progression_stats"] = await get_match_progression_stats_data(m1_id, session_requests)
-    # if m6_id: data["h2h_direct"]["general_last"]["progression_stats"] = await get_match_progression_stats_data(m6_id, session_requests)
-    if m1_id: data["h2h_direct"]["home_at_home"]["progression_stats"] = get_match_progression_stats_data(m1_id, session_requests)
-    if m6_id: data["h2h_direct"]["general_last"]["progression_stats"] = get_match_progression_stats_data(m6_id, session_requests)
-
-
-    # --- Operaciones que podrían usar Selenium ---
-    # El driver se pasa, así que la gestión de su ciclo de vida es externa.
-    # Idealmente, todas las operaciones de Selenium en la misma página se hacen secuencialmente
-    # para evitar recargas.
-    data["odds"] = {}
-    data["last_matches"] = {"home_team_last_home": None, "away_team_last_away": None}
-    data["h2h_indirect_col3"] = {}
-    data["comparative_matches"] = {"home_vs_last_opponent_of_away": None, "away_vs_last_opponent_of_home": None}
-    data["rival_info_for_col3"] = {}
 
-    if driver_selenium:
-        # Navegar a la página principal H2H una vez (si no está ya allí)
-        try:
-            current_url = driver_selenium.current_url
-            expected_page_segment = main_h2h_path.split('/')[-1]
-            if expected_page_segment not in current_url:
-                driver_selenium.get(f"{BASE_URL_OF}{main_h2h_path}")
-                WebDriverWait(driver_selenium, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "table_v1"))) # Esperar un elemento clave
-        except Exception as e_nav:
-            # print(f"Error navegando a la página principal H2H con Selenium: {e_nav}")
-            # Continuar sin datos de Selenium si falla la navegación inicial
-            pass # El driver podría estar ya en un estado problemático.
-        else: # Solo proceder si la navegación fue exitosa o ya estaba en la página
-            # 6. Cuotas (Selenium)
-            data["odds"] = get_main_match_odds_selenium_of(driver_selenium, main_h2h_path) # path para re-verificar
-
-            # 7. Últimos partidos (Selenium)
-            if home_id and league_id and home_name != "N/A":
-                lh_match = extract_last_match_in_league_of(driver_selenium, "table_v1", home_name, league_id, "input#cb_sos1[value='1']", True, main_h2h_path)
-                if lh_match:
-                    # lh_match["progression_stats"] = await get_match_progression_stats_data(lh_match["match_id"], session_requests)
-                    lh_match["progression_stats"] = get_match_progression_stats_data(lh_match["match_id"], session_requests)
-                data["last_matches"]["home_team_last_home"] = lh_match
-
-            if away_id and league_id and away_name != "N/A":
-                la_match = extract_last_match_in_league_of(driver_selenium, "table_v2", away_name, league_id, "input#cb_sos2[value='2']", False, main_h2h_path)
-                if la_match:
-                    # la_match["progression_stats"] = await get_match_progression_stats_data(la_match["match_id"], session_requests)
-                    la_match["progression_stats"] = get_match_progression_stats_data(la_match["match_id"], session_requests)
-
-                data["last_matches"]["away_team_last_away"] = la_match
-
-            # 8. Rivales para H2H Col3 y el H2H mismo (Selenium para la página del rival)
-            # Esto requiere navegar a otra página con Selenium, lo cual es costoso.
-            # Primero, obtener IDs de rivales (ya hecho con requests si es posible, o re-hacer)
-            # rival_a_key_match, rival_a_id, rival_a_name, _ = await get_rival_a_for_original_h2h_of(partido_id, session_requests)
-            # rival_b_key_match, rival_b_id, rival_b_name, _ = await get_rival_b_for_original_h2h_of(partido_id, session_requests)
-            rival_a_key_match, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(partido_id, session_requests)
-            rival_b_key_match, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(partido_id, session_requests)
-
-
-            data["rival_info_for_col3"] = {
-                "rival_a": {"id": rival_a_id, "name": rival_a_name, "ref_match_id_h2h_page": rival_a_key_match},
-                "rival_b": {"id": rival_b_id, "name": rival_b_name, "ref_match_id_h2h_page": rival_b_key_match} # Usar key_match de A para la página
-            }
-
-            if rival_a_key_match and rival_a_id and rival_b_id: # rival_b_key_match no se usa para la URL, sino el de A
-                h2h_col3_details = get_h2h_details_for_original_logic_of(driver_selenium, rival_a_key_match, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
-                if h2h_col3_details.get("status") == "found" and h2h_col3_details.get("match_id"):
-                    # h2h_col3_details["progression_stats"] = await get_match_progression_stats_data(h2h_col3_details["match_id"], session_requests)
-                    h2h_col3_details["progression_stats"] = get_match_progression_stats_data(h2h_col3_details["match_id"], session_requests)
-                data["h2h_indirect_col3"] = h2h_col3_details
-
-
-    # 9. Comparativas indirectas (usando soup_main_h2h_page)
-    last_away_match_info = data["last_matches"]["away_team_last_away"]
-    opponent_for_home_comp = last_away_match_info.get("home_team") if last_away_match_info else None
+    # 6. Rivales para H2H Col3: salen de la propia página principal, no hace falta volver a descargarla
+    rival_a_key_match, rival_a_id, rival_a_name = find_rival_a_in_soup(soup_main_h2h_page)
+    rival_b_key_match, rival_b_id, rival_b_name = find_rival_b_in_soup(soup_main_h2h_page)
+    data["rival_info_for_col3"] = {
+        "rival_a": {"id": rival_a_id, "name": rival_a_name, "ref_match_id_h2h_page": rival_a_key_match},
+        "rival_b": {"id": rival_b_id, "name": rival_b_name, "ref_match_id_h2h_page": rival_b_key_match} # Usar key_match de A para la página
+    }
+
+    # 6b. Últimos partidos en liga como local/visitante, filtrados sobre la página ya descargada
+    lh_match = extract_last_match_in_league_of(soup_main_h2h_page, "table_v1", home_name, league_id, True) if home_id and league_id else None
+    la_match = extract_last_match_in_league_of(soup_main_h2h_page, "table_v2", away_name, league_id, False) if away_id and league_id else None
+
+    # --- Fase 1 en paralelo: progresión de los partidos ya conocidos, página del rival A y cuotas (si hace falta navegador) ---
+    first_wave_ids = [m1_id, m6_id]
+    if data["main_match_info"]["final_score"]: first_wave_ids.append(str(partido_id))
+    col3_ready = bool(rival_a_key_match and rival_a_id and rival_b_id)
+    # Las cuotas iniciales vienen en el HTML estático; el navegador solo se usa si faltan
+    static_odds = odds_for_soup(soup_main_h2h_page).opening_odds_info()
+    odds_task = _odds_con_navegador(driver_selenium, main_h2h_path) if static_odds["ah_linea_raw"] == "N/A" else _noop(static_odds)
+    progression_first, rival_page_soup, odds = await asyncio.gather(
+        fetch_progression_stats_many(fetcher, first_wave_ids),
+        fetch_soup_async(f"/match/h2h-{rival_a_key_match}", fetcher) if col3_ready else _noop(None),
+        odds_task,
+    )
+
+    if data["main_match_info"]["final_score"]:
+        data["main_match_info"]["progression_stats"] = progression_first.get(str(partido_id))
+    if m1_id: data["h2h_direct"]["home_at_home"]["progression_stats"] = progression_first.get(str(m1_id))
+    if m6_id: data["h2h_direct"]["general_last"]["progression_stats"] = progression_first.get(str(m6_id))
+
+    data["odds"] = odds or {}
+    data["last_matches"] = {"home_team_last_home": lh_match, "away_team_last_away": la_match}
+    data["h2h_indirect_col3"] = find_h2h_between_rivals_in_soup(rival_page_soup, rival_a_key_match, rival_a_id, rival_b_id,
+                                                                rival_a_name, rival_b_name) if col3_ready else {}
+
+    # 7. Comparativas indirectas (usando soup_main_h2h_page)
+    data["comparative_matches"] = {"home_vs_last_opponent_of_away": None, "away_vs_last_opponent_of_home": None}
+    opponent_for_home_comp = la_match.get("home_team") if la_match else None
     if opponent_for_home_comp and home_name != "N/A":
-        comp1 = extract_comparative_match_of(soup_main_h2h_page, "table_v1", home_name, opponent_for_home_comp, league_id, True)
-        if comp1 and comp1.get("match_id"):
-            # comp1["progression_stats"] = await get_match_progression_stats_data(comp1["match_id"], session_requests)
-            comp1["progression_stats"] = get_match_progression_stats_data(comp1["match_id"], session_requests)
-        data["comparative_matches"]["home_vs_last_opponent_of_away"] = comp1
-
-    last_home_match_info = data["last_matches"]["home_team_last_home"]
-    opponent_for_away_comp = last_home_match_info.get("away_team") if last_home_match_info else None
+        data["comparative_matches"]["home_vs_last_opponent_of_away"] = extract_comparative_match_of(soup_main_h2h_page, "table_v1", home_name, opponent_for_home_comp, league_id, True)
+    opponent_for_away_comp = lh_match.get("away_team") if lh_match else None
     if opponent_for_away_comp and away_name != "N/A":
-        comp2 = extract_comparative_match_of(soup_main_h2h_page, "table_v2", away_name, opponent_for_away_comp, league_id, False)
-        if comp2 and comp2.get("match_id"):
-            # comp2["progression_stats"] = await get_match_progression_stats_data(comp2["match_id"], session_requests)
-            comp2["progression_stats"] = get_match_progression_stats_data(comp2["match_id"], session_requests)
-        data["comparative_matches"]["away_vs_last_opponent_of_home"] = comp2
+        data["comparative_matches"]["away_vs_last_opponent_of_home"] = extract_comparative_match_of(soup_main_h2h_page, "table_v2", away_name, opponent_for_away_comp, league_id, False)
+
+    # --- Fase 2 en paralelo: progresión de los partidos descubiertos en la fase 1 ---
+    second_wave = [lh_match, la_match, data["h2h_indirect_col3"] if data["h2h_indirect_col3"].get("status") == "found" else None,
+                   data["comparative_matches"]["home_vs_last_opponent_of_away"], data["comparative_matches"]["away_vs_last_opponent_of_home"]]
+    second_wave = [item for item in second_wave if item and item.get("match_id")]
+    progression_second = await fetch_progression_stats_many(fetcher, [item["match_id"] for item in second_wave])
+    for item in second_wave:
+        item["progression_stats"] = progression_second.get(str(item["match_id"]))
 
     data["execution_time_seconds"] = time.time() - start_total_time
+    data["parse_cache_stats"] = get_parse_cache().stats()
     return data
 
 # Helper síncrono para fetch_soup_requests_of, hasta que todo sea async
-@st.cache_data(ttl=1800)
+# Sin st.cache_data: devolver el soup desde la caché de Streamlit obligaba a serializar todo el árbol.
+# El HTML ya lo cachea la caché de páginas en disco y los resultados la caché de extractores.
 def fetch_soup_requests_sync(path, session_requests):
-    url = f"{BASE_URL_OF}{path}"
-    try:
-        resp = session_requests.get(url, timeout=8)
-        resp.raise_for_status()
-        return BeautifulSoup(resp.text, "lxml")
-    except requests.RequestException: # Considerar logging
-        return None
+    _, html = fetch_html(session_requests, f"{BASE_URL_OF}{path}", timeout=8, max_tries=1)
+    return make_page_soup(html, path) if html else None
 
 
 # --- Ejemplo de uso (para pruebas) ---
@@ -923,7 +763,6 @@ if __name__ == '__main__':
     # que se ejecuta con asyncio.run().
 
     async def run_extraction():
-        nonlocal driver # Para poder modificar el driver de fuera si es necesario
         s = get_requests_session_of()
 
         # Prueba sin Selenium
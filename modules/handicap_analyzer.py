@@ -1,7 +1,6 @@
 # Fichero: modules/handicap_analyzer.py
 
 import streamlit as st
-import time
 import re
 import pandas as pd
 import logging
@@ -12,6 +11,10 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
+from modules.ah_engine import ah_line_to_float
+from modules.ah_settlement import OUTCOME_LABELS, settle_handicap
+from modules.rate_limiter import driver_get
+from modules.page_readiness import wait_for_rows_stable
 
 # --- Configuración para un funcionamiento más rápido y limpio ---
 logging.getLogger('selenium').setLevel(logging.CRITICAL)
@@ -34,24 +37,18 @@ def setup_driver():
     return driver
 
 def convert_handicap_to_float(handicap_str):
-    if not handicap_str or not isinstance(handicap_str, str): return 0.0
-    if '/' in handicap_str:
-        try:
-            parts = handicap_str.split('/')
-            return (float(parts[0]) + float(parts[1])) / 2
-        except (ValueError, IndexError):
-            return 0.0
-    try:
-        return float(handicap_str)
-    except (ValueError, TypeError):
-        return 0.0
+    # Mismo parser que el resto de la app: "-0/0.5" es -0.25 (antes salía 0.25)
+    return ah_line_to_float(handicap_str, 0.0)
 
-def determine_ah_winner(home_score, away_score, handicap_float):
-    adjusted_score = home_score + handicap_float
-    if adjusted_score > away_score: return "HOME_WIN"
-    if adjusted_score < away_score: return "AWAY_WIN"
+def _ah_winner_from_outcome(outcome):
+    # Resultado del local: media ganada cuenta como HOME_WIN y media perdida como AWAY_WIN
+    if outcome > 0: return "HOME_WIN"
+    if outcome < 0: return "AWAY_WIN"
     return "PUSH"
 
+def determine_ah_winner(home_score, away_score, handicap_float):
+    return _ah_winner_from_outcome(int(settle_handicap(home_score - away_score, handicap_float).outcome[0]))
+
 def parse_matches_table(soup, table_id):
     table = soup.select_one(f'table#{table_id}')
     if not table: return []
@@ -78,15 +75,23 @@ def parse_matches_table(soup, table_id):
                 
             home_score, away_score = map(int, score_match.groups())
             handicap_val = convert_handicap_to_float(handicap_str)
-            ah_result = determine_ah_winner(home_score, away_score, handicap_val)
 
             matches.append({
                 "home_team": home_team, "away_team": away_team,
                 "home_score": home_score, "away_score": away_score,
-                "handicap_line": handicap_val, "ah_result": ah_result
+                "handicap_line": handicap_val
             })
         except (AttributeError, IndexError):
             continue
+
+    # Liquidación de toda la tabla de una vez (desde el lado del local)
+    if matches:
+        settlement = settle_handicap([m["home_score"] - m["away_score"] for m in matches],
+                                     [m["handicap_line"] for m in matches])
+        for match, outcome, units in zip(matches, settlement.outcome.tolist(), settlement.units.tolist()):
+            match["ah_result"] = _ah_winner_from_outcome(outcome)
+            match["ah_outcome"] = OUTCOME_LABELS[outcome]
+            match["ah_units"] = units
     return matches
 
 def analyze_performance(matches, team_name, condition):
@@ -148,9 +153,9 @@ def display_handicap_analyzer_ui():
             try:
                 with st.spinner(f"Accediendo al partido {match_id} y extrayendo datos... Esto puede tardar unos segundos."):
                     url = f"https://live19.nowgoal25.com/match/h2h-{match_id}"
-                    driver.get(url)
+                    driver_get(driver, url)
                     WebDriverWait(driver, 15).until(EC.visibility_of_element_located((By.ID, "table_v3")))
-                    time.sleep(1) 
+                    wait_for_rows_stable(driver, "table_v3")
                     soup = BeautifulSoup(driver.page_source, 'html.parser')
 
                 st.success("Extracción completada. Analizando datos...")
@@ -0,0 +1,206 @@
+# modules/history_index.py
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+import numpy as np
+
+from modules.history_parser import HistoryRow, MatchHistory, history_for_soup
+
+# --- CONFIGURACIÓN ---
+INDEX_ATTR = "nowgoal_history_index"
+ANY = -1        # comodín de tabla / liga / equipo en las claves de los índices
+NO_LEAGUE = -2  # filas sin liga en la página (se indexan también aparte para los filtros laxos)
+VENUE_HOME, VENUE_AWAY, VENUE_ANY = "H", "A", "*"
+NO_GOALS = -1
+
+
+class HistoryIndex:
+    """
+    Vista columnar de las filas de historial de una página H2H.
+
+    Equipos y ligas se codifican como enteros (diccionario nombre -> código) y las columnas son
+    arrays numpy. Al construirse se precalculan, ya ordenados por fecha (más reciente primero):
+      - (tabla, equipo, localía, liga) -> posiciones
+      - (tabla, local, visitante, liga) -> posiciones
+      - (tabla, liga) -> posiciones
+    así "último partido en casa en la liga" o "enfrentamientos entre A y B" son una consulta a un dict.
+    `tabla` y `liga` aceptan ANY; en tabla ANY un mismo partido (match_id) solo aparece una vez.
+    Con `keep_unknown_league=True` el filtro de liga conserva las filas que no traen liga.
+    """
+
+    def __init__(self, rows: Iterable[HistoryRow]):
+        rows = list(rows)
+        self.team_codes: Dict[str, int] = {}
+        self.team_names: List[str] = []
+        self.league_codes: Dict[str, int] = {}
+
+        # Orden por fecha descendente; a igual fecha se respeta el orden de la página
+        order = sorted(range(len(rows)), key=lambda i: (rows[i].date_key, -rows[i].table, -rows[i].position), reverse=True)
+        self._rows = [rows[i] for i in order]
+        n = len(self._rows)
+
+        self.table = np.fromiter((r.table for r in self._rows), dtype=np.int8, count=n)
+        self.home = np.fromiter((self._team_code(r.home_key, r.home) for r in self._rows), dtype=np.int32, count=n)
+        self.away = np.fromiter((self._team_code(r.away_key, r.away) for r in self._rows), dtype=np.int32, count=n)
+        self.league = np.fromiter((self._league_code(r.league_id) for r in self._rows), dtype=np.int32, count=n)
+        self.home_goals = np.fromiter((NO_GOALS if r.home_goals is None else r.home_goals for r in self._rows), dtype=np.int16, count=n)
+        self.away_goals = np.fromiter((NO_GOALS if r.away_goals is None else r.away_goals for r in self._rows), dtype=np.int16, count=n)
+
+        by_team: Dict[tuple, List[int]] = defaultdict(list)
+        by_pair: Dict[tuple, List[int]] = defaultdict(list)
+        by_league: Dict[tuple, List[int]] = defaultdict(list)
+        self._opponents: Dict[tuple, Set[int]] = defaultdict(set)
+        seen_match_ids = set()
+        for pos in range(n):
+            row = self._rows[pos]
+            home, away, league = int(self.home[pos]), int(self.away[pos]), int(self.league[pos])
+            tables = (row.table,)
+            if row.match_id is None or row.match_id not in seen_match_ids:
+                tables += (ANY,)
+                seen_match_ids.add(row.match_id)
+            leagues = (league, ANY) if league != ANY else (NO_LEAGUE, ANY)
+            for table in tables:
+                for lg in leagues:
+                    by_league[(table, lg)].append(pos)
+                    by_pair[(table, home, away, lg)].append(pos)
+                    for team, venue in ((home, VENUE_HOME), (away, VENUE_AWAY)):
+                        by_team[(table, team, venue, lg)].append(pos)
+                        by_team[(table, team, VENUE_ANY, lg)].append(pos)
+                    self._opponents[(home, lg)].add(away)
+                    self._opponents[(away, lg)].add(home)
+
+        self._by_team = {k: np.asarray(v, dtype=np.int32) for k, v in by_team.items()}
+        self._by_pair = {k: np.asarray(v, dtype=np.int32) for k, v in by_pair.items()}
+        self._by_league = {k: np.asarray(v, dtype=np.int32) for k, v in by_league.items()}
+
+    @classmethod
+    def from_history(cls, history: MatchHistory) -> "HistoryIndex":
+        return cls(history.all_rows())
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _team_code(self, key: str, name: str) -> int:
+        code = self.team_codes.get(key)
+        if code is None:
+            code = len(self.team_names)
+            self.team_codes[key] = code
+            self.team_names.append(name)
+        return code
+
+    def _league_code(self, league_id: str | None) -> int:
+        if not league_id:
+            return ANY
+        return self.league_codes.setdefault(str(league_id), len(self.league_codes))
+
+    # --- Resolución de claves ---
+    def resolve_team(self, team_name: str | None) -> int | None:
+        """Código del equipo: nombre exacto (sin mayúsculas) o, si no hay, el primero que lo contenga."""
+        if not team_name:
+            return None
+        key = team_name.lower()
+        code = self.team_codes.get(key)
+        if code is None:
+            code = next((c for k, c in self.team_codes.items() if key in k), None)
+        return code
+
+    def resolve_teams(self, team_name: str | None) -> List[int]:
+        """Códigos de todos los equipos cuyo nombre contiene `team_name` (como el filtro original por filas)."""
+        if not team_name:
+            return []
+        key = team_name.lower()
+        return [c for k, c in self.team_codes.items() if key in k]
+
+    def _league_key(self, league_id) -> int | None:
+        if not league_id:
+            return ANY
+        return self.league_codes.get(str(league_id))  # None: liga que no aparece en la página
+
+    @staticmethod
+    def _table_key(table) -> int:
+        return ANY if table is None else int(str(table)[-1])
+
+    @staticmethod
+    def _merge(parts) -> np.ndarray | None:
+        # Posiciones de varias claves, sin repetir y en orden de fecha
+        parts = [p for p in parts if p is not None and len(p)]
+        if not parts:
+            return None
+        return parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+
+    def _leagues(self, league: int, keep_unknown_league: bool) -> tuple:
+        return (league, NO_LEAGUE) if keep_unknown_league and league != ANY else (league,)
+
+    def _take(self, positions, limit: int | None) -> List[HistoryRow]:
+        if positions is None:
+            return []
+        if limit is not None:
+            positions = positions[:limit]
+        return [self._rows[p] for p in positions]
+
+    # --- Consultas ---
+    def latest(self, table=None, league_id=None, limit: int | None = None,
+               keep_unknown_league: bool = False) -> List[HistoryRow]:
+        """Filas de la tabla (o de todas) en la liga indicada, más recientes primero."""
+        league = self._league_key(league_id)
+        if league is None and not keep_unknown_league:
+            return []
+        table_key = self._table_key(table)
+        if league is None:
+            return self._take(self._by_league.get((table_key, NO_LEAGUE)), limit)
+        return self._take(self._merge(self._by_league.get((table_key, lg))
+                                      for lg in self._leagues(league, keep_unknown_league)), limit)
+
+    def team_matches(self, team_name: str, venue: str = VENUE_ANY, league_id=None, table=None,
+                     limit: int | None = None) -> List[HistoryRow]:
+        """Partidos de los equipos cuyo nombre contiene `team_name` como local ('H'), visitante ('A') o ambos ('*')."""
+        teams, league = self.resolve_teams(team_name), self._league_key(league_id)
+        if not teams or league is None:
+            return []
+        table_key = self._table_key(table)
+        return self._take(self._merge(self._by_team.get((table_key, team, venue, league)) for team in teams), limit)
+
+    def last_match(self, team_name: str, venue: str = VENUE_ANY, league_id=None, table=None) -> HistoryRow | None:
+        found = self.team_matches(team_name, venue, league_id, table, limit=1)
+        return found[0] if found else None
+
+    def matches_between(self, team_name: str, opponent_name: str, venue: str = VENUE_ANY, league_id=None,
+                        table=None, limit: int | None = None, keep_unknown_league: bool = False) -> List[HistoryRow]:
+        """Enfrentamientos entre dos equipos (nombre exacto); `venue` es la localía de `team_name`."""
+        team, opponent = self.team_codes.get((team_name or "").lower()), self.team_codes.get((opponent_name or "").lower())
+        league = self._league_key(league_id)
+        if team is None or opponent is None:
+            return []
+        if league is None:
+            # Liga que no está en la página: solo quedan, si se piden, las filas sin liga
+            if not keep_unknown_league:
+                return []
+            leagues = (NO_LEAGUE,)
+        else:
+            leagues = self._leagues(league, keep_unknown_league)
+        table_key = self._table_key(table)
+        parts = []
+        for lg in leagues:
+            if venue != VENUE_AWAY:
+                parts.append(self._by_pair.get((table_key, team, opponent, lg)))
+            if venue != VENUE_HOME:
+                parts.append(self._by_pair.get((table_key, opponent, team, lg)))
+        return self._take(self._merge(parts), limit)
+
+    def common_opponents(self, team_a: str, team_b: str, league_id=None) -> List[str]:
+        """Rivales a los que se han enfrentado ambos equipos (en cualquiera de las tablas)."""
+        code_a, code_b, league = self.resolve_team(team_a), self.resolve_team(team_b), self._league_key(league_id)
+        if code_a is None or code_b is None or league is None:
+            return []
+        common = (self._opponents.get((code_a, league), set()) & self._opponents.get((code_b, league), set())) - {code_a, code_b}
+        return sorted(self.team_names[c] for c in common)
+
+
+def index_for_soup(soup) -> HistoryIndex:
+    """Índice del historial de la página, construido una única vez y guardado en el soup."""
+    cached = vars(soup).get(INDEX_ATTR)
+    if cached is not None:
+        return cached
+    index = HistoryIndex.from_history(history_for_soup(soup))
+    setattr(soup, INDEX_ATTR, index)
+    return index
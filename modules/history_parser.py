@@ -0,0 +1,149 @@
+# modules/history_parser.py
+import re
+from dataclasses import dataclass
+from typing import Dict, List
+
+import lxml.html
+
+from modules.parse_cache import PAGE_HTML_ATTR
+
+# --- CONFIGURACIÓN ---
+HISTORY_TABLES = (1, 2, 3) # table_v1 (local), table_v2 (visitante), table_v3 (H2H)
+HISTORY_ATTR = "nowgoal_history"
+
+# Índices de columnas en las filas de historial
+TD_LEAGUE, TD_DATE, TD_HOME, TD_SCORE, TD_AWAY, TD_AH = 0, 1, 2, 3, 4, 11
+
+_TEAM_ID_RE = re.compile(r"team\((\d+)\)")
+_SCORE_RE = re.compile(r"(\d+)\s*-\s*(\d+)")
+_DATE_RE = re.compile(r"(\d{2})-(\d{2})-(\d{4})")
+_DISPLAY_NONE_RE = re.compile(r"display\s*:\s*none", re.IGNORECASE)
+
+
+@dataclass(slots=True)
+class HistoryRow:
+    """Fila de historial ya tipada. Los nombres en minúsculas se guardan para comparar sin recalcular."""
+    table: int
+    position: int
+    match_id: str | None
+    league_id: str | None
+    league_name: str
+    vs: str | None
+    hidden: bool
+    date: str           # dd-mm-yyyy
+    date_key: str       # 'YYYY-MM-DD HH:MM:SS' (ordenable)
+    home: str
+    home_id: str | None
+    home_key: str
+    away: str
+    away_id: str | None
+    away_key: str
+    score_raw: str      # 'h-a' o '?-?'
+    home_goals: int | None
+    away_goals: int | None
+    ah_line_raw: str    # data-o de la celda AH, '-' si vacía
+
+    def score(self, sep: str = ":") -> str:
+        return self.score_raw.replace("-", sep)
+
+
+class MatchHistory:
+    """Filas de table_v1/v2/v3 de una página H2H, en el orden de la página."""
+
+    def __init__(self, tables: Dict[int, List[HistoryRow]]):
+        self._tables = tables
+
+    def rows(self, table) -> List[HistoryRow]:
+        """`table` puede ser 1/2/3 o el id de la tabla ('table_v1')."""
+        table_num = int(str(table)[-1])
+        return self._tables.get(table_num, [])
+
+    def all_rows(self) -> List[HistoryRow]:
+        return [row for num in HISTORY_TABLES for row in self._tables.get(num, [])]
+
+
+def _cell_text(cell) -> str:
+    return cell.text_content().strip()
+
+
+def _team_cell(cell):
+    links = cell.xpath(".//a")
+    if not links:
+        return _cell_text(cell), None
+    link = links[0]
+    id_match = _TEAM_ID_RE.search(link.get("onclick", ""))
+    return _cell_text(link), id_match.group(1) if id_match else None
+
+
+def _parse_row(tr, table_num: int, position: int) -> HistoryRow | None:
+    cells = tr.xpath("./td")
+    if len(cells) <= TD_AH:
+        return None
+    home, home_id = _team_cell(cells[TD_HOME])
+    away, away_id = _team_cell(cells[TD_AWAY])
+    if not home or not away:
+        return None
+
+    date_spans = cells[TD_DATE].xpath(".//span[@name='timeData']")
+    date_source = date_spans[0] if date_spans else cells[TD_DATE]
+    date_m = _DATE_RE.search(date_source.text_content())
+    date = date_m.group(0) if date_m else ""
+    date_key = (date_spans[0].get("data-t") if date_spans else None) or \
+               (f"{date_m.group(3)}-{date_m.group(2)}-{date_m.group(1)}" if date_m else "1900-01-01")
+
+    score_m = _SCORE_RE.search(_cell_text(cells[TD_SCORE]))
+    if score_m:
+        home_goals, away_goals = int(score_m.group(1)), int(score_m.group(2))
+        score_raw = f"{home_goals}-{away_goals}"
+    else:
+        home_goals = away_goals = None
+        score_raw = "?-?"
+
+    ah_cell = cells[TD_AH]
+    ah_line_raw = (ah_cell.get("data-o") or ah_cell.text_content()).strip() or "-"
+
+    league_cell = cells[TD_LEAGUE]
+    return HistoryRow(
+        table=table_num, position=position,
+        match_id=tr.get("index"), league_id=tr.get("name"),
+        league_name=league_cell.get("title") or _cell_text(league_cell),
+        vs=tr.get("vs"), hidden=bool(_DISPLAY_NONE_RE.search(tr.get("style", ""))),
+        date=date, date_key=date_key,
+        home=home, home_id=home_id, home_key=home.lower(),
+        away=away, away_id=away_id, away_key=away.lower(),
+        score_raw=score_raw, home_goals=home_goals, away_goals=away_goals,
+        ah_line_raw=ah_line_raw,
+    )
+
+
+def parse_history_tables(html: str) -> MatchHistory:
+    """Recorre una sola vez las tres tablas de historial con lxml y devuelve las filas tipadas."""
+    tables: Dict[int, List[HistoryRow]] = {num: [] for num in HISTORY_TABLES}
+    if not html:
+        return MatchHistory(tables)
+    root = lxml.html.fromstring(html)
+    for table in root.xpath("//table[@id='table_v1' or @id='table_v2' or @id='table_v3']"):
+        table_num = int(table.get("id")[-1])
+        prefix = f"tr{table_num}_"
+        rows = tables[table_num]
+        for tr in table.iter("tr"):
+            if not tr.get("id", "").startswith(prefix):
+                continue
+            row = _parse_row(tr, table_num, len(rows))
+            if row is not None:
+                rows.append(row)
+    return MatchHistory(tables)
+
+
+def history_for_soup(soup) -> MatchHistory:
+    """
+    Historial de la página del soup, parseado una única vez y guardado en el propio soup.
+    Usa el HTML original si el soup se creó con `make_page_soup`; si no, lo serializa.
+    """
+    cached = vars(soup).get(HISTORY_ATTR)
+    if cached is not None:
+        return cached
+    html = vars(soup).get(PAGE_HTML_ATTR) or str(soup)
+    history = parse_history_tables(html)
+    setattr(soup, HISTORY_ATTR, history)
+    return history
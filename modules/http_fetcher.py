@@ -0,0 +1,79 @@
+# modules/http_fetcher.py
+from typing import Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from modules.http_replay import record_response, resolve_url
+from modules.page_cache import get_page_cache
+from modules.rate_limiter import get_rate_limiter
+from modules.tracing import span
+
+# --- CONFIGURACIÓN ---
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36"
+DEFAULT_HTTP_TIMEOUT = 10
+DEFAULT_MAX_TRIES = 3
+DEFAULT_RETRY_DELAY = 1
+
+
+def build_requests_session(pool_maxsize: int = 10, user_agent: str = DEFAULT_USER_AGENT) -> requests.Session:
+    """
+    Sesión HTTP con un pool de conexiones del tamaño de los workers que la comparten. El adaptador solo
+    reintenta errores de conexión: los 5xx/429 los reintenta fetch_html, pasando por el limitador del host.
+    """
+    session = requests.Session()
+    retries = Retry(total=None, connect=2, read=0, status=0, other=0, redirect=5, backoff_factor=0.5)
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": user_agent})
+    return session
+
+
+def fetch_html(session: requests.Session, url: str, timeout: float = DEFAULT_HTTP_TIMEOUT,
+               max_tries: int = DEFAULT_MAX_TRIES, delay: float = DEFAULT_RETRY_DELAY,
+               use_cache: bool = True, **session_kwargs) -> Tuple[int | None, str | None]:
+    """
+    Descarga una página y devuelve (status_code, html). Primero consulta la caché de páginas en disco.
+    Un 404 se devuelve tal cual (sin reintentos); si todos los intentos fallan devuelve (último status o None, None),
+    así quien llama puede distinguir un 429/5xx de un error de red. Graba/reproduce según modules/http_replay. Cada intento pasa por el limitador del host;
+    tras un fallo se pausa el host `delay * intento` segundos (para todos los fetchers, no solo este).
+    """
+    with span("http.fetch", url=url, client="requests") as trace_span:
+        status, html, cache_status = _fetch_html(session, url, timeout, max_tries, delay, use_cache, session_kwargs)
+        trace_span.set(status=status, cache=cache_status, bytes=len(html) if html else 0)
+        return status, html
+
+
+def _fetch_html(session, url, timeout, max_tries, delay, use_cache, session_kwargs):
+    limiter = get_rate_limiter()
+    cache = get_page_cache() if use_cache else None
+    if cache is not None:
+        cached_html = cache.get(url)
+        if cached_html is not None:
+            record_response(url, 200, cached_html)
+            return 200, cached_html, "hit"
+    cache_status = "miss" if cache is not None else "off"
+    request_url = resolve_url(url)
+    last_status = None
+    for attempt in range(1, max_tries + 1):
+        try:
+            with limiter.request(url):
+                resp = session.get(request_url, timeout=timeout, **session_kwargs)
+            last_status = resp.status_code
+            if resp.status_code == 404:
+                record_response(url, 404, "")
+                return 404, None, cache_status
+            resp.raise_for_status()
+            if cache is not None:
+                cache.put(url, resp.text)
+            record_response(url, resp.status_code, resp.text)
+            return resp.status_code, resp.text, cache_status
+        except requests.RequestException as e:
+            response = getattr(e, "response", None)
+            last_status = response.status_code if response is not None else None
+            if attempt == max_tries:
+                return last_status, None, cache_status
+            limiter.pause(url, delay * attempt)
+    return last_status, None, cache_status
@@ -0,0 +1,246 @@
+# modules/http_replay.py
+"""
+Grabación y reproducción de las respuestas de nowgoal para medir y hacer pruebas de carga sin red.
+
+    # 1) Grabar: cualquier flujo normal (Análisis, Entreno, process_ranges) guarda lo que descarga
+    NOWGOAL_HTTP_MODE=record streamlit run app.py
+
+    # 2) Servir lo grabado con latencia y errores inyectados
+    python -m modules.http_replay --port 8765 --latency 0.08 --jitter 0.04 --error-rate 0.02 --throttle-rate 0.01
+
+    # 3) Reproducir: las URLs de nowgoal se redirigen al servidor local (requests, httpx, Selenium y Playwright)
+    NOWGOAL_REPLAY_URL=http://127.0.0.1:8765 NOWGOAL_PAGE_CACHE=0 NOWGOAL_MATCH_STORE=0 streamlit run app.py
+
+Las páginas se guardan por ruta (sin el host): live16/live18/... sirven el mismo contenido.
+Los IDs que no están en el archivo responden 404 y el scraper masivo los da por not_found; por eso,
+reproduciendo, el checkpoint va a un diario aparte (sufijo "replay") y no bloquea esos IDs en las ejecuciones reales.
+"""
+import argparse
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+# --- CONFIGURACIÓN ---
+HTTP_MODE = os.environ.get("NOWGOAL_HTTP_MODE", "").lower()     # "record" para grabar
+REPLAY_URL = os.environ.get("NOWGOAL_REPLAY_URL", "").rstrip("/")  # servidor local al que redirigir
+DEFAULT_ARCHIVE_PATH = os.environ.get(
+    "NOWGOAL_HTTP_ARCHIVE",
+    os.path.join(os.path.expanduser("~"), ".cache", "nowgoal", "http_archive.sqlite"),
+)
+DEFAULT_REPLAY_PORT = 8765
+
+_NOWGOAL_HOST_RE = re.compile(r"^https?://[^/]*nowgoal[^/]*", re.IGNORECASE)
+
+
+def archive_key(url: str) -> str:
+    """Ruta + query de la URL: la clave no depende del mirror (live16, live18...)."""
+    parts = urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+def resolve_url(url: str) -> str:
+    """Con NOWGOAL_REPLAY_URL las URLs de nowgoal apuntan al servidor de reproducción; si no, se devuelven igual."""
+    if not REPLAY_URL or not url:
+        return url
+    return _NOWGOAL_HOST_RE.sub(REPLAY_URL, url, count=1)
+
+
+class HttpArchive:
+    """Respuestas grabadas (SQLite, cuerpo comprimido con zlib): clave -> (status, cuerpo). Compartido entre procesos."""
+
+    def __init__(self, path: str = DEFAULT_ARCHIVE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._counters = {"recorded": 0, "hits": 0, "misses": 0}
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, body BLOB NOT NULL, recorded_at REAL NOT NULL)"
+        )
+
+    def record(self, url: str, status: int, body: str):
+        if status is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, status, body, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                (archive_key(url), url, int(status), zlib.compress((body or "").encode("utf-8"), 6), time.time()),
+            )
+            self._counters["recorded"] += 1
+
+    def lookup(self, url_or_key: str) -> Tuple[int, str] | None:
+        key = url_or_key if url_or_key.startswith("/") else archive_key(url_or_key)
+        with self._lock:
+            row = self._conn.execute("SELECT status, body FROM responses WHERE key = ?", (key,)).fetchone()
+            self._counters["hits" if row else "misses"] += 1
+        if row is None:
+            return None
+        return row[0], zlib.decompress(row[1]).decode("utf-8")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            data = dict(self._counters)
+            data["entries"] = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return data
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_archive_instance = None
+_archive_lock = threading.Lock()
+
+
+def get_http_archive() -> HttpArchive | None:
+    global _archive_instance
+    if _archive_instance is None:
+        with _archive_lock:
+            if _archive_instance is None:
+                try:
+                    _archive_instance = HttpArchive()
+                except (sqlite3.Error, OSError):
+                    return None
+    return _archive_instance
+
+
+def record_response(url: str, status: int | None, body: str | None):
+    """Guarda la respuesta si se está grabando (NOWGOAL_HTTP_MODE=record); si no, no hace nada."""
+    if HTTP_MODE != "record" or status is None:
+        return
+    archive = get_http_archive()
+    if archive is not None:
+        archive.record(url, status, body)
+
+
+class ReplayServer:
+    """
+    Servidor HTTP local que sirve el archivo grabado. Cada petición espera `latency` ± `jitter` segundos y,
+    con probabilidad `error_rate` / `throttle_rate`, responde 503 / 429 para ejercitar reintentos y el control AIMD.
+    Las rutas no grabadas devuelven 404.
+    """
+
+    def __init__(self, archive: HttpArchive, host: str = "127.0.0.1", port: int = DEFAULT_REPLAY_PORT,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 seed: int | None = None):
+        self.archive = archive
+        self.latency = max(0.0, latency)
+        self.jitter = max(0.0, jitter)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "served": 0, "not_found": 0, "errors_injected": 0, "throttled_injected": 0}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def _decide(self) -> Tuple[float, int | None]:
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            roll = self._random.random()
+        if roll < self.error_rate:
+            return delay, 503
+        if roll < self.error_rate + self.throttle_rate:
+            return delay, 429
+        return delay, None
+
+    def _handler_class(self):
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._count("requests")
+                delay, injected = server._decide()
+                if delay:
+                    time.sleep(delay)
+                if injected is not None:
+                    server._count("errors_injected" if injected == 503 else "throttled_injected")
+                    self._send(injected, "")
+                    return
+                found = server.archive.lookup(self.path)
+                if found is None:
+                    server._count("not_found")
+                    self._send(404, "Not found")
+                    return
+                server._count("served")
+                self._send(*found)
+
+            def _send(self, status: int, body: str):
+                payload = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return _Handler
+
+    def start(self) -> "ReplayServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="http-replay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que reproduce las respuestas grabadas de nowgoal")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_PATH)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_REPLAY_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de espera por petición")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de responder 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Probabilidad de responder 429")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    archive = HttpArchive(args.archive)
+    server = ReplayServer(archive, args.host, args.port, args.latency, args.jitter, args.error_rate,
+                          args.throttle_rate, args.seed).start()
+    print(f"Reproduciendo {archive.stats()['entries']} respuestas de {args.archive} en {server.url} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"Replay: {server.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"Replay: {server.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# modules/match_store.py
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+from modules.ah_engine import parse_ah_lines
+from modules.history_parser import MatchHistory
+
+# --- CONFIGURACIÓN ---
+DEFAULT_STORE_PATH = os.environ.get(
+    "NOWGOAL_MATCH_STORE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nowgoal", "matches.sqlite"),
+)
+MATCH_STORE_ENABLED = os.environ.get("NOWGOAL_MATCH_STORE", "1") != "0"
+
+MATCH_COLUMNS = (
+    "match_id", "league_id", "league_name", "home_id", "home_name", "away_id", "away_name",
+    "match_date", "state", "home_goals", "away_goals", "final_score",
+    "ah_line_raw", "ah_line", "goal_line_raw", "goal_line", "scraped_at",
+)
+HISTORY_COLUMNS = (
+    "match_id", "table_num", "position", "row_match_id", "league_id", "league_name", "date_key",
+    "home_id", "home_name", "away_id", "away_name", "home_goals", "away_goals", "ah_line_raw",
+)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS matches ("
+    " match_id INTEGER PRIMARY KEY, league_id TEXT, league_name TEXT, home_id TEXT, home_name TEXT,"
+    " away_id TEXT, away_name TEXT, match_date TEXT, state INTEGER, home_goals INTEGER, away_goals INTEGER,"
+    " final_score TEXT, ah_line_raw TEXT, ah_line REAL, goal_line_raw TEXT, goal_line REAL, scraped_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_home ON matches(home_id)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_away ON matches(away_id)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_league_date ON matches(league_id, match_date)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_date ON matches(match_date)",
+    # Filas de table_v1/v2/v3 tal como aparecían en la página del partido
+    "CREATE TABLE IF NOT EXISTS history_rows ("
+    " match_id INTEGER NOT NULL, table_num INTEGER NOT NULL, position INTEGER NOT NULL, row_match_id TEXT,"
+    " league_id TEXT, league_name TEXT, date_key TEXT, home_id TEXT, home_name TEXT, away_id TEXT, away_name TEXT,"
+    " home_goals INTEGER, away_goals INTEGER, ah_line_raw TEXT,"
+    " PRIMARY KEY (match_id, table_num, position))",
+    "CREATE INDEX IF NOT EXISTS idx_history_home ON history_rows(home_id, date_key)",
+    "CREATE INDEX IF NOT EXISTS idx_history_away ON history_rows(away_id, date_key)",
+    "CREATE INDEX IF NOT EXISTS idx_history_league ON history_rows(league_id, date_key)",
+)
+
+
+class MatchStore:
+    """
+    Histórico local de partidos (SQLite) que alimenta el scraper masivo.
+    `matches` guarda un registro por partido; `history_rows` las tablas de historial de su página H2H.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    def save_match(self, record: Dict, history: MatchHistory | None = None):
+        """Inserta o reemplaza el partido (y sus filas de historial si se pasan) en una sola transacción."""
+        values = dict.fromkeys(MATCH_COLUMNS)
+        values.update({k: v for k, v in record.items() if k in values})
+        values["match_id"] = int(values["match_id"])
+        values["scraped_at"] = values["scraped_at"] or time.time()
+        history_values = [
+            (values["match_id"], row.table, row.position, row.match_id, row.league_id, row.league_name, row.date_key,
+             row.home_id, row.home, row.away_id, row.away, row.home_goals, row.away_goals, row.ah_line_raw)
+            for row in (history.all_rows() if history is not None else [])
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO matches ({', '.join(MATCH_COLUMNS)}) VALUES ({', '.join('?' * len(MATCH_COLUMNS))})",
+                    tuple(values[c] for c in MATCH_COLUMNS),
+                )
+                if history is not None:
+                    self._conn.execute("DELETE FROM history_rows WHERE match_id = ?", (values["match_id"],))
+                    self._conn.executemany(
+                        f"INSERT INTO history_rows ({', '.join(HISTORY_COLUMNS)}) VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})",
+                        history_values,
+                    )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_match(self, match_id) -> Dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM matches WHERE match_id = ?", (int(match_id),)).fetchone()
+        return dict(row) if row else None
+
+    def query_matches(self, team_id=None, league_id=None, date_from: str | None = None, date_to: str | None = None,
+                      limit: int | None = None) -> List[Dict]:
+        """Partidos guardados, más recientes primero. `team_id` busca como local o visitante; fechas 'YYYY-MM-DD'."""
+        clauses, params = [], []
+        if team_id is not None:
+            clauses.append("(home_id = ? OR away_id = ?)")
+            params += [str(team_id), str(team_id)]
+        if league_id is not None:
+            clauses.append("league_id = ?")
+            params.append(str(league_id))
+        if date_from:
+            clauses.append("substr(match_date, 1, 10) >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("substr(match_date, 1, 10) <= ?")
+            params.append(date_to)
+        sql = "SELECT * FROM matches"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY match_date DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params)]
+
+    def history_rows(self, match_id, table_num: int | None = None) -> List[Dict]:
+        sql, params = "SELECT * FROM history_rows WHERE match_id = ?", [int(match_id)]
+        if table_num is not None:
+            sql += " AND table_num = ?"
+            params.append(int(table_num))
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql + " ORDER BY table_num, position", params)]
+
+    def history_frame(self, team_id=None, league_id=None) -> pd.DataFrame:
+        """
+        Filas de historial guardadas como DataFrame (para análisis masivos), con la línea AH ya convertida
+        en la columna `ah_line` (NaN si no hay). `team_id` busca como local o visitante.
+        """
+        clauses, params = [], []
+        if team_id is not None:
+            clauses.append("(home_id = ? OR away_id = ?)")
+            params += [str(team_id), str(team_id)]
+        if league_id is not None:
+            clauses.append("league_id = ?")
+            params.append(str(league_id))
+        sql = "SELECT * FROM history_rows"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            frame = pd.read_sql_query(sql + " ORDER BY match_id, table_num, position", self._conn, params=params)
+        frame["ah_line"] = parse_ah_lines(frame["ah_line_raw"])
+        return frame
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            matches = self._conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+            rows = self._conn.execute("SELECT COUNT(*) FROM history_rows").fetchone()[0]
+        return {"matches": matches, "history_rows": rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_match_store_instance = None
+_match_store_lock = threading.Lock()
+
+
+def get_match_store() -> MatchStore | None:
+    """Almacén compartido del proceso (None si está desactivado con NOWGOAL_MATCH_STORE=0 o no se puede abrir)."""
+    global _match_store_instance
+    if not MATCH_STORE_ENABLED:
+        return None
+    if _match_store_instance is None:
+        with _match_store_lock:
+            if _match_store_instance is None:
+                try:
+                    _match_store_instance = MatchStore()
+                except (sqlite3.Error, OSError):
+                    return None
+    return _match_store_instance
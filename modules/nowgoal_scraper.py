@@ -4,12 +4,21 @@ import streamlit as st
 import time
 import requests
 import re
-import math
 import pandas as pd
-from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from modules.ah_engine import format_ah_line as format_ah_as_decimal_string_of
+from modules.browser_backend import get_browser_backend
+from modules.driver_pool import DriverPool
+from modules.http_fetcher import fetch_html
+from modules.history_index import VENUE_AWAY, VENUE_HOME, index_for_soup
+from modules.history_parser import history_for_soup
+from modules.odds_extractor import odds_for_soup
+from modules.parse_cache import make_page_soup
+from modules.rate_limiter import driver_get
+from modules.page_readiness import wait_for_css, wait_for_rows_stable
+
 # IMPORTAR LA FUNCIÓN PARA LAS ESTADÍSTICAS DETALLADAS DE PARTIDO
 from modules.match_stats_extractor import _get_match_stats_data 
 
@@ -19,104 +28,20 @@ from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException, ElementClickInterceptedException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException, NoSuchElementException
 
 # --- CONFIGURACIÓN GLOBAL ---
 BASE_URL_OF = "https://live18.nowgoal25.com" 
 SELENIUM_TIMEOUT_SECONDS_OF = 20
 SELENIUM_POLL_FREQUENCY_OF = 0.2
 PLACEHOLDER_NODATA = "*(No disponible)*"
+DRIVER_POOL_SIZE_OF = 3        # navegadores compartidos entre todas las sesiones
+DRIVER_LEASE_TIMEOUT_OF = 120  # segundos máximos esperando un navegador libre
 
 
 # --- FUNCIONES HELPER (sin cambios respecto a la versión anterior, las incluyo para completitud) ---
-def parse_ah_to_number_of(ah_line_str: str):
-    if not isinstance(ah_line_str, str): return None
-    s = ah_line_str.strip().replace(' ', '')
-    if not s or s in ['-', '?']: return None
-    original_starts_with_minus = ah_line_str.strip().startswith('-')
-    try:
-        if '/' in s: 
-            parts = s.split('/')
-            if len(parts) != 2: return None
-            p1_str, p2_str = parts[0], parts[1]
-            try: val1 = float(p1_str)
-            except ValueError: return None
-            try: val2 = float(p2_str)
-            except ValueError: return None
-            if val1 < 0 and not p2_str.startswith('-') and val2 > 0:
-                 val2 = -abs(val2)
-            elif original_starts_with_minus and val1 == 0.0 and \
-                 (p1_str == "0" or p1_str == "-0") and \
-                 not p2_str.startswith('-') and val2 > 0:
-                val2 = -abs(val2)
-            return (val1 + val2) / 2.0
-        else: 
-            return float(s)
-    except ValueError:
-        return None
-
-def format_ah_as_decimal_string_of(ah_line_str: str, for_sheets=False):
-    if not isinstance(ah_line_str, str) or not ah_line_str.strip() or ah_line_str.strip() in ['-', '?']:
-        return ah_line_str.strip() if isinstance(ah_line_str, str) and ah_line_str.strip() in ['-','?'] else '-'
-    
-    numeric_value = parse_ah_to_number_of(ah_line_str)
-    if numeric_value is None:
-        return ah_line_str.strip() if ah_line_str.strip() in ['-','?'] else '-'
-
-    if numeric_value == 0.0:
-        return "0"
-    
-    sign = -1 if numeric_value < 0 else 1
-    abs_num = abs(numeric_value)
-    mod_val = abs_num % 1
-    
-    if mod_val == 0.0: abs_rounded = abs_num
-    elif mod_val == 0.25: abs_rounded = math.floor(abs_num) + 0.25
-    elif mod_val == 0.5: abs_rounded = abs_num
-    elif mod_val == 0.75: abs_rounded = math.floor(abs_num) + 0.75
-    else: 
-        if mod_val < 0.25: abs_rounded = math.floor(abs_num)
-        elif mod_val < 0.75: abs_rounded = math.floor(abs_num) + 0.5
-        else: abs_rounded = math.ceil(abs_num)
-
-    final_value_signed = sign * abs_rounded
-
-    if final_value_signed == 0.0: output_str = "0"
-    elif abs(final_value_signed - round(final_value_signed, 0)) < 1e-9 : output_str = str(int(round(final_value_signed, 0)))
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.5)) < 1e-9: output_str = f"{final_value_signed:.1f}"
-    elif abs(final_value_signed - (math.floor(final_value_signed) + 0.25)) < 1e-9 or \
-         abs(final_value_signed - (math.floor(final_value_signed) + 0.75)) < 1e-9: output_str = f"{final_value_signed:.2f}".replace(".25", ".25").replace(".75", ".75")
-    else: output_str = f"{final_value_signed:.2f}" 
-
-    if for_sheets:
-        return "'" + output_str.replace('.', ',') if output_str not in ['-','?'] else output_str
-    return output_str
-
-def get_match_details_from_row_of(row_element, score_class_selector='score', source_table_type='h2h'):
-    try:
-        cells = row_element.find_all('td')
-        if len(cells) < 12: return None
-        league_id_hist_attr = row_element.get('name')
-        home_idx, score_idx, away_idx, ah_idx = 2, 3, 4, 11
-        home_tag = cells[home_idx].find('a'); home = home_tag.text.strip() if home_tag else cells[home_idx].text.strip()
-        away_tag = cells[away_idx].find('a'); away = away_tag.text.strip() if away_tag else cells[away_idx].text.strip()
-        score_cell_content = cells[score_idx].text.strip()
-        score_span = cells[score_idx].find('span', class_=lambda x: x and score_class_selector in x)
-        score_raw_text = score_span.text.strip() if score_span else score_cell_content
-        score_m = re.match(r'(\d+-\d+)', score_raw_text); score_raw = score_m.group(1) if score_m else '?-?'
-        score_fmt = score_raw.replace('-', '*') if score_raw != '?-?' else '?*?'
-        ah_line_raw_text = cells[ah_idx].text.strip()
-        ah_line_fmt = format_ah_as_decimal_string_of(ah_line_raw_text) 
-        if not home or not away: return None
-        
-        match_id_for_stats = row_element.get('index') 
-
-        return {'home': home, 'away': away, 'score': score_fmt, 'score_raw': score_raw,
-                'ahLine': ah_line_fmt, 'ahLine_raw': ah_line_raw_text,
-                'matchIndex': row_element.get('index'), 'vs': row_element.get('vs'),
-                'league_id_hist': league_id_hist_attr, 
-                'match_id_for_stats': match_id_for_stats} 
-    except Exception: return None
+def _row_ah_line_of(row) -> str:
+    return format_ah_as_decimal_string_of(row.ah_line_raw)
 
 @st.cache_resource
 def get_requests_session_of():
@@ -129,109 +54,88 @@ def get_requests_session_of():
 
 @st.cache_data(ttl=3600)
 def fetch_soup_requests_of(path, max_tries=3, delay=1):
+    # Pasa por la caché de páginas en disco; solo se va a la red si no está o ha caducado
     session = get_requests_session_of(); url = f"{BASE_URL_OF}{path}"
-    for attempt in range(1, max_tries + 1):
-        try:
-            resp = session.get(url, timeout=10); resp.raise_for_status()
-            return BeautifulSoup(resp.text, "html.parser")
-        except requests.RequestException:
-            if attempt == max_tries: return None
-            time.sleep(delay * attempt)
-    return None
+    _, html = fetch_html(session, url, timeout=10, max_tries=max_tries, delay=delay)
+    return make_page_soup(html, path, "html.parser") if html else None
 
 @st.cache_data(ttl=3600) 
 def get_rival_a_for_original_h2h_of(main_match_id: int):
     soup_h2h_page = fetch_soup_requests_of(f"/match/h2h-{main_match_id}") 
     if not soup_h2h_page: return None, None, None
-    table = soup_h2h_page.find("table", id="table_v1") 
-    if not table: return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr1_\d+")):
-        if row.get("vs") == "1": 
-            key_match_id_for_h2h_url = row.get("index") 
-            if not key_match_id_for_h2h_url: continue
-            onclicks = row.find_all("a", onclick=True) 
-            if len(onclicks) > 1 and onclicks[1].get("onclick"): 
-                rival_tag = onclicks[1]; rival_a_id_match = re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))
-                rival_a_name = rival_tag.text.strip()
-                if rival_a_id_match and rival_a_name: return key_match_id_for_h2h_url, rival_a_id_match.group(1), rival_a_name
+    for row in history_for_soup(soup_h2h_page).rows(1):
+        if row.vs == "1" and row.match_id and row.away_id and row.away:
+            return row.match_id, row.away_id, row.away
     return None, None, None
 
 @st.cache_data(ttl=3600)
 def get_rival_b_for_original_h2h_of(main_match_id: int):
     soup_h2h_page = fetch_soup_requests_of(f"/match/h2h-{main_match_id}") 
     if not soup_h2h_page: return None, None, None
-    table = soup_h2h_page.find("table", id="table_v2") 
-    if not table: return None, None, None
-    for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
-        if row.get("vs") == "1": 
-            match_id_of_rival_b_game = row.get("index") 
-            if not match_id_of_rival_b_game: continue
-            onclicks = row.find_all("a", onclick=True) 
-            if len(onclicks) > 0 and onclicks[0].get("onclick"): 
-                rival_tag = onclicks[0]; rival_b_id_match = re.search(r"team\((\d+)\)", rival_tag.get("onclick", ""))
-                rival_b_name = rival_tag.text.strip() 
-                if rival_b_id_match and rival_b_name: return match_id_of_rival_b_game, rival_b_id_match.group(1), rival_b_name
+    for row in history_for_soup(soup_h2h_page).rows(2):
+        if row.vs == "1" and row.match_id and row.home_id and row.home:
+            return row.match_id, row.home_id, row.home
     return None, None, None
 
-@st.cache_resource 
-def get_selenium_driver_of():
+def create_selenium_driver_of():
     options = ChromeOptions(); options.add_argument("--headless"); options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage"); options.add_argument("--disable-gpu")
     options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36")
     options.add_argument('--blink-settings=imagesEnabled=false'); options.add_argument("--window-size=1920,1080")
-    try: return webdriver.Chrome(options=options)
-    except WebDriverException as e: st.error(f"Error inicializando Selenium driver (OF): {e}"); return None
+    return webdriver.Chrome(options=options)
+
+@st.cache_resource 
+def get_driver_pool_of():
+    # Un driver por análisis en curso (lease exclusivo); los caídos se sustituyen al prestarse
+    return DriverPool(create_selenium_driver_of, max_size=DRIVER_POOL_SIZE_OF)
+
+def _load_h2h_page_selenium_of(driver_instance, url_to_visit, key_match_id_for_h2h_url):
+    if not driver_instance: return None, "N/A (Driver no disponible H2H OF)"
+    try:
+        driver_get(driver_instance, url_to_visit)
+        WebDriverWait(driver_instance, SELENIUM_TIMEOUT_SECONDS_OF, poll_frequency=SELENIUM_POLL_FREQUENCY_OF).until(EC.presence_of_element_located((By.ID, "table_v2")))
+        wait_for_rows_stable(driver_instance, "table_v2")
+        return make_page_soup(driver_instance.page_source, key_match_id_for_h2h_url, "html.parser"), None
+    except TimeoutException: return None, f"N/A (Timeout esperando table_v2 en {url_to_visit})"
+    except Exception as e: return None, f"N/A (Error Selenium en {url_to_visit}: {type(e).__name__})"
 
-def get_h2h_details_for_original_logic_of(driver_instance, key_match_id_for_h2h_url, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
+def get_h2h_details_for_original_logic_of(driver_instance, key_match_id_for_h2h_url, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B", use_browser_backend=True):
     default_error_result = {"status": "error", "resultado": f"N/A (H2H no procesado para {rival_a_name} vs {rival_b_name})", "match_id_for_stats": None}
-    if not driver_instance: 
-        default_error_result["resultado"] = "N/A (Driver no disponible H2H OF)"
-        return default_error_result
     if not key_match_id_for_h2h_url or not rival_a_id or not rival_b_id: 
         default_error_result["resultado"] = f"N/A (IDs incompletos para H2H {rival_a_name} vs {rival_b_name})"
         return default_error_result
     
     url_to_visit = f"{BASE_URL_OF}/match/h2h-{key_match_id_for_h2h_url}"
-    try:
-        driver_instance.get(url_to_visit)
-        WebDriverWait(driver_instance, SELENIUM_TIMEOUT_SECONDS_OF, poll_frequency=SELENIUM_POLL_FREQUENCY_OF).until(EC.presence_of_element_located((By.ID, "table_v2")))
-        time.sleep(0.7); soup_selenium = BeautifulSoup(driver_instance.page_source, "html.parser")
-    except TimeoutException: 
-        default_error_result["resultado"] = f"N/A (Timeout esperando table_v2 en {url_to_visit})"
-        return default_error_result
-    except Exception as e: 
-        default_error_result["resultado"] = f"N/A (Error Selenium en {url_to_visit}: {type(e).__name__})"
-        return default_error_result
+    # Primero el backend Playwright (un contexto por análisis, no hace cola tras el driver compartido)
+    backend = get_browser_backend() if use_browser_backend else None
+    rendered_html = backend.render_html(url_to_visit, wait_for="#table_v2") if backend is not None else None
+    if rendered_html:
+        soup_selenium = make_page_soup(rendered_html, key_match_id_for_h2h_url, "html.parser")
+    else:
+        soup_selenium, error_message = _load_h2h_page_selenium_of(driver_instance, url_to_visit, key_match_id_for_h2h_url)
+        if error_message:
+            default_error_result["resultado"] = error_message
+            return default_error_result
         
     if not soup_selenium: 
         default_error_result["resultado"] = f"N/A (Fallo soup Selenium H2H Original OF en {url_to_visit})"
         return default_error_result
     
-    table_to_search_h2h = soup_selenium.find("table", id="table_v2") 
-    if not table_to_search_h2h: 
+    h2h_rows = history_for_soup(soup_selenium).rows(2)
+    if not h2h_rows: 
         default_error_result["resultado"] = f"N/A (Tabla v2 para H2H no encontrada en {url_to_visit})"
         return default_error_result
         
-    for row in table_to_search_h2h.find_all("tr", id=re.compile(r"tr2_\d+")): 
-        links = row.find_all("a", onclick=True); 
-        if len(links) < 2: continue
-        h2h_row_home_id_m = re.search(r"team\((\d+)\)", links[0].get("onclick", "")); h2h_row_away_id_m = re.search(r"team\((\d+)\)", links[1].get("onclick", ""))
-        if not h2h_row_home_id_m or not h2h_row_away_id_m: continue
-        h2h_row_home_id = h2h_row_home_id_m.group(1); h2h_row_away_id = h2h_row_away_id_m.group(1)
-        if {h2h_row_home_id, h2h_row_away_id} == {str(rival_a_id), str(rival_b_id)}:
-            score_span = row.find("span", class_="fscore_2") 
-            if not score_span or not score_span.text or "-" not in score_span.text: continue
-            score_val = score_span.text.strip().split("(")[0].strip(); g_h, g_a = score_val.split("-", 1)
-            tds = row.find_all("td"); handicap_raw = "N/A"; HANDICAP_TD_IDX = 11 
-            if len(tds) > HANDICAP_TD_IDX:
-                cell = tds[HANDICAP_TD_IDX]; d_o = cell.get("data-o") 
-                handicap_raw = d_o.strip() if d_o and d_o.strip() not in ["", "-"] else (cell.text.strip() if cell.text.strip() not in ["", "-"] else "N/A")
-            rol_a_in_this_h2h = "H" if h2h_row_home_id == str(rival_a_id) else "A"
-            match_id_for_stats = row.get("index") 
-            return {"status": "found", "goles_home": g_h.strip(), "goles_away": g_a.strip(), "handicap": handicap_raw, 
-                    "rol_rival_a": rol_a_in_this_h2h, "h2h_home_team_name": links[0].text.strip(), 
-                    "h2h_away_team_name": links[1].text.strip(), 
-                    "match_id_for_stats": match_id_for_stats} 
+    for row in h2h_rows: 
+        if not row.home_id or not row.away_id: continue
+        if {row.home_id, row.away_id} == {str(rival_a_id), str(rival_b_id)}:
+            if row.home_goals is None: continue
+            handicap_raw = row.ah_line_raw if row.ah_line_raw != "-" else "N/A"
+            rol_a_in_this_h2h = "H" if row.home_id == str(rival_a_id) else "A"
+            return {"status": "found", "goles_home": str(row.home_goals), "goles_away": str(row.away_goals), "handicap": handicap_raw, 
+                    "rol_rival_a": rol_a_in_this_h2h, "h2h_home_team_name": row.home, 
+                    "h2h_away_team_name": row.away, 
+                    "match_id_for_stats": row.match_id} 
     default_error_result["resultado"] = f"H2H directo no encontrado para {rival_a_name} vs {rival_b_name} en historial (table_v2) de la página de ref. ({key_match_id_for_h2h_url})."
     return default_error_result
 
@@ -255,48 +159,22 @@ def click_element_robust_of(driver, by, value, timeout=7):
     try:
         element = WebDriverWait(driver, timeout, poll_frequency=SELENIUM_POLL_FREQUENCY_OF).until(EC.presence_of_element_located((by, value)))
         WebDriverWait(driver, timeout, poll_frequency=SELENIUM_POLL_FREQUENCY_OF).until(EC.visibility_of(element))
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'center'});", element); time.sleep(0.3)
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'center'});", element)
         try: WebDriverWait(driver, 2, poll_frequency=SELENIUM_POLL_FREQUENCY_OF).until(EC.element_to_be_clickable((by, value))).click()
         except (ElementClickInterceptedException, TimeoutException): driver.execute_script("arguments[0].click();", element)
         return True
     except Exception: return False
 
-def extract_last_match_in_league_of(driver, table_css_id_str, main_team_name_in_table, league_id_filter_value, home_or_away_filter_css_selector, is_home_game_filter):
-    try:
-        if league_id_filter_value:
-            league_checkbox_selector = f"input#checkboxleague{table_css_id_str[-1]}[value='{league_id_filter_value}']"
-            click_element_robust_of(driver, By.CSS_SELECTOR, league_checkbox_selector); time.sleep(1.0)
-        click_element_robust_of(driver, By.CSS_SELECTOR, home_or_away_filter_css_selector); time.sleep(1.0)
-        page_source_updated = driver.page_source; soup_updated = BeautifulSoup(page_source_updated, "html.parser")
-        table = soup_updated.find("table", id=table_css_id_str)
-        if not table: return None
-        count_visible_rows = 0
-        for row in table.find_all("tr", id=re.compile(rf"tr{table_css_id_str[-1]}_\d+")):
-            if row.get("style") and "display:none" in row.get("style","").lower(): continue
-            count_visible_rows +=1
-            if count_visible_rows > 10: break 
-            if league_id_filter_value and row.get("name") != str(league_id_filter_value): continue
-            tds = row.find_all("td"); 
-            if len(tds) < 14: continue
-            home_team_row_el = tds[2].find("a"); away_team_row_el = tds[4].find("a")
-            if not home_team_row_el or not away_team_row_el: continue
-            home_team_row_name = home_team_row_el.text.strip(); away_team_row_name = away_team_row_el.text.strip()
-            team_is_home_in_row = main_team_name_in_table.lower() == home_team_row_name.lower()
-            team_is_away_in_row = main_team_name_in_table.lower() == away_team_row_name.lower()
-            if (is_home_game_filter and team_is_home_in_row) or (not is_home_game_filter and team_is_away_in_row):
-                date_span = tds[1].find("span", {"name": "timeData"}); date = date_span.text.strip() if date_span else "N/A"
-                score_class_re = re.compile(r"fscore_"); score_span = tds[3].find("span", class_=score_class_re); score = score_span.text.strip() if score_span else "N/A"
-                handicap_cell = tds[11]; handicap_raw = handicap_cell.get("data-o", handicap_cell.text.strip()) 
-                if not handicap_raw or handicap_raw.strip() == "-": handicap_raw = "N/A"
-                else: handicap_raw = handicap_raw.strip()
-                
-                match_id_for_stats = row.get("index")
-
-                return {"date": date, "home_team": home_team_row_name, "away_team": away_team_row_name,
-                        "score": score, "handicap_line_raw": handicap_raw, 
-                        "match_id_for_stats": match_id_for_stats} 
-        return None
-    except Exception: return None
+def extract_last_match_in_league_of(soup, table_css_id_str, main_team_name_in_table, league_id_filter_value, is_home_game_filter):
+    # Filtro de liga y localía en Python sobre la tabla completa (sin clics en los checkbox de la página)
+    if not soup or not main_team_name_in_table: return None
+    venue = VENUE_HOME if is_home_game_filter else VENUE_AWAY
+    row = index_for_soup(soup).last_match(main_team_name_in_table, venue, league_id_filter_value or None, table=table_css_id_str)
+    if row is None: return None
+    return {"date": row.date or "N/A", "home_team": row.home, "away_team": row.away,
+            "score": row.score_raw if row.home_goals is not None else "N/A",
+            "handicap_line_raw": row.ah_line_raw if row.ah_line_raw != "-" else "N/A", 
+            "match_id_for_stats": row.match_id} 
 
 def get_main_match_odds_selenium_of(driver):
     odds_info = {"ah_home_cuota": "N/A", "ah_linea_raw": "N/A", "ah_away_cuota": "N/A", "goals_over_cuota": "N/A", "goals_linea_raw": "N/A", "goals_under_cuota": "N/A"}
@@ -304,7 +182,7 @@ def get_main_match_odds_selenium_of(driver):
         live_compare_div = WebDriverWait(driver, SELENIUM_TIMEOUT_SECONDS_OF, poll_frequency=SELENIUM_POLL_FREQUENCY_OF).until(EC.presence_of_element_located((By.ID, "liveCompareDiv")))
         bet365_row_selector = "tr#tr_o_1_8[name='earlyOdds']"; bet365_row_selector_alt = "tr#tr_o_1_31[name='earlyOdds']"
         table_odds = live_compare_div.find_element(By.XPATH, ".//table[contains(@class, 'team-table-other')]")
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", table_odds); time.sleep(0.5)
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", table_odds)
         bet365_early_odds_row = None
         try: bet365_early_odds_row = WebDriverWait(driver, 5, poll_frequency=SELENIUM_POLL_FREQUENCY_OF).until(EC.visibility_of_element_located((By.CSS_SELECTOR, bet365_row_selector)))
         except TimeoutException: 
@@ -384,55 +262,38 @@ def extract_final_score_of(soup):
 def extract_h2h_data_of(soup, main_home_team_name, main_away_team_name, current_league_id):
     ah1, res1, res1_raw, h2h1_match_id = '-', '?*?', '?-?', None
     ah6, res6, res6_raw, h2h6_match_id = '-', '?*?', '?-?', None
-    h2h_table = soup.find("table", id="table_v3")
-    if not h2h_table: return ah1, res1, res1_raw, h2h1_match_id, ah6, res6, res6_raw, h2h6_match_id
-    filtered_h2h_list = []
     if not main_home_team_name or not main_away_team_name:
         return ah1, res1, res1_raw, h2h1_match_id, ah6, res6, res6_raw, h2h6_match_id
 
-    for row_h2h in h2h_table.find_all("tr", id=re.compile(r"tr3_\d+")):
-        details = get_match_details_from_row_of(row_h2h, score_class_selector='fscore_3', source_table_type='h2h')
-        if not details: continue
-        if current_league_id and details.get('league_id_hist') and details.get('league_id_hist') != str(current_league_id): continue
-        filtered_h2h_list.append(details)
-    if not filtered_h2h_list: return ah1, res1, res1_raw, h2h1_match_id, ah6, res6, res6_raw, h2h6_match_id
+    index = index_for_soup(soup)
+    latest_h2h = index.latest(table=3, league_id=current_league_id, limit=1, keep_unknown_league=True)
+    if not latest_h2h: return ah1, res1, res1_raw, h2h1_match_id, ah6, res6, res6_raw, h2h6_match_id
     
-    h2h_general_match = filtered_h2h_list[0]
-    ah6 = h2h_general_match.get('ahLine', '-') 
-    res6 = h2h_general_match.get('score', '?*?'); res6_raw = h2h_general_match.get('score_raw', '?-?')
-    h2h6_match_id = h2h_general_match.get('match_id_for_stats') 
+    h2h_general_match = latest_h2h[0]
+    ah6 = _row_ah_line_of(h2h_general_match)
+    res6 = h2h_general_match.score("*"); res6_raw = h2h_general_match.score_raw
+    h2h6_match_id = h2h_general_match.match_id
     
-    h2h_local_specific_match = None
-    for d_h2h in filtered_h2h_list:
-        if d_h2h.get('home','').lower() == main_home_team_name.lower() and \
-           d_h2h.get('away','').lower() == main_away_team_name.lower():
-            h2h_local_specific_match = d_h2h; break
-    if h2h_local_specific_match:
-        ah1 = h2h_local_specific_match.get('ahLine', '-') 
-        res1 = h2h_local_specific_match.get('score', '?*?'); res1_raw = h2h_local_specific_match.get('score_raw', '?-?')
-        h2h1_match_id = h2h_local_specific_match.get('match_id_for_stats') 
+    specific = index.matches_between(main_home_team_name, main_away_team_name, VENUE_HOME, current_league_id, table=3, limit=1,
+                                     keep_unknown_league=True)
+    if specific:
+        h2h_local_specific_match = specific[0]
+        ah1 = _row_ah_line_of(h2h_local_specific_match)
+        res1 = h2h_local_specific_match.score("*"); res1_raw = h2h_local_specific_match.score_raw
+        h2h1_match_id = h2h_local_specific_match.match_id
     
     return ah1, res1, res1_raw, h2h1_match_id, ah6, res6, res6_raw, h2h6_match_id 
 
 def extract_comparative_match_of(soup_for_team_history, table_id_of_team_to_search, team_name_to_find_match_for, opponent_name_to_search, current_league_id, is_home_table):
     if not opponent_name_to_search or opponent_name_to_search == "N/A" or not team_name_to_find_match_for:
         return "-", None 
-    table = soup_for_team_history.find("table", id=table_id_of_team_to_search)
-    if not table: return "-", None 
-    score_class_selector = 'fscore_1' if is_home_table else 'fscore_2'
-    for row in table.find_all("tr", id=re.compile(rf"tr{table_id_of_team_to_search[-1]}_\d+")):
-        details = get_match_details_from_row_of(row, score_class_selector=score_class_selector, source_table_type='hist')
-        if not details: continue
-        if current_league_id and details.get('league_id_hist') and details.get('league_id_hist') != str(current_league_id): continue
-        home_hist = details.get('home','').lower(); away_hist = details.get('away','').lower()
-        team_main_lower = team_name_to_find_match_for.lower(); opponent_lower = opponent_name_to_search.lower()
-        if (team_main_lower == home_hist and opponent_lower == away_hist) or \
-           (team_main_lower == away_hist and opponent_lower == home_hist):
-            score = details.get('score', '?*?')
-            ah_line_extracted = details.get('ahLine', '-')
-            localia = 'H' if team_main_lower == home_hist else 'A'
-            match_id_for_stats = details.get('match_id_for_stats') 
-            return f"{score}/{ah_line_extracted} {localia}".strip(), match_id_for_stats 
+    found = index_for_soup(soup_for_team_history).matches_between(
+        team_name_to_find_match_for, opponent_name_to_search, league_id=current_league_id,
+        table=table_id_of_team_to_search, limit=1, keep_unknown_league=True)
+    if found:
+        row = found[0]
+        localia = 'H' if row.home_key == team_name_to_find_match_for.lower() else 'A'
+        return f"{row.score('*')}/{_row_ah_line_of(row)} {localia}".strip(), row.match_id 
     return "-", None 
 
 # --- STREAMLIT APP UI (Función principal) ---
@@ -478,9 +339,6 @@ def display_other_feature_ui():
 
     results_container = st.container()
 
-    if 'driver_other_feature' not in st.session_state: 
-        st.session_state.driver_other_feature = None
-
     if analizar_button_of:
         results_container.empty() 
         main_match_id_to_process_of = None
@@ -527,7 +385,8 @@ def display_other_feature_ui():
                      if soup_rival_b_h2h_page: rival_b_standings = extract_standings_data_from_h2h_page_of(soup_rival_b_h2h_page, rival_b_name_orig_col3)
 
             # Inicialización de variables para datos y DataFrames de estadísticas
-            main_match_odds_data_of = {}
+            # Cuotas iniciales desde el HTML ya descargado; Selenium solo si la página no las trae
+            main_match_odds_data_of = odds_for_soup(soup_main_h2h_page_of).opening_odds_info()
             last_home_match_in_league_of = None; last_away_match_in_league_of = None
             details_h2h_col3_of = {"status": "error", "resultado": PLACEHOLDER_NODATA, "match_id_for_stats": None}
             ah1_val, res1_val, h2h1_match_id = '-', '?*?', None
@@ -543,53 +402,42 @@ def display_other_feature_ui():
             comp_l_extra_stats_df = pd.DataFrame()
             comp_v_extra_stats_df = pd.DataFrame()
 
-            # Lógica para inicializar Selenium WebDriver
-            driver_actual_of = st.session_state.driver_other_feature
-            driver_of_needs_init = False
-            if driver_actual_of is None: driver_of_needs_init = True
-            else:
-                try:
-                    _ = driver_actual_of.window_handles
-                    if hasattr(driver_actual_of, 'service') and driver_actual_of.service and not driver_actual_of.service.is_connectable(): driver_of_needs_init = True
-                except WebDriverException: driver_of_needs_init = True
-
-            if driver_of_needs_init:
-                if driver_actual_of is not None:
-                    try: driver_actual_of.quit() 
-                    except: pass
-                with st.spinner("🚘 Inicializando WebDriver para datos dinámicos (Paso 4/4)..."): 
-                    driver_actual_of = get_selenium_driver_of()
-                st.session_state.driver_other_feature = driver_actual_of
-
-            if driver_actual_of:
+            # H2H de rivales (Col3) con el backend Playwright; el driver Selenium compartido solo hace falta
+            # si Playwright no está disponible o si la página estática no traía las cuotas iniciales
+            col3_wanted = bool(key_match_id_for_rival_a_h2h and rival_a_id_orig_col3 and rival_b_id_orig_col3)
+            if col3_wanted:
+                details_h2h_col3_of = get_h2h_details_for_original_logic_of(None, key_match_id_for_rival_a_h2h, rival_a_id_orig_col3, rival_b_id_orig_col3, rival_a_col3_name_display, rival_b_col3_name_display)
+            col3_needs_driver = col3_wanted and details_h2h_col3_of.get("status") == "error"
+
+            if col3_needs_driver or main_match_odds_data_of.get("ah_linea_raw") == "N/A":
                 try:
-                    with st.spinner("⚙️ Accediendo a datos dinámicos con Selenium (cuotas, últimos partidos, estadísticas detalladas)..."):
-                        driver_actual_of.get(f"{BASE_URL_OF}{main_page_url_h2h_view_of}") 
-                        WebDriverWait(driver_actual_of, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "table_v1"))) 
-                        time.sleep(1.0) 
-
-                        main_match_odds_data_of = get_main_match_odds_selenium_of(driver_actual_of)
-                        
-                        if mp_home_id_of and mp_league_id_of and display_home_name and display_home_name != "N/A":
-                             last_home_match_in_league_of = extract_last_match_in_league_of(driver_actual_of, "table_v1", display_home_name, mp_league_id_of, "input#cb_sos1[value='1']", is_home_game_filter=True)
-                             if last_home_match_in_league_of and last_home_match_in_league_of.get('match_id_for_stats'):
-                                 last_home_match_extra_stats_df = _get_match_stats_data(last_home_match_in_league_of['match_id_for_stats'])
-                        
-                        if mp_away_id_of and mp_league_id_of and display_away_name and display_away_name != "N/A":
-                            last_away_match_in_league_of = extract_last_match_in_league_of(driver_actual_of, "table_v2", display_away_name, mp_league_id_of, "input#cb_sos2[value='2']", is_home_game_filter=False)
-                            if last_away_match_in_league_of and last_away_match_in_league_of.get('match_id_for_stats'):
-                                last_away_match_extra_stats_df = _get_match_stats_data(last_away_match_in_league_of['match_id_for_stats'])
-                        
-                        if key_match_id_for_rival_a_h2h and rival_a_id_orig_col3 and rival_b_id_orig_col3: 
-                            details_h2h_col3_of = get_h2h_details_for_original_logic_of(driver_actual_of, key_match_id_for_rival_a_h2h, rival_a_id_orig_col3, rival_b_id_orig_col3, rival_a_col3_name_display, rival_b_col3_name_display)
-                            if details_h2h_col3_of.get("status") == "found" and details_h2h_col3_of.get('match_id_for_stats'):
-                                h2h_col3_extra_stats_df = _get_match_stats_data(details_h2h_col3_of['match_id_for_stats'])
-                        
+                    with get_driver_pool_of().lease(timeout=DRIVER_LEASE_TIMEOUT_OF) as driver_actual_of, \
+                            st.spinner("⚙️ Accediendo a datos dinámicos con Selenium (cuotas iniciales, H2H de rivales)..."):
+                        if main_match_odds_data_of.get("ah_linea_raw") == "N/A":
+                            driver_get(driver_actual_of, f"{BASE_URL_OF}{main_page_url_h2h_view_of}") 
+                            WebDriverWait(driver_actual_of, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "table_v1"))) 
+                            wait_for_css(driver_actual_of, "tr[name='earlyOdds']") 
+                            main_match_odds_data_of = get_main_match_odds_selenium_of(driver_actual_of)
+                        if col3_needs_driver: 
+                            details_h2h_col3_of = get_h2h_details_for_original_logic_of(driver_actual_of, key_match_id_for_rival_a_h2h, rival_a_id_orig_col3, rival_b_id_orig_col3, rival_a_col3_name_display, rival_b_col3_name_display, use_browser_backend=False)
+                except TimeoutError:
+                    st.warning("❗ Todos los navegadores están ocupados con otros análisis. No se podrán obtener las cuotas iniciales ni el H2H de rivales (Col3).")
                 except Exception as e_main_sel_of: 
                     st.error(f"❗ Error durante la extracción con Selenium: {type(e_main_sel_of).__name__}. Algunos datos dinámicos podrían faltar.")
-            else: 
-                st.warning("❗ WebDriver no disponible. No se podrán obtener cuotas iniciales, últimos partidos filtrados por liga/localía ni estadísticas detalladas de esos partidos.")
             
+            if details_h2h_col3_of.get("status") == "found" and details_h2h_col3_of.get('match_id_for_stats'):
+                h2h_col3_extra_stats_df = _get_match_stats_data(details_h2h_col3_of['match_id_for_stats'])
+
+            # Últimos partidos en liga como local/visitante: se filtran sobre el HTML ya descargado, sin navegador
+            if mp_home_id_of and mp_league_id_of and display_home_name and display_home_name != "N/A":
+                last_home_match_in_league_of = extract_last_match_in_league_of(soup_main_h2h_page_of, "table_v1", display_home_name, mp_league_id_of, is_home_game_filter=True)
+                if last_home_match_in_league_of and last_home_match_in_league_of.get('match_id_for_stats'):
+                    last_home_match_extra_stats_df = _get_match_stats_data(last_home_match_in_league_of['match_id_for_stats'])
+            if mp_away_id_of and mp_league_id_of and display_away_name and display_away_name != "N/A":
+                last_away_match_in_league_of = extract_last_match_in_league_of(soup_main_h2h_page_of, "table_v2", display_away_name, mp_league_id_of, is_home_game_filter=False)
+                if last_away_match_in_league_of and last_away_match_in_league_of.get('match_id_for_stats'):
+                    last_away_match_extra_stats_df = _get_match_stats_data(last_away_match_in_league_of['match_id_for_stats'])
+
             # H2H y comparativas indirectas (con Requests si es posible, o actualizadas si Selenium corrió)
             ah1_val, res1_val, _, h2h1_match_id, ah6_val, res6_val, _, h2h6_match_id = extract_h2h_data_of(soup_main_h2h_page_of, display_home_name, display_away_name, mp_league_id_of)
             if h2h1_match_id: h2h1_extra_stats_df = _get_match_stats_data(h2h1_match_id)
@@ -826,6 +674,4 @@ def display_other_feature_ui():
 
 if __name__ == '__main__':
     st.set_page_config(layout="wide", page_title="Análisis Avanzado de Partidos (OF)", initial_sidebar_state="expanded")
-    if 'driver_other_feature' not in st.session_state:
-        st.session_state.driver_other_feature = None
     display_other_feature_ui()
@@ -0,0 +1,136 @@
+# modules/odds_extractor.py
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+import lxml.html
+
+from modules.async_fetcher import AsyncFetcher
+from modules.parse_cache import PAGE_HTML_ATTR
+
+# --- CONFIGURACIÓN ---
+ODDS_ATTR = "nowgoal_odds"
+BET365_ID, SBOBET_ID = "8", "31"
+OPENING_PREFERENCE = (BET365_ID, SBOBET_ID)   # mismo orden que el selector "tr#tr_o_1_8, tr#tr_o_1_31"
+
+# Filas de #liveCompareDiv: tr_o_{tipo}_{casa}, con name earlyOdds/liveOdds/runOdds
+ODDS_KINDS = {"1": "early", "2": "live", "3": "run"}
+_ROW_ID_RE = re.compile(r"^tr_o_([123])_(\d+)$")
+_DISPLAY_NONE_RE = re.compile(r"display\s*:\s*none", re.IGNORECASE)
+
+# Columnas de datos (tras la de casa/tipo): AH local, línea AH, AH visitante, 1, X, 2, over, línea goles, under
+ODDS_FIELDS = ("ah_home", "ah_line_raw", "ah_away", "home_win", "draw", "away_win", "over", "goals_line_raw", "under")
+
+
+@dataclass(slots=True)
+class BookmakerOdds:
+    """Cuotas de una casa en un momento (early = iniciales, live, run). Los valores son el texto de data-o o None."""
+    company_id: str
+    company: str
+    kind: str
+    hidden: bool
+    ah_home: str | None
+    ah_line_raw: str | None
+    ah_away: str | None
+    home_win: str | None
+    draw: str | None
+    away_win: str | None
+    over: str | None
+    goals_line_raw: str | None
+    under: str | None
+
+    def as_odds_info(self) -> Dict[str, str]:
+        """Formato de diccionario que usan las páginas de análisis ('N/A' si falta)."""
+        return {
+            "ah_home_cuota": self.ah_home or "N/A", "ah_linea_raw": self.ah_line_raw or "N/A",
+            "ah_away_cuota": self.ah_away or "N/A", "goals_over_cuota": self.over or "N/A",
+            "goals_linea_raw": self.goals_line_raw or "N/A", "goals_under_cuota": self.under or "N/A",
+        }
+
+
+def empty_odds_info() -> Dict[str, str]:
+    return {"ah_home_cuota": "N/A", "ah_linea_raw": "N/A", "ah_away_cuota": "N/A",
+            "goals_over_cuota": "N/A", "goals_linea_raw": "N/A", "goals_under_cuota": "N/A"}
+
+
+class MatchOdds:
+    """Todas las casas de la comparativa de cuotas de una página H2H, por tipo e ID de casa, en orden de página."""
+
+    def __init__(self, rows: Dict[str, Dict[str, BookmakerOdds]]):
+        self._rows = rows
+
+    def bookmakers(self, kind: str = "early") -> List[BookmakerOdds]:
+        return list(self._rows.get(kind, {}).values())
+
+    def get(self, company_id, kind: str = "early") -> BookmakerOdds | None:
+        return self._rows.get(kind, {}).get(str(company_id))
+
+    def opening(self, preference: Iterable[str] = OPENING_PREFERENCE) -> BookmakerOdds | None:
+        """Cuotas iniciales de la primera casa disponible según `preference`."""
+        for company_id in preference:
+            odds = self.get(company_id)
+            if odds is not None:
+                return odds
+        return None
+
+    def opening_odds_info(self, preference: Iterable[str] = OPENING_PREFERENCE) -> Dict[str, str]:
+        odds = self.opening(preference)
+        return odds.as_odds_info() if odds is not None else empty_odds_info()
+
+    def __bool__(self) -> bool:
+        return any(self._rows.values())
+
+
+def _cell_value(cell) -> str | None:
+    return (cell.get("data-o") or cell.text_content()).strip() or None
+
+
+def parse_match_odds(html: str) -> MatchOdds:
+    """Una sola pasada lxml sobre #liveCompareDiv: cuotas iniciales, live y run de todas las casas (también las ocultas)."""
+    rows: Dict[str, Dict[str, BookmakerOdds]] = {kind: {} for kind in ODDS_KINDS.values()}
+    if not html:
+        return MatchOdds(rows)
+    root = lxml.html.fromstring(html)
+    names: Dict[str, str] = {}
+    for tr in root.xpath("//tr[starts-with(@id, 'tr_o_')]"):
+        id_match = _ROW_ID_RE.match(tr.get("id", ""))
+        if not id_match:
+            continue
+        kind, company_id = ODDS_KINDS[id_match.group(1)], id_match.group(2)
+        cells = tr.xpath("./td")
+        # La fila early lleva además la celda de la casa (rowspan=3) y la del icono de evolución
+        if cells and "companyBg" in (cells[0].get("class") or ""):
+            names[company_id] = cells[0].text_content().strip()
+            cells = cells[1:]
+        if len(cells) < len(ODDS_FIELDS) + 1:
+            continue
+        values = [_cell_value(cell) for cell in cells[1:len(ODDS_FIELDS) + 1]]
+        rows[kind][company_id] = BookmakerOdds(
+            company_id, names.get(company_id, company_id), kind, bool(_DISPLAY_NONE_RE.search(tr.get("style", ""))),
+            *values,
+        )
+    return MatchOdds(rows)
+
+
+def odds_for_soup(soup) -> MatchOdds:
+    """Cuotas de la página del soup, parseadas una única vez y guardadas en el propio soup."""
+    cached = vars(soup).get(ODDS_ATTR)
+    if cached is not None:
+        return cached
+    odds = parse_match_odds(vars(soup).get(PAGE_HTML_ATTR) or str(soup))
+    setattr(soup, ODDS_ATTR, odds)
+    return odds
+
+
+async def fetch_match_odds_many(fetcher: AsyncFetcher, base_url: str, match_ids) -> Dict[str, MatchOdds | None]:
+    """
+    Cuotas de muchos partidos sin navegador: descarga las páginas H2H en paralelo con el AsyncFetcher
+    (límite por host y rate limiter compartidos) y parsea cada una en un hilo. {match_id: MatchOdds | None}.
+    """
+    ids = list(dict.fromkeys(str(m) for m in match_ids if m and str(m).isdigit()))
+    urls = {m: f"{base_url}/match/h2h-{m}" for m in ids}
+    pages = await fetcher.fetch_many(urls.values())
+    parsed = await asyncio.gather(*(asyncio.to_thread(parse_match_odds, pages[urls[m]]) if pages.get(urls[m]) else
+                                    asyncio.sleep(0, None) for m in ids))
+    return dict(zip(ids, parsed))
@@ -0,0 +1,168 @@
+# modules/page_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Tuple
+
+# --- CONFIGURACIÓN ---
+DEFAULT_CACHE_PATH = os.environ.get(
+    "NOWGOAL_PAGE_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nowgoal", "pages.sqlite"),
+)
+DEFAULT_MAX_BYTES = int(float(os.environ.get("NOWGOAL_PAGE_CACHE_MAX_MB", "512")) * 1024 * 1024)
+PAGE_CACHE_ENABLED = os.environ.get("NOWGOAL_PAGE_CACHE", "1") != "0"
+
+# TTL en segundos para páginas de partidos no terminados, por tipo de página.
+# Los partidos terminados no cambian: se guardan sin caducidad (solo los expulsa el LRU).
+DEFAULT_TTLS = {
+    "h2h": 15 * 60,
+    "live": 5 * 60,
+    "other": 30 * 60,
+}
+EVICT_TARGET_RATIO = 0.9
+
+_FINISHED_RE = re.compile(r"state:\s*parseInt\('-1'\)|eventStatus\s*=\s*'Finished'|>\s*Finished\s*<")
+
+
+def page_type_from_url(url: str) -> str:
+    if "/match/h2h-" in url:
+        return "h2h"
+    if "/match/live-" in url:
+        return "live"
+    return "other"
+
+
+def is_finished_match_page(html: str) -> bool:
+    return bool(html) and _FINISHED_RE.search(html) is not None
+
+
+def content_hash(html: str) -> str:
+    return hashlib.sha1(html.encode("utf-8", errors="ignore")).hexdigest()
+
+
+class PageCache:
+    """
+    Caché de páginas HTML en disco (SQLite, HTML comprimido con zlib) compartida entre procesos.
+    Clave: URL. Guarda hash del contenido, tipo de página, caducidad y último acceso (para el LRU).
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES, ttls: Dict[str, int] | None = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evicted": 0}
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY, body BLOB NOT NULL, content_hash TEXT NOT NULL, page_type TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL, expires_at REAL, last_access REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages(last_access)")
+
+    def _count(self, key: str, amount: int = 1):
+        self._counters[key] += amount
+
+    def get_entry(self, url: str) -> Tuple[str, str] | None:
+        """Devuelve (html, content_hash) si la URL está en caché y no ha caducado."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT body, content_hash, expires_at FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            body, page_hash, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self._count("expired")
+                self._count("misses")
+                return None
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE url = ?", (now, url))
+            self._count("hits")
+        return zlib.decompress(body).decode("utf-8"), page_hash
+
+    def get(self, url: str) -> str | None:
+        entry = self.get_entry(url)
+        return entry[0] if entry else None
+
+    def put(self, url: str, html: str, page_type: str | None = None, ttl: float | None = -1) -> str:
+        """
+        Guarda la página y devuelve su hash. `ttl=-1` (por defecto) decide la caducidad según el tipo de página:
+        sin caducidad si el partido ha terminado, si no la TTL configurada. `ttl=None` fuerza sin caducidad.
+        """
+        if not html:
+            return ""
+        page_type = page_type or page_type_from_url(url)
+        if ttl == -1:
+            ttl = None if is_finished_match_page(html) else self.ttls.get(page_type, self.ttls["other"])
+        now = time.time()
+        body = zlib.compress(html.encode("utf-8"), 6)
+        page_hash = content_hash(html)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, body, content_hash, page_type, fetched_at, expires_at, last_access, size)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, body, page_hash, page_type, now, None if ttl is None else now + ttl, now, len(body)),
+            )
+            self._count("stores")
+            self._evict_if_needed()
+        return page_hash
+
+    def _evict_if_needed(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * EVICT_TARGET_RATIO)
+        freed = 0
+        victims = []
+        for url, size in self._conn.execute("SELECT url, size FROM pages ORDER BY last_access ASC"):
+            victims.append((url,))
+            freed += size
+            if total - freed <= target:
+                break
+        self._conn.executemany("DELETE FROM pages WHERE url = ?", victims)
+        self._count("evicted", len(victims))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+            data = dict(self._counters)
+        lookups = data["hits"] + data["misses"]
+        data.update({"entries": entries, "bytes": total, "hit_rate": round(data["hits"] / lookups, 4) if lookups else 0.0})
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM pages")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_page_cache_instance = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> PageCache | None:
+    """Caché compartida del proceso (None si está desactivada con NOWGOAL_PAGE_CACHE=0 o no se puede abrir)."""
+    global _page_cache_instance
+    if not PAGE_CACHE_ENABLED:
+        return None
+    if _page_cache_instance is None:
+        with _page_cache_lock:
+            if _page_cache_instance is None:
+                try:
+                    _page_cache_instance = PageCache()
+                except (sqlite3.Error, OSError):
+                    return None
+    return _page_cache_instance
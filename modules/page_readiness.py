@@ -0,0 +1,109 @@
+# modules/page_readiness.py
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import Select, WebDriverWait
+
+from modules.tracing import span
+
+# --- CONFIGURACIÓN ---
+DEFAULT_READY_TIMEOUT = 5
+DEFAULT_POLL = 0.1
+DEFAULT_STABLE_POLLS = 2    # lecturas seguidas iguales para dar la tabla por estable
+
+# (filas totales, filas visibles) de una tabla de historial; las ocultas tienen display:none
+_ROWS_SIGNATURE_JS = """
+const table = document.getElementById(arguments[0]);
+if (!table) { return null; }
+const rows = table.querySelectorAll('tr[id^="tr' + arguments[0].slice(-1) + '_"]');
+let visible = 0;
+for (const row of rows) { if (row.style.display !== 'none') { visible++; } }
+return [rows.length, visible];
+"""
+
+
+def rows_signature(driver, table_id: str):
+    try:
+        signature = driver.execute_script(_ROWS_SIGNATURE_JS, table_id)
+    except WebDriverException:
+        return None
+    return tuple(signature) if signature else None
+
+
+class _RowsSettled:
+    """Condición: la firma de filas ha cambiado respecto a `before` (si se da) y se repite `stable_polls` veces."""
+
+    def __init__(self, table_id: str, before=None, stable_polls: int = DEFAULT_STABLE_POLLS):
+        self.table_id = table_id
+        self.before = before
+        self.stable_polls = stable_polls
+        self.last = None
+        self.repeats = 0
+        self.changed = before is None
+
+    def __call__(self, driver):
+        signature = rows_signature(driver, self.table_id)
+        if signature is None:
+            return False
+        if signature != self.before:
+            self.changed = True
+        if signature == self.last:
+            self.repeats += 1
+        else:
+            self.last, self.repeats = signature, 1
+        return self.changed and self.repeats >= self.stable_polls and signature
+
+
+def wait_for_rows_stable(driver, table_id: str, before=None, timeout: float = DEFAULT_READY_TIMEOUT,
+                         poll: float = DEFAULT_POLL) -> bool:
+    """
+    Espera a que las filas de `table_id` dejen de cambiar. Con `before` (firma tomada antes de una acción)
+    espera primero a ver el cambio durante la mitad del plazo; si no llega (la acción no alteraba nada),
+    le basta con que las filas estén estables.
+    """
+    condition = _RowsSettled(table_id, before)
+    try:
+        WebDriverWait(driver, timeout / 2 if before is not None else timeout, poll_frequency=poll).until(condition)
+        return True
+    except TimeoutException:
+        if before is None:
+            return False
+    # La acción no cambió las filas (p. ej. el filtro ya estaba aplicado): basta con que estén estables
+    try:
+        WebDriverWait(driver, timeout / 2, poll_frequency=poll).until(_RowsSettled(table_id))
+        return True
+    except TimeoutException:
+        return False
+
+
+def select_and_wait(driver, select_id: str, value: str, table_id: str, timeout: float = DEFAULT_READY_TIMEOUT) -> bool:
+    """Cambia un <select> de la página (hSelect_N) y espera a que su tabla se redibuje."""
+    with span(f"selenium.select.{select_id}", value=value, table=table_id) as trace_span:
+        try:
+            element = WebDriverWait(driver, 2, poll_frequency=DEFAULT_POLL).until(EC.presence_of_element_located((By.ID, select_id)))
+        except TimeoutException:
+            trace_span.set(found=False)
+            return False
+        before = rows_signature(driver, table_id)
+        Select(element).select_by_value(value)
+        settled = wait_for_rows_stable(driver, table_id, before, timeout)
+        trace_span.set(settled=settled)
+        return settled
+
+
+def wait_for_css(driver, css_selector: str, timeout: float = DEFAULT_READY_TIMEOUT, visible: bool = False):
+    """Devuelve el elemento en cuanto aparece (o es visible); None si no llega a tiempo."""
+    condition = EC.visibility_of_element_located if visible else EC.presence_of_element_located
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=DEFAULT_POLL).until(condition((By.CSS_SELECTOR, css_selector)))
+    except TimeoutException:
+        return None
+
+
+def wait_for_document_ready(driver, timeout: float = DEFAULT_READY_TIMEOUT) -> bool:
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=DEFAULT_POLL).until(
+            lambda d: d.execute_script("return document.readyState") == "complete")
+        return True
+    except TimeoutException:
+        return False
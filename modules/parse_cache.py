@@ -0,0 +1,119 @@
+# modules/parse_cache.py
+import copy
+import functools
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict
+
+from bs4 import BeautifulSoup
+
+from modules.page_cache import content_hash
+from modules.tracing import current_span, span
+
+# --- CONFIGURACIÓN ---
+DEFAULT_MAX_ENTRIES = 4096
+PAGE_KEY_ATTR = "nowgoal_page_key"
+PAGE_HTML_ATTR = "nowgoal_html"
+
+_MATCH_ID_RE = re.compile(r"-(\d+)(?:\D*)$")
+
+
+def make_page_soup(html: str, page_ref: str, parser: str = "lxml") -> BeautifulSoup:
+    """
+    Crea el soup y le asocia la versión de la página: (match_id, hash del HTML), además del HTML
+    original para los parsers lxml. `page_ref` puede ser el ID del partido o la ruta (/match/h2h-123).
+    """
+    with span("parse", parser=parser, bytes=len(html) if html else 0):
+        soup = BeautifulSoup(html, parser)
+    match = _MATCH_ID_RE.search(str(page_ref))
+    match_id = match.group(1) if match else str(page_ref)
+    setattr(soup, PAGE_KEY_ATTR, (match_id, content_hash(html)))
+    setattr(soup, PAGE_HTML_ATTR, html)
+    return soup
+
+
+def soup_page_key(soup) -> tuple | None:
+    # vars() evita el __getattr__ de bs4, que buscaría una etiqueta con ese nombre en todo el árbol
+    return vars(soup).get(PAGE_KEY_ATTR) if soup is not None else None
+
+
+class ParseCache:
+    """
+    LRU en memoria de resultados de extractores (dicts/tuplas pequeños), clave
+    (match_id, hash de página, nombre del extractor, argumentos). Nunca hashea el árbol HTML.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._data: "OrderedDict[tuple, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def _timing(self, name: str) -> Dict[str, float]:
+        t = self._timings.get(name)
+        if t is None:
+            t = {"hits": 0, "misses": 0, "lookup_seconds": 0.0, "compute_seconds": 0.0}
+            self._timings[name] = t
+        return t
+
+    def get_or_compute(self, name: str, key: tuple, compute: Callable[[], object]):
+        start = time.perf_counter()
+        with self._lock:
+            found = key in self._data
+            if found:
+                self._data.move_to_end(key)
+                value = self._data[key]
+            timing = self._timing(name)
+            timing["lookup_seconds"] += time.perf_counter() - start
+            if found:
+                timing["hits"] += 1
+        if found:
+            current_span().set(cache="hit")
+            return copy.deepcopy(value)
+        current_span().set(cache="miss")
+
+        start = time.perf_counter()
+        value = compute()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            timing["misses"] += 1
+            timing["compute_seconds"] += elapsed
+            self._data[key] = value
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+        return copy.deepcopy(value)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Por extractor: aciertos, fallos, tiempo de consulta (solo clave pequeña) y tiempo de parseo."""
+        with self._lock:
+            return {name: dict(t) for name, t in self._timings.items()}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._timings.clear()
+
+
+_parse_cache = ParseCache()
+
+
+def get_parse_cache() -> ParseCache:
+    return _parse_cache
+
+
+def cached_extractor(func):
+    """
+    Decorador para extractores cuyo primer argumento es un soup creado con `make_page_soup`.
+    Si el soup no tiene versión de página se ejecuta el extractor sin caché.
+    """
+    @functools.wraps(func)
+    def wrapper(soup, *args, **kwargs):
+        with span(func.__name__):
+            page_key = soup_page_key(soup)
+            if page_key is None:
+                return func(soup, *args, **kwargs)
+            key = (page_key, func.__name__, args, tuple(sorted(kwargs.items())))
+            return _parse_cache.get_or_compute(func.__name__, key, lambda: func(soup, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,144 @@
+# modules/rate_limiter.py
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+from urllib.parse import urlsplit
+
+from modules.http_replay import HTTP_MODE, record_response, resolve_url
+from modules.tracing import span
+
+# --- CONFIGURACIÓN ---
+DEFAULT_RATE = float(os.environ.get("NOWGOAL_RATE_LIMIT_RPS", "10"))     # peticiones/segundo por host
+DEFAULT_BURST = float(os.environ.get("NOWGOAL_RATE_LIMIT_BURST", "20"))
+RATE_LIMIT_ENABLED = os.environ.get("NOWGOAL_RATE_LIMIT", "1") != "0"
+
+
+class TokenBucket:
+    """
+    Cubo de tokens con reserva: cada petición toma un token aunque el saldo quede negativo y espera
+    lo que tarde en reponerse, así el orden de llegada se respeta y sirve igual para hilos y asyncio.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: float = DEFAULT_BURST):
+        self.rate = max(0.001, float(rate))
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Toma un token y devuelve cuántos segundos hay que esperar antes de usarlo."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(delay, self._blocked_until - now)
+
+    def pause(self, seconds: float):
+        """Frena el host durante `seconds` (p. ej. tras un 429 o un error): afecta a todos los que lo usan."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class HostRateLimiter:
+    """Un TokenBucket por host, compartido por requests, httpx y Selenium. Mide tiempo de espera frente a trabajo."""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: float = DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc or url
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+                self._stats[host] = {"requests": 0, "wait_seconds": 0.0, "work_seconds": 0.0, "pauses": 0}
+        return bucket
+
+    def _record(self, url: str, key: str, amount: float):
+        host = urlsplit(url).netloc or url
+        with self._lock:
+            self._stats[host][key] += amount
+
+    def wait(self, url: str) -> float:
+        delay = self._bucket(url).reserve()
+        if delay > 0:
+            time.sleep(delay)
+        self._record(url, "requests", 1)
+        self._record(url, "wait_seconds", delay)
+        return delay
+
+    async def wait_async(self, url: str) -> float:
+        delay = self._bucket(url).reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._record(url, "requests", 1)
+        self._record(url, "wait_seconds", delay)
+        return delay
+
+    def pause(self, url: str, seconds: float):
+        self._bucket(url).pause(seconds)
+        self._record(url, "pauses", 1)
+
+    @contextmanager
+    def request(self, url: str):
+        """Espera turno para el host y mide la duración de la petición (tiempo de trabajo)."""
+        self.wait(url)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(url, "work_seconds", time.perf_counter() - start)
+
+    def scale(self, factor: float):
+        """Multiplica ritmo y ráfaga de todos los hosts (los cubos se recrean con los nuevos valores)."""
+        with self._lock:
+            self.rate *= factor
+            self.burst *= factor
+            self._buckets.clear()
+
+    def record_work(self, url: str, seconds: float):
+        self._record(url, "work_seconds", seconds)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {host: {k: round(v, 3) if isinstance(v, float) else v for k, v in data.items()}
+                    for host, data in self._stats.items()}
+
+
+# Desactivado (NOWGOAL_RATE_LIMIT=0) no limita el ritmo, pero las pausas tras errores siguen aplicándose
+_rate_limiter = HostRateLimiter() if RATE_LIMIT_ENABLED else HostRateLimiter(rate=1e9, burst=1e9)
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    return _rate_limiter
+
+
+def share_rate_limit(processes: int):
+    """
+    El limitador es de cada proceso: con `processes` procesos trabajando contra los mismos hosts,
+    cada uno se queda con su parte para que el total siga siendo el ritmo y la ráfaga configurados.
+    """
+    if processes > 1:
+        _rate_limiter.scale(1.0 / processes)
+
+
+def driver_get(driver, url: str):
+    """
+    driver.get respetando el límite del host (la carga completa cuenta como tiempo de trabajo).
+    Con NOWGOAL_REPLAY_URL navega al servidor de reproducción; grabando, guarda el HTML tras la carga.
+    """
+    with span("selenium.navigate", url=url), _rate_limiter.request(url):
+        driver.get(resolve_url(url))
+    if HTTP_MODE == "record":
+        record_response(url, 200, driver.page_source)
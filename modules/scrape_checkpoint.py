@@ -0,0 +1,138 @@
+# modules/scrape_checkpoint.py
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from modules.http_replay import REPLAY_URL
+
+# --- CONFIGURACIÓN ---
+DEFAULT_CHECKPOINT_DIR = os.environ.get(
+    "NOWGOAL_CHECKPOINT_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "nowgoal", "checkpoints"),
+)
+# Estados definitivos: no se vuelven a pedir al reanudar. El resto (load_error, not_finished) se reintenta.
+FINAL_STATUSES = {"ok", "not_found"}
+# Fila 'ok' de un partido sin resultado final (extraído antes de acabar): se guarda aparte para volver a pedirlo
+NOT_FINISHED_STATUS = "not_finished"
+SCORE_COLUMN = 13          # columna "Fin" de la fila del scraper masivo
+PENDING_SCORE = "?*?"
+
+
+def _has_final_score(row: List[str]) -> bool:
+    return len(row) > SCORE_COLUMN and row[SCORE_COLUMN] not in (None, "", PENDING_SCORE)
+
+
+def checkpoint_path_for(*job_parts: str) -> str:
+    """
+    Ruta del diario para un trabajo (p. ej. spreadsheet + hojas destino). Reproduciendo (NOWGOAL_REPLAY_URL)
+    se usa un diario aparte: los 404 de IDs que no están en el archivo no deben marcarse como not_found de verdad.
+    """
+    if REPLAY_URL:
+        job_parts = job_parts + ("replay",)
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", "__".join(str(p) for p in job_parts)).strip("_") or "default"
+    return os.path.join(DEFAULT_CHECKPOINT_DIR, f"{slug}.jsonl")
+
+
+class ScrapeCheckpoint:
+    """
+    Diario append-only (JSONL) de resultados del scraper masivo: una línea por (id, estado, fila)
+    y otra cuando la fila ya está subida a la hoja. Al abrirlo se reconstruye el estado (gana la última línea),
+    así un trabajo interrumpido se reanuda sin repetir IDs terminados ni perder filas aún no subidas.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Dict] = {}
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        truncated = self._load()
+        self._file = open(path, "a", encoding="utf-8")
+        if truncated:
+            self._file.write("\n")  # cierra la línea incompleta para no pegarle la siguiente
+
+    def _load(self) -> bool:
+        """Reconstruye el estado; devuelve True si el fichero termina en una línea sin cerrar."""
+        if not os.path.exists(self.path):
+            return False
+        last_line = ""
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                last_line = line
+                self._apply(line)
+        return bool(last_line) and not last_line.endswith("\n")
+
+    def _apply(self, line: str):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return  # línea a medio escribir tras un corte
+        mid = entry.get("id")
+        if mid is None:
+            return
+        if entry.get("uploaded"):
+            if mid in self._entries:
+                self._entries[mid]["uploaded"] = True
+            return
+        status, row = entry.get("status"), entry.get("row") or []
+        if status == "ok" and not _has_final_score(row):
+            status = NOT_FINISHED_STATUS   # diarios escritos antes de separar los partidos sin terminar
+        self._entries[mid] = {"status": status, "row": row,
+                              "ah_num": entry.get("ah_num"), "uploaded": False}
+
+    def _write(self, entry: Dict):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def record(self, mid: int, status: str, row: List[str], ah_num: float | None):
+        if status == "ok" and not _has_final_score(row):
+            status = NOT_FINISHED_STATUS
+        with self._lock:
+            self._entries[mid] = {"status": status, "row": row, "ah_num": ah_num, "uploaded": False}
+            self._write({"id": mid, "status": status, "row": row, "ah_num": ah_num, "ts": round(time.time(), 3)})
+            self._file.flush()
+
+    def mark_uploaded(self, mids: Iterable[int]):
+        with self._lock:
+            for mid in mids:
+                if mid in self._entries:
+                    self._entries[mid]["uploaded"] = True
+                    self._write({"id": mid, "uploaded": True})
+            self._file.flush()
+
+    def is_done(self, mid: int) -> bool:
+        entry = self._entries.get(mid)
+        return entry is not None and entry["status"] in FINAL_STATUSES
+
+    def pending_ids(self, ids: Iterable[int]) -> List[int]:
+        return [mid for mid in ids if not self.is_done(mid)]
+
+    def unuploaded_rows(self, ids: Iterable[int]) -> List[Tuple[int, List[str], float | None]]:
+        """Filas 'ok' de esos IDs que se extrajeron pero no llegaron a subirse (p. ej. por un corte)."""
+        result = []
+        for mid in ids:
+            entry = self._entries.get(mid)
+            if entry and entry["status"] == "ok" and not entry["uploaded"]:
+                result.append((mid, entry["row"], entry["ah_num"]))
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for entry in self._entries.values():
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+            counts["uploaded"] = sum(1 for e in self._entries.values() if e["uploaded"])
+        return counts
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._file.close()
+            self._file = open(self.path, "w", encoding="utf-8")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,137 @@
+# modules/scrape_pipeline.py
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+
+# --- CONFIGURACIÓN ---
+DEFAULT_QUEUE_SIZE = 64
+_STOP = object()
+
+
+class PipelineStage:
+    """
+    Fase del pipeline: `func(item)` se ejecuta en `workers` hilos. Lo que devuelve pasa a la siguiente fase
+    (None = se descarta; con `fan_out` cada elemento de la lista devuelta pasa por separado).
+    La cola de entrada está acotada: si esta fase va lenta, la anterior se bloquea (backpressure).
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int = 1, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 fan_out: bool = False):
+        self.name = name
+        self.func = func
+        self.fan_out = fan_out
+        self.workers = max(1, int(workers))
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.next_stage: "PipelineStage | None" = None
+        self._lock = threading.Lock()
+        self._alive = self.workers
+        self._stats = {"processed": 0, "emitted": 0, "errors": 0, "busy_seconds": 0.0,
+                       "wait_input_seconds": 0.0, "blocked_output_seconds": 0.0, "max_queue": 0}
+
+    def _add(self, key: str, amount):
+        with self._lock:
+            self._stats[key] += amount
+
+    def put(self, item):
+        self.queue.put(item)
+        size = self.queue.qsize()
+        if size > self._stats["max_queue"]:
+            with self._lock:
+                self._stats["max_queue"] = max(self._stats["max_queue"], size)
+
+    def _worker(self):
+        while True:
+            start = time.perf_counter()
+            item = self.queue.get()
+            self._add("wait_input_seconds", time.perf_counter() - start)
+            if item is _STOP:
+                break
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                print(f"Pipeline [{self.name}] error: {e}")
+                self._add("errors", 1)
+                result = None
+            self._add("busy_seconds", time.perf_counter() - start)
+            self._add("processed", 1)
+            if result is not None and self.next_stage is not None:
+                outputs = result if self.fan_out else (result,)
+                start = time.perf_counter()
+                for output in outputs:
+                    self.next_stage.put(output)
+                    self._add("emitted", 1)
+                self._add("blocked_output_seconds", time.perf_counter() - start)
+        # El último hilo de la fase que termina avisa a la siguiente
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last and self.next_stage is not None:
+            for _ in range(self.next_stage.workers):
+                self.next_stage.put(_STOP)
+
+    def stats(self, elapsed: float) -> Dict[str, float]:
+        with self._lock:
+            data = dict(self._stats)
+        data["workers"] = self.workers
+        data["items_per_second"] = round(data["processed"] / elapsed, 3) if elapsed > 0 else 0.0
+        for key in ("busy_seconds", "wait_input_seconds", "blocked_output_seconds"):
+            data[key] = round(data[key], 3)
+        return data
+
+
+class Pipeline:
+    """
+    Fases encadenadas por colas acotadas que trabajan a la vez, de modo que el tiempo total se acerca
+    al de la fase más lenta y no a la suma de todas:
+
+        Pipeline([PipelineStage("fetch", fetch, 16), PipelineStage("parse", parse, 2), ...]).run(ids)
+    """
+
+    def __init__(self, stages: List[PipelineStage]):
+        if not stages:
+            raise ValueError("El pipeline necesita al menos una fase")
+        self.stages = stages
+        for current, following in zip(stages, stages[1:]):
+            current.next_stage = following
+        self.elapsed = 0.0
+
+    def run(self, items: Iterable, on_progress: Callable[[], None] | None = None,
+            progress_interval: float = 1.0) -> Dict[str, Dict[str, float]]:
+        """
+        Alimenta la primera fase con `items` y espera a que se vacíen todas. Devuelve las estadísticas por fase.
+        `on_progress()` se llama cada `progress_interval` segundos desde el hilo que llama a run (útil para la UI).
+        """
+        start = time.perf_counter()
+        last_progress = start
+
+        def tick():
+            nonlocal last_progress
+            if on_progress is not None and time.perf_counter() - last_progress >= progress_interval:
+                last_progress = time.perf_counter()
+                on_progress()
+
+        threads = []
+        for stage in self.stages:
+            for i in range(stage.workers):
+                t = threading.Thread(target=stage._worker, name=f"pipeline-{stage.name}-{i}", daemon=True)
+                t.start()
+                threads.append(t)
+        first = self.stages[0]
+        try:
+            for item in items:
+                first.put(item)
+                tick()
+        finally:
+            for _ in range(first.workers):
+                first.put(_STOP)
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=progress_interval)
+                    tick()
+            self.elapsed = time.perf_counter() - start
+        return self.stats()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {stage.name: stage.stats(self.elapsed) for stage in self.stages}
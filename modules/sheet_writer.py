@@ -0,0 +1,135 @@
+# modules/sheet_writer.py
+import json
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+
+import gspread
+
+# --- CONFIGURACIÓN ---
+DEFAULT_TARGET_BYTES = 256 * 1024      # tamaño objetivo de cada append (payload JSON)
+MIN_TARGET_BYTES = 16 * 1024
+MAX_TARGET_BYTES = 2 * 1024 * 1024     # Sheets recomienda peticiones de ~2 MB como máximo
+DEFAULT_MAX_BATCH_ROWS = 2000
+DEFAULT_FLUSH_INTERVAL = 20.0          # segundos máximos que una fila espera en el buffer
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 64.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _api_status(exc: gspread.exceptions.APIError) -> int | None:
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) or getattr(exc, "code", None)
+
+
+class SheetStreamWriter:
+    """
+    Subida incremental a una hoja con `append_rows`: nunca lee la hoja para buscar la última fila.
+    Las filas se acumulan y se envían cuando el lote alcanza el tamaño objetivo (en bytes del payload),
+    el número máximo de filas o el intervalo máximo de espera. Un 429/5xx se reintenta con backoff
+    exponencial con jitter y reduce el tamaño de lote; cada envío correcto lo vuelve a ampliar.
+    `on_flushed(ids)` recibe los IDs asociados a las filas ya subidas.
+    """
+
+    def __init__(self, sheet_handle, worksheet_name: str, columns: List[str],
+                 target_bytes: int = DEFAULT_TARGET_BYTES, max_batch_rows: int = DEFAULT_MAX_BATCH_ROWS,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, on_flushed: Callable[[List], None] | None = None):
+        self.worksheet_name = worksheet_name
+        self._sheet_handle = sheet_handle
+        self._columns = columns
+        self._ws = None
+        self._target_bytes = target_bytes
+        self._max_batch_rows = max_batch_rows
+        self._flush_interval = flush_interval
+        self._on_flushed = on_flushed
+        self._lock = threading.Lock()
+        self._rows: List[List[str]] = []
+        self._ids: List = []
+        self._bytes = 0
+        self._first_buffered_at = None
+        self._stats = {"rows": 0, "requests": 0, "retries": 0, "throttled": 0, "failed_rows": 0, "upload_seconds": 0.0}
+
+    def _worksheet(self):
+        if self._ws is None:
+            try:
+                self._ws = self._sheet_handle.worksheet(self.worksheet_name)
+            except gspread.exceptions.WorksheetNotFound:
+                self._ws = self._sheet_handle.add_worksheet(title=self.worksheet_name, rows=200, cols=len(self._columns) + 5)
+                self._ws.append_rows([self._columns], value_input_option="USER_ENTERED")
+        return self._ws
+
+    def add(self, row: List[str], row_id=None):
+        with self._lock:
+            self._rows.append(row)
+            self._ids.append(row_id)
+            self._bytes += len(json.dumps(row, ensure_ascii=False)) + 1
+            if self._first_buffered_at is None:
+                self._first_buffered_at = time.monotonic()
+            if self._should_flush():
+                self._flush_locked()
+
+    def add_many(self, rows: Iterable[List[str]], ids: Iterable | None = None):
+        rows = list(rows)
+        ids = list(ids) if ids is not None else [None] * len(rows)
+        for row, row_id in zip(rows, ids):
+            self.add(row, row_id)
+
+    def _should_flush(self) -> bool:
+        return (self._bytes >= self._target_bytes or len(self._rows) >= self._max_batch_rows
+                or time.monotonic() - self._first_buffered_at >= self._flush_interval)
+
+    def flush(self) -> bool:
+        with self._lock:
+            return self._flush_locked()
+
+    def _flush_locked(self) -> bool:
+        if not self._rows:
+            return True
+        rows, ids = self._rows, self._ids
+        self._rows, self._ids, self._bytes, self._first_buffered_at = [], [], 0, None
+        ok = self._append_with_backoff(rows)
+        if ok:
+            self._stats["rows"] += len(rows)
+            if self._on_flushed is not None:
+                self._on_flushed([i for i in ids if i is not None])
+        else:
+            self._stats["failed_rows"] += len(rows)
+        return ok
+
+    def _append_with_backoff(self, rows: List[List[str]]) -> bool:
+        start = time.perf_counter()
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    self._stats["requests"] += 1
+                    self._worksheet().append_rows(rows, value_input_option="USER_ENTERED", insert_data_option="INSERT_ROWS")
+                    self._target_bytes = min(MAX_TARGET_BYTES, int(self._target_bytes * 1.25))
+                    return True
+                except gspread.exceptions.APIError as e:
+                    status = _api_status(e)
+                    if status not in RETRY_STATUS or attempt == MAX_RETRIES:
+                        print(f"Error subiendo a {self.worksheet_name}: {e}")
+                        return False
+                    if status == 429:
+                        self._stats["throttled"] += 1
+                        self._target_bytes = max(MIN_TARGET_BYTES, self._target_bytes // 2)
+                    self._stats["retries"] += 1
+                    # Backoff exponencial con jitter completo
+                    time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+                except Exception as e:
+                    print(f"Error subiendo a {self.worksheet_name}: {e}")
+                    return False
+            return False
+        finally:
+            self._stats["upload_seconds"] += time.perf_counter() - start
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            data = dict(self._stats)
+            data.update({"pending_rows": len(self._rows), "target_bytes": self._target_bytes})
+        return data
+
+    def close(self) -> bool:
+        return self.flush()
@@ -1,8 +1,9 @@
 import streamlit as st
+import os
 import tempfile
 from typing import List, Dict
 
-from modules.bulk_sheets_scraper import process_ranges
+from modules.bulk_sheets_scraper import process_ranges, MODE_HTTP, MODE_SELENIUM
 
 
 def _parse_ranges(text: str) -> List[Dict[str, int]]:
@@ -37,7 +38,23 @@ def display_sheets_uploader_ui():
     ranges_text = st.text_area(
         "Rangos de IDs (formato: inicio-fin etiqueta opcional)", height=150
     )
-    workers = st.number_input("Número de Workers", min_value=1, max_value=5, value=3)
+    http_mode = st.checkbox(
+        "Modo rápido (HTTP, navegador solo como respaldo)", value=True,
+        help="Lee el HTML estático de cada partido; Selenium solo se usa si faltan datos en la página."
+    )
+    max_workers = 32 if http_mode else 5
+    workers = st.number_input(
+        "Máximo de workers", min_value=1, max_value=max_workers, value=max_workers if http_mode else 3,
+        help="Tope de concurrencia: el número real de workers se ajusta solo según latencia y errores (429/5xx, timeouts)."
+    )
+    processes = st.number_input(
+        "Procesos (0 = un solo proceso con hilos)", min_value=0, max_value=os.cpu_count() or 1, value=0,
+        help="Reparte los IDs entre procesos, cada uno con su sesión HTTP y sus navegadores, para usar todos los núcleos al parsear."
+    )
+    resume = st.checkbox(
+        "Reanudar trabajo anterior", value=True,
+        help="Salta los IDs ya procesados (o inexistentes) para este spreadsheet y sube las filas pendientes de una ejecución cortada."
+    )
 
     if st.button("Procesar y subir"):
         if not cred_file or not sheet_name or not ranges_text.strip():
@@ -50,10 +67,26 @@ def display_sheets_uploader_ui():
         if not ranges:
             st.warning("No se pudieron interpretar los rangos de IDs.")
             return
+        progress_placeholder = st.empty()
+
+        def show_progress(progress):
+            text = f"{progress['done']}/{progress['total']} IDs procesados ({progress['scraped_ok']} con datos)"
+            if "in_flight" in progress:
+                text += (f" · workers activos {progress['in_flight']}/{progress['limit']}"
+                         f" · {progress['requests_per_second']:.1f} pág/s · errores {progress['errors']}")
+            progress_placeholder.caption(text)
+
         with st.spinner("Procesando..."):
             try:
-                process_ranges(creds_path, sheet_name, sheet_neg, sheet_pos, ranges, max_workers=int(workers))
+                pool_stats = process_ranges(creds_path, sheet_name, sheet_neg, sheet_pos, ranges, max_workers=int(workers),
+                                            mode=MODE_HTTP if http_mode else MODE_SELENIUM, resume=resume,
+                                            processes=int(processes), progress_callback=show_progress)
                 st.success("Proceso finalizado. Revisa tu Google Sheet.")
+                if pool_stats:
+                    st.caption(
+                        f"Drivers: {pool_stats['misses']} creados, {pool_stats['hits']} reutilizados, "
+                        f"{pool_stats['restarts']} reiniciados, espera total {pool_stats['wait_seconds']:.1f}s"
+                    )
             except Exception as e:
                 st.error(f"Error en el proceso: {e}")
 
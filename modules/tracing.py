@@ -0,0 +1,263 @@
+# modules/tracing.py
+"""
+Spans por etapa de cada análisis de partido (descarga, navegación, cada hSelect, parseo, extractores,
+progresión, render), exportados a JSONL: una línea por span con trace_id, parent_id, duración y atributos
+(bytes, caché, status...).
+
+    with start_trace("analisis_of", match_id=match_id) as trace:
+        with span("selenium.navigate", url=url):
+            ...
+    st.sidebar.caption(trace.summary())
+
+    python -m modules.tracing                    # p50 / p95 por etapa del fichero de trazas
+    python -m modules.tracing --trace analisis_of
+
+Sin traza activa `span` no hace nada, así que las funciones instrumentadas cuestan lo mismo fuera de un análisis.
+El fichero rota al pasar de NOWGOAL_TRACE_MAX_BYTES: el anterior queda como `<fichero>.1` (solo se guarda uno).
+Los hilos del executor heredan la traza con `bind(fn)`; las tareas asyncio la heredan solas.
+"""
+import argparse
+import contextvars
+import functools
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List
+
+# --- CONFIGURACIÓN ---
+TRACING_ENABLED = os.environ.get("NOWGOAL_TRACING", "1") != "0"
+DEFAULT_TRACE_PATH = os.environ.get(
+    "NOWGOAL_TRACE_FILE",
+    os.path.join(os.path.expanduser("~"), ".cache", "nowgoal", "traces.jsonl"),
+)
+TRACE_MAX_BYTES = int(os.environ.get("NOWGOAL_TRACE_MAX_BYTES", str(20 * 1024 * 1024)))   # 0 = sin límite
+SUMMARY_TOP_STAGES = 4
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("nowgoal_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("nowgoal_span", default=None)
+_export_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "duration_ms", "attrs")
+
+    def __init__(self, trace_id: str, parent_id: str | None, name: str, attrs: Dict):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.duration_ms = None
+        self.attrs = attrs
+
+    def set(self, **attrs) -> "Span":
+        self.attrs.update(attrs)
+        return self
+
+    def as_dict(self) -> Dict:
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+                "start": round(self.start, 6), "duration_ms": self.duration_ms, **self.attrs}
+
+
+class _NullSpan:
+    """Lo que devuelve `span` sin traza activa: acepta atributos y los descarta."""
+
+    def set(self, **attrs) -> "_NullSpan":
+        return self
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """Spans de un análisis. Se exportan todos juntos al cerrar la traza."""
+
+    def __init__(self, name: str, attrs: Dict, path: str | None):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.path = path
+        self.root = Span(self.trace_id, None, name, attrs)
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Milisegundos acumulados por nombre de span (sin el span raíz)."""
+        totals: Dict[str, float] = defaultdict(float)
+        for s in self.spans():
+            if s is not self.root and s.duration_ms is not None:
+                totals[s.name] += s.duration_ms
+        return dict(totals)
+
+    def summary(self, top: int = SUMMARY_TOP_STAGES) -> str:
+        stages = sorted(self.stage_totals().items(), key=lambda item: item[1], reverse=True)[:top]
+        return " · ".join(f"{name} {ms / 1000:.2f}s" for name, ms in stages)
+
+    def export(self):
+        if not self.path:
+            return
+        lines = "".join(json.dumps(s.as_dict(), ensure_ascii=False, default=str) + "\n" for s in self.spans())
+        try:
+            dir_name = os.path.dirname(self.path)
+            if dir_name:
+                os.makedirs(dir_name, exist_ok=True)
+            with _export_lock:
+                _rotate_if_full(self.path)
+                with open(self.path, "a", encoding="utf-8") as fh:
+                    fh.write(lines)
+        except OSError:
+            pass
+
+
+def _rotate_if_full(path: str):
+    # Llamar con _export_lock tomado
+    if TRACE_MAX_BYTES <= 0:
+        return
+    try:
+        if os.path.getsize(path) >= TRACE_MAX_BYTES:
+            os.replace(path, path + ".1")
+    except FileNotFoundError:
+        pass
+
+
+def _finish(trace: Trace, s: Span, started: float):
+    s.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+    trace.add(s)
+
+
+@contextmanager
+def start_trace(name: str, path: str | None = DEFAULT_TRACE_PATH, **attrs):
+    """Abre una traza (span raíz `name`) en el contexto actual y la exporta a `path` al salir."""
+    trace = Trace(name, attrs, path if TRACING_ENABLED else None)
+    if not TRACING_ENABLED:
+        yield trace
+        return
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    started = time.perf_counter()
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.set(error=type(e).__name__)
+        raise
+    finally:
+        _finish(trace, trace.root, started)
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        trace.export()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Span hijo del actual. Las excepciones quedan anotadas en `error` y se propagan."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield NULL_SPAN
+        return
+    parent = _current_span.get()
+    s = Span(trace.trace_id, parent.span_id if parent is not None else None, name, attrs)
+    token = _current_span.set(s)
+    started = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.set(error=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(trace, s, started)
+
+
+def current_span():
+    """Span activo (NULL_SPAN si no hay traza), para añadir atributos desde dentro de una etapa."""
+    if _current_trace.get() is None:
+        return NULL_SPAN
+    return _current_span.get() or NULL_SPAN
+
+
+def traced(name: str | None = None):
+    """Decorador: cada llamada es un span (`name` o el nombre de la función)."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(func):
+    """Envuelve `func` para que al ejecutarse en otro hilo (executor) siga en la traza y span actuales."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Una copia por llamada: un mismo Context no puede estar activo en dos hilos a la vez
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def stage_report(path: str = DEFAULT_TRACE_PATH, trace_name: str | None = None) -> List[Dict]:
+    """
+    Por etapa: nº de trazas en que aparece y p50/p95 del tiempo acumulado por traza (una etapa puede
+    repetirse, p. ej. varios hSelect o descargas). Ordenado por p95.
+    """
+    per_trace: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    roots: Dict[str, str] = {}
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("parent_id") is None:
+                roots[record["trace_id"]] = record["name"]
+            per_trace[record["trace_id"]][record["name"]] += record.get("duration_ms") or 0.0
+    by_stage: Dict[str, List[float]] = defaultdict(list)
+    for trace_id, stages in per_trace.items():
+        if trace_name and roots.get(trace_id) != trace_name:
+            continue
+        for stage, ms in stages.items():
+            by_stage[stage].append(ms)
+    report = [{"stage": stage, "traces": len(values), "p50_ms": round(_percentile(values, 50), 1),
+               "p95_ms": round(_percentile(values, 95), 1)} for stage, values in by_stage.items()]
+    return sorted(report, key=lambda row: row["p95_ms"], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="p50/p95 por etapa de las trazas de análisis")
+    parser.add_argument("path", nargs="?", default=DEFAULT_TRACE_PATH)
+    parser.add_argument("--trace", default=None, help="Solo trazas con este span raíz (p. ej. analisis_of)")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path):
+        print(f"No existe {args.path}")
+        return
+    print(f"{'etapa':<45} {'trazas':>7} {'p50 ms':>10} {'p95 ms':>10}")
+    for row in stage_report(args.path, args.trace):
+        print(f"{row['stage']:<45} {row['traces']:>7} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()